@@ -1,10 +1,45 @@
 from flask import Flask, render_template, request, jsonify
 from flask_cors import CORS
-from backend.simulation import simulation_3_insurers, simulation_3_insurers_different_premiums
-from backend.nash import nash_equilibrium_3_insurers, nash_equilibrium_3_insurers_different_premiums
+from backend.simulation import (
+    simulation_3_insurers,
+    streaming_simulation_n_insurers,
+    adaptive_simulation_n_insurers,
+    estimate_mean_profits_n_insurers,
+    scenario_3_insurers_different_premiums,
+    unit_gbm_factors,
+    scaled_scenario,
+    AnalyticScenario,
+    make_rng,
+    SAMPLERS,
+    QMC_REPLICATES,
+    correlation_factor,
+)
+from backend.stats import QuantileSketch
+from backend.cache import PayoffCache, cache_key
+from backend.nash import (
+    nash_equilibrium_3_insurers,
+    best_response_equilibrium,
+    continuous_best_response_equilibrium,
+    verify_equilibrium,
+    scenario_payoff_tensor,
+    best_welfare_retentions,
+    branch_and_bound_equilibrium,
+    RiskAdjustedScenario,
+    TensorScenario,
+    NashSession,
+    player_payoff_rows,
+    feasible_mask,
+    UTILITIES,
+    ANALYTIC_UTILITIES,
+    RISK_AVERSION,
+    CVAR_LEVEL,
+    MIN_RETENTION,
+)
 import numpy as np
 import os
 import math
+import threading
+from collections import OrderedDict
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,12 +49,28 @@ static_path = os.path.join(BASE_DIR, 'static')
 app = Flask(__name__, template_folder=template_path, static_folder=static_path)
 CORS(app)
 
+# Nash payoff tensors of deterministic requests, in memory and as .npz files
+payoff_cache = PayoffCache(os.environ.get('PAYOFF_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'payoffs')))
+# Warm-started Nash sessions of interactive clients, by session_id (least recently used dropped first)
+nash_sessions = OrderedDict()
+nash_sessions_lock = threading.Lock()
+
 # Simulation parameters
 S0 = 1000
 mu = 0.05
 sigma = 0.2
 T = 1
-N = 1000  # Reduced from 10000 for better performance
+N = 10000  # Default Monte Carlo paths (classic runs are streamed in chunks, memory stays constant)
+MAX_N = 10**8  # Streamed classic runs
+MAX_SCENARIO_N = 10**6  # Nash runs keep the whole common-random-number sample in memory
+MAX_TENSOR_OPTIONS = 21  # Finer Nash grids are searched by branch and bound instead of full payoff tensors
+MIN_RETENTION_STEP = 0.001
+MAX_EXPONENTIAL_OPTIONS = 201  # 'exponential' grid options at MAX_SCENARIO_N paths (one exp per path and option)
+MAX_SESSIONS = 256  # Nash sessions kept in memory
+MAX_SESSION_SAMPLES = 4  # Session draws kept in memory (up to 6 × MAX_SCENARIO_N values each)
+
+# Unit premium/claim draws of sampled sessions, rescaled when a premium changes (memory only)
+session_samples = PayoffCache(max_entries=MAX_SESSION_SAMPLES)
 
 
 # ===== SCR CALCULATION FUNCTIONS =====
@@ -261,6 +312,184 @@ def apply_scr_shock():
             'error': str(e)
         }), 400
 
+@app.route('/api/cache/stats', methods=['GET'])
+def payoff_cache_stats():
+    """
+    Hit and miss counters of the Nash payoff-tensor cache.
+    
+    Response JSON:
+        - hits, disk_hits, misses: lookups served from memory, from disk, or computed
+        - hit_rate: share of lookups served from the cache (null before any lookup)
+        - entries: tensors held in memory
+    """
+    return jsonify(payoff_cache.stats())
+
+def nash_session(session_id, retention_options):
+    """
+    Nash session of an interactive client, created on first use (or when its grid changes).
+    
+    Args:
+        session_id: Client-chosen session identifier
+        retention_options: Retention grid of the request
+    
+    Returns:
+        NashSession
+    """
+    with nash_sessions_lock:
+        session = nash_sessions.get(session_id)
+        if session is None or session.retention_options != retention_options:
+            session = NashSession(retention_options)
+        nash_sessions[session_id] = session
+        nash_sessions.move_to_end(session_id)
+        while len(nash_sessions) > MAX_SESSIONS:
+            nash_sessions.popitem(last=False)
+        return session
+
+def nash_retention_options(retention_step):
+    """
+    Retention grid of a Nash request: every multiple of the step from 0 to 1.
+    
+    Args:
+        retention_step: Spacing of the grid
+    
+    Returns:
+        List of retention rates (rounded to 10 decimals)
+    """
+    return [round(i * retention_step, 10) for i in range(int(1 / retention_step + 1e-9) + 1)]
+
+def sample_correlation(sample):
+    """Claim correlation matrix of a sample description (None if independent)."""
+    return None if sample["correlation"] is None else np.asarray(sample["correlation"])
+
+def nash_scenarios(S0s, sample, rng, utility, risk_aversion, cvar_level, retention_options):
+    """
+    Scenarios a Nash request is solved on.
+    
+    Args:
+        S0s: Initial premiums of the 3 insurers
+        sample: Sample description (N, seed, dtype, correlation), or None for exact expectations
+        rng: Generator of the sample
+        utility, risk_aversion, cvar_level: Objective of the insurers (see RiskAdjustedScenario)
+        retention_options: Retention grid, tabulated up front for a risk-aware utility
+    
+    Returns:
+        scenario_sample: Scenario of the mean profits
+        objective: Scenario of the payoffs (the same one for 'mean')
+    """
+    if sample is None:
+        scenario_sample = AnalyticScenario(S0s, mu, sigma, T)
+    else:
+        # Draw premiums and claims once and reuse them for every tuple (common random numbers)
+        scenario_sample = scenario_3_insurers_different_premiums(
+            *S0s, mu, sigma, T, sample["N"], rng=rng, dtype=sample["dtype"], correlation=sample_correlation(sample)
+        )
+    if utility == 'mean':
+        return scenario_sample, scenario_sample
+    # Utilities tabulated once per (insurer, option), then looked up for every tuple
+    return scenario_sample, RiskAdjustedScenario(scenario_sample, utility, risk_aversion, cvar_level,
+                                                 retention_options)
+
+def nash_payoff_tensors(S0s, sample, rng, utility, risk_aversion, cvar_level, retention_options, dtype):
+    """
+    Payoff and mean-profit tensors of a Nash request (the cached part of coarse grids).
+    
+    Args:
+        S0s, sample, rng, utility, risk_aversion, cvar_level, retention_options: As in nash_scenarios
+        dtype: Storage dtype of the payoffs
+    
+    Returns:
+        Dict with the feasible mask, the payoffs and the mean profits
+    """
+    scenario_sample, objective = nash_scenarios(S0s, sample, rng, utility, risk_aversion, cvar_level,
+                                                retention_options)
+    feasible, payoffs = scenario_payoff_tensor(objective, retention_options, dtype)
+    _, profits = scenario_payoff_tensor(scenario_sample, retention_options)
+    return {"feasible": feasible, "payoffs": payoffs, "profits": profits}
+
+def session_row_keys(S0s, utility, risk_aversion, cvar_level, sample):
+    """
+    Keys of the insurers' payoff rows in a Nash session.
+    
+    A row only depends on its insurer's premium and the shared model and sample settings.
+    
+    Returns:
+        List of cache keys, one per insurer
+    """
+    return [
+        cache_key(player=i, S0=S0_i, mu=mu, sigma=sigma, T=T, utility=utility,
+                  risk_aversion=risk_aversion, cvar_level=cvar_level, sample=sample)
+        for i, S0_i in enumerate(S0s)
+    ]
+
+def session_payoff_rows(players, S0s, sample, rng, session_id, utility, risk_aversion, cvar_level,
+                        retention_options):
+    """
+    Payoff rows of selected insurers of a Nash session.
+    
+    A sampled session keeps one unit draw (see session_samples) and rescales it
+    by the premiums of the affected insurers only: the rows match those of the
+    sample nash_scenarios() would draw with the same seed.
+    
+    Args:
+        players: Indices of the insurers to evaluate
+        S0s: Initial premiums of the 3 insurers
+        sample, rng: As in nash_scenarios
+        session_id: Session identifier (keys the draw of unseeded samples)
+        utility, risk_aversion, cvar_level: Objective of the insurers (see RiskAdjustedScenario)
+        retention_options: Retention grid
+    
+    Returns:
+        payoffs, profits: As in player_payoff_rows
+    """
+    S0s = np.asarray(S0s)
+    if sample is None:
+        part = AnalyticScenario(S0s[players], mu, sigma, T)
+    else:
+        factors, _ = session_samples.get_or_compute(
+            cache_key(mu=mu, sigma=sigma, T=T, sample=sample,
+                      session=None if sample["seed"] is not None else str(session_id)),
+            lambda: {"factors": unit_gbm_factors(len(S0s), mu, sigma, T, sample["N"], rng, dtype=sample["dtype"],
+                                                 correlation=sample_correlation(sample))}
+        )
+        part = scaled_scenario(factors["factors"][:, players], S0s[players])
+    return player_payoff_rows(part, range(len(players)), retention_options, utility, risk_aversion, cvar_level)
+
+def solve_nash(solver, S0s, n_paths, objective, retention_options, tensors=None):
+    """
+    Runs the requested Nash solver outside a session.
+    
+    Args:
+        solver: 'welfare', 'best_response' or 'continuous'
+        S0s: Initial premiums of the 3 insurers
+        n_paths: Paths of the sample (passed through to the solvers)
+        objective: Scenario of the payoffs
+        retention_options: Retention grid (unused by 'continuous')
+        tensors: Payoff tensors of a coarse grid (see nash_payoff_tensors); without
+                 them 'welfare' searches the grid by branch and bound
+    
+    Returns:
+        best_retentions: Equilibrium retention rates
+        profits_nash: Payoffs at the equilibrium
+        details: Dict of solver diagnostics for the response
+    """
+    if solver == 'best_response':
+        best_retentions, profits_nash, rounds, status = best_response_equilibrium(
+            S0s, mu, sigma, T, n_paths, retention_options, scenario=objective
+        )
+        return best_retentions, profits_nash, {"rounds": rounds, "status": status}
+    if solver == 'continuous':
+        best_retentions, profits_nash, rounds, status, evaluations = continuous_best_response_equilibrium(
+            S0s, mu, sigma, T, n_paths, scenario=objective
+        )
+        return best_retentions, profits_nash, {"rounds": rounds, "status": status, "evaluations": evaluations}
+    if tensors is None:
+        best_retentions, profits_nash, nodes = branch_and_bound_equilibrium(
+            S0s, mu, sigma, T, n_paths, retention_options, scenario=objective
+        )
+        return best_retentions, profits_nash, {"nodes": nodes}
+    best_retentions, profits_nash = best_welfare_retentions(retention_options, tensors["feasible"], tensors["payoffs"])
+    return best_retentions, profits_nash, {}
+
 @app.route('/simulate', methods=['POST'])
 def simulate():
     """
@@ -277,10 +506,57 @@ def simulate():
         - qA, qB, qC: retention rates for each insurer (0-1)
         - S0A, S0B, S0C: initial premiums for each insurer
         - scenario: 'classic' (user's choice) or 'nash' (equilibrium)
+        - method: 'analytic' (exact expected profits, default) or 'monte_carlo' (N simulated paths)
+        - solver: for 'nash', 'welfare' (best total + fairness, default),
+                  'best_response' (iterated best-response dynamics) or
+                  'continuous' (best responses over continuous retentions, no grid)
+        - verify: for 'nash', attach an epsilon-Nash deviation report (default false)
+        - seed: optional non-negative integer seed; identical requests with a seed give identical results
+        - N: number of Monte Carlo paths for 'monte_carlo' (default 10000,
+             up to 10^8 for 'classic' and 10^6 for 'nash')
+        - target_se / target_rel: for 'classic' + 'monte_carlo', simulate only until each
+             mean profit reaches this standard error (absolute / relative); N is then the cap
+        - antithetic / control_variate: for 'classic' + 'monte_carlo', variance reduction
+             (antithetic shock pairs / premiums as control variate); N up to 10^6
+        - sampler: for 'classic' + 'monte_carlo', 'pseudo' (default), 'sobol' or 'halton'
+             (scrambled quasi-Monte Carlo shocks, error from 16 replicates); N from 32 to 10^6
+             ('sobol' replicates are rounded down to a power of 2 paths, see the N returned)
+        - dtype: for 'monte_carlo', 'float64' (default) or 'float32' paths and payoffs
+             (half the memory traffic; means are still accumulated in float64)
+        - correlation: for 'monte_carlo', correlation of the insurers' claim shocks:
+             one coefficient for every pair or a 3 × 3 matrix (default independent)
+        - tail_risk: for streamed 'classic' + 'monte_carlo' runs, also estimate each insurer's
+             VaR and TVaR of the profit at var_level (default 0.995) from a quantile sketch
+        - utility: for 'nash', each insurer's objective: 'mean' (default), 'mean_variance',
+             'cvar' or 'exponential' (the last two on a Monte Carlo sample even for 'analytic')
+        - risk_aversion: for 'mean_variance' / 'exponential' (default 0.01 per unit of profit)
+        - cvar_level: for 'cvar', confidence level of the tail mean (default 0.95)
+        - retention_step: for 'nash', spacing of the retention grid (default 0.1, down to 0.001);
+             grids finer than 0.05 are searched by branch and bound (no payoff tensors, no cache);
+             with 'exponential', N × the number of options is capped (one exp per path and option)
+        - session_id: for 'nash' with 'welfare' or 'best_response', keep the insurers' payoff rows
+             and the equilibrium between requests: a resubmission re-evaluates only the insurers
+             whose inputs changed and warm-starts the search from the last equilibrium
     
     Response JSON:
         - profit_A, profit_B, profit_C: mean expected profits
         - scenario: which scenario was run
+        - retentions: retention rates at equilibrium ('nash' only)
+        - utilities: certainty-equivalent profit of each insurer at equilibrium (risk-aware 'utility' only)
+        - cache: 'memory', 'disk' or 'miss' for the payoff tensors ('nash' with 'analytic' or a seed only)
+        - nodes: boxes bounded by the branch-and-bound search ('nash' on fine grids or in a session,
+             with 'welfare' only)
+        - session: id, reevaluated (insurers whose payoffs were recomputed) and rows_computed
+             (total over the session) ('session_id' only)
+        - rounds, status: best-response rounds and outcome ('best_response' / 'continuous' only)
+        - evaluations: utility evaluations of the continuous best responses ('continuous' only)
+        - nash_report: epsilon, deviating player and deviation ('verify' only)
+        - N, std_errors: paths simulated and standard error of each mean ('classic' + 'monte_carlo' only)
+        - converged: whether the target precision was reached ('target_se' / 'target_rel' only)
+        - variance_reduction_factors: plain-MC variance over achieved variance
+             ('antithetic' / 'control_variate' / 'sampler' only; null when undefined, e.g. zero retention)
+        - tail_risk: var, tvar (losses, i.e. minus the profit quantile / tail mean), quantile
+             and rank_error per insurer, at var_level ('tail_risk' only)
     """
     try:
         print("\n[DEBUG] ===== NEW REQUEST =====")
@@ -295,8 +571,76 @@ def simulate():
         S0B = float(data.get('S0B', 1000))
         S0C = float(data.get('S0C', 1000))
         scenario = data.get('scenario', 'classic')
+        method = data.get('method', 'analytic')
+        solver = data.get('solver', 'welfare')
+        verify = data.get('verify', False)
+        seed = data.get('seed')
+        target_se = data.get('target_se')
+        target_rel = data.get('target_rel')
+        adaptive = target_se is not None or target_rel is not None
+        antithetic = data.get('antithetic', False)
+        control_variate = data.get('control_variate', False)
+        sampler = data.get('sampler', 'pseudo')
+        dtype = data.get('dtype', 'float64')
+        correlation = data.get('correlation')
+        tail_risk = data.get('tail_risk', False)
+        var_level = float(data.get('var_level', 0.995))
+        utility = data.get('utility', 'mean')
+        risk_aversion = float(data.get('risk_aversion', RISK_AVERSION))
+        cvar_level = float(data.get('cvar_level', CVAR_LEVEL))
+        retention_step = float(data.get('retention_step', 0.1))
+        session_id = data.get('session_id')
+        # A precision target takes precedence over variance reduction
+        variance_reduction = (antithetic or control_variate or sampler != 'pseudo') and not adaptive
+        # With a precision target, N is only the cap on the number of paths
+        n_paths = int(data.get('N', MAX_N if adaptive and scenario == 'classic' else N))
         
-        print(f"[DEBUG] Parsed: retA={retA}, retB={retB}, retC={retC}, S0A={S0A}, S0B={S0B}, S0C={S0C}, scenario={scenario}")
+        print(f"[DEBUG] Parsed: retA={retA}, retB={retB}, retC={retC}, S0A={S0A}, S0B={S0B}, S0C={S0C}, scenario={scenario}, method={method}")
+
+        # JSON booleans only: bool("false") would be True
+        if not all(isinstance(flag, bool) for flag in (verify, antithetic, control_variate, tail_risk)):
+            return jsonify({"error": "verify, antithetic, control_variate and tail_risk must be true or false."}), 400
+        # JSON integers only: PCG64 rejects negative seeds, and true would seed as 1
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+            return jsonify({"error": "seed must be a non-negative integer."}), 400
+        if method not in ('analytic', 'monte_carlo'):
+            return jsonify({"error": "Invalid method."}), 400
+        if solver not in ('welfare', 'best_response', 'continuous'):
+            return jsonify({"error": "Invalid solver."}), 400
+        if dtype not in ('float64', 'float32'):
+            return jsonify({"error": "Invalid dtype."}), 400
+        if correlation is not None:
+            correlation = np.asarray(correlation, dtype=float)
+            if correlation.ndim == 0:
+                # One coefficient shared by every pair of insurers
+                correlation = np.full((3, 3), float(correlation))
+                np.fill_diagonal(correlation, 1.0)
+            try:
+                if correlation.shape != (3, 3):
+                    raise ValueError("Correlation must be a number or a 3 × 3 matrix")
+                correlation_factor(correlation)
+            except ValueError as e:
+                return jsonify({"error": f"Invalid correlation: {e}"}), 400
+        if sampler not in SAMPLERS:
+            return jsonify({"error": "Invalid sampler."}), 400
+        if sampler != 'pseudo' and n_paths < 2 * QMC_REPLICATES:
+            return jsonify({"error": f"N must be at least {2 * QMC_REPLICATES} for quasi-Monte Carlo."}), 400
+        # Streamed runs need constant memory; the others keep all N paths
+        streamed = scenario == 'classic' and not variance_reduction
+        max_paths = MAX_N if streamed else MAX_SCENARIO_N
+        if not 1 < n_paths <= max_paths:
+            return jsonify({"error": f"N must be between 2 and {max_paths}."}), 400
+        if tail_risk and not (0 < var_level < 1):
+            return jsonify({"error": "var_level must be between 0 and 1."}), 400
+        if utility not in UTILITIES:
+            return jsonify({"error": "Invalid utility."}), 400
+        if not (risk_aversion > 0 and 0 < cvar_level < 1):
+            return jsonify({"error": "risk_aversion must be positive and cvar_level between 0 and 1."}), 400
+        if not MIN_RETENTION_STEP <= retention_step <= 0.5:
+            return jsonify({"error": f"retention_step must be between {MIN_RETENTION_STEP} and 0.5."}), 400
+        # Each request gets its own PCG64 generator: no global RNG state shared between requests
+        rng = make_rng(seed)
+        extra = {}
 
         # Constraint: sum of retention rates ≤ 1
         # (retentions + ceded portions must sum to ≤ 1 across all parties)
@@ -308,35 +652,139 @@ def simulate():
 
         if scenario == 'classic':
             print("[DEBUG] Running classic scenario (user-selected retentions)...")
-            profit_A, profit_B, profit_C = simulation_3_insurers_different_premiums(
-                S0A, S0B, S0C, mu, sigma, T, N, [retA, retB, retC]
-            )
-            print(f"[DEBUG] Classic done: A={len(profit_A)}, B={len(profit_B)}, C={len(profit_C)}")
+            if method == 'analytic':
+                # Profit is linear in retention: exact expectations, no sampling needed
+                means = AnalyticScenario([S0A, S0B, S0C], mu, sigma, T).mean_profits([retA, retB, retC])
+            elif variance_reduction:
+                estimate = estimate_mean_profits_n_insurers(
+                    [S0A, S0B, S0C], mu, sigma, T, n_paths, [retA, retB, retC],
+                    antithetic=antithetic, control_variate=control_variate, rng=rng,
+                    sampler=sampler, dtype=dtype, correlation=correlation
+                )
+                print(f"[DEBUG] Classic done with variance reduction: {estimate}")
+                means = estimate["means"]
+                extra.update({
+                    "N": estimate["N"],
+                    "std_errors": estimate["std_errors"].tolist(),
+                    "variance_reduction_factors": [
+                        float(f) if np.isfinite(f) else None for f in estimate["variance_reduction_factors"]
+                    ],
+                })
+            else:
+                # Tail quantiles are sketched along the stream (about 500 centroids per insurer)
+                sketch = QuantileSketch(3) if tail_risk else None
+                if adaptive:
+                    # Grow N in batches only until the requested precision is reached
+                    moments, converged = adaptive_simulation_n_insurers(
+                        [S0A, S0B, S0C], mu, sigma, T, [retA, retB, retC],
+                        target_se=None if target_se is None else float(target_se),
+                        target_rel=None if target_rel is None else float(target_rel),
+                        max_N=n_paths, rng=rng, dtype=dtype, correlation=correlation, sketch=sketch
+                    )
+                    extra["converged"] = converged
+                else:
+                    # Streamed in chunks: only running moments are kept, whatever N is
+                    moments = streaming_simulation_n_insurers(
+                        [S0A, S0B, S0C], mu, sigma, T, n_paths, [retA, retB, retC], rng=rng, dtype=dtype,
+                        correlation=correlation, sketch=sketch
+                    )
+                print(f"[DEBUG] Classic done: {moments.count} paths per insurer")
+                means = moments.mean
+                extra.update({"N": moments.count, "std_errors": moments.std_error.tolist()})
+                if tail_risk:
+                    extra["tail_risk"] = sketch.summary(var_level)
             
         elif scenario == 'nash':
             print("[DEBUG] Running nash equilibrium scenario...")
-            retention_options = [round(i * 0.1, 1) for i in range(11)]
-            print(f"[DEBUG] Retention options: {retention_options}")
-            print(f"[DEBUG] Starting nash_equilibrium calculation...")
-            best_retentions, profits_nash = nash_equilibrium_3_insurers_different_premiums(
-                S0A, S0B, S0C, mu, sigma, T, N, retention_options
-            )
+            retention_options = nash_retention_options(retention_step)
+            print(f"[DEBUG] Retention options: {len(retention_options)} from {retention_options[0]} to {retention_options[-1]}")
+            smallest = min(ret for ret in retention_options if ret >= MIN_RETENTION)
+            if solver != 'continuous' and not feasible_mask(np.full((1, 3), smallest))[0]:
+                # Even the smallest option breaks the budget for 3 insurers: the grid has no feasible profile
+                return jsonify({"error": f"retention_step {retention_step} leaves no feasible retention profile."}), 400
+            if (utility == 'exponential' and solver != 'continuous'
+                    and len(retention_options) * n_paths > MAX_EXPONENTIAL_OPTIONS * MAX_SCENARIO_N):
+                # Tabulating the grid costs an exp per path and option: cap the product, not the step alone
+                return jsonify({"error": f"The 'exponential' utility allows at most "
+                                         f"{MAX_EXPONENTIAL_OPTIONS * MAX_SCENARIO_N // n_paths} retention options "
+                                         f"with N={n_paths}: increase retention_step or lower N."}), 400
+            sampled = not (method == 'analytic' and utility in ANALYTIC_UTILITIES)
+            fine_grid = len(retention_options) > MAX_TENSOR_OPTIONS
+            S0s = [S0A, S0B, S0C]
+            
+            sample = None if not sampled else {
+                "N": n_paths, "seed": seed, "dtype": dtype,
+                "correlation": None if correlation is None else correlation.tolist(),
+            }
+            
+            if session_id is not None and solver != 'continuous':
+                session = nash_session(str(session_id), retention_options)
+                keys = session_row_keys(S0s, utility, risk_aversion, cvar_level, sample)
+                # Concurrent requests of the session must not interleave between update and solve
+                with session.lock:
+                    reevaluated = session.update(keys, lambda players: session_payoff_rows(
+                        players, S0s, sample, rng, session_id, utility, risk_aversion, cvar_level, retention_options
+                    ))
+                    scenario_sample, objective = session.scenario(profits=True), session.scenario()
+                    # Warm start from the session's last equilibrium
+                    best_retentions, profits_nash, details = session.solve(solver)
+                    extra["session"] = {"id": session_id, "reevaluated": reevaluated,
+                                        "rows_computed": session.evaluations}
+                print(f"[DEBUG] Session {session_id}: re-evaluated insurers {reevaluated}")
+            else:
+                tensors = None
+                if fine_grid or solver == 'continuous':
+                    # Fine grid: per-player payoff tables only, the welfare search prunes the tuple space
+                    # (continuous best responses need no grid at all)
+                    scenario_sample, objective = nash_scenarios(S0s, sample, rng, utility, risk_aversion,
+                                                                cvar_level, retention_options)
+                else:
+                    # Exact expectations and seeded samples are reproducible: reuse their tensors
+                    # (payoffs are stored in the requested dtype, so it is part of the key)
+                    if seed is not None or not sampled:
+                        key = cache_key(
+                            S0s=S0s, mu=mu, sigma=sigma, T=T, retention_options=retention_options,
+                            utility=utility, risk_aversion=risk_aversion, cvar_level=cvar_level, sample=sample,
+                            dtype=dtype
+                        )
+                        tensors, extra["cache"] = payoff_cache.get_or_compute(key, lambda: nash_payoff_tensors(
+                            S0s, sample, rng, utility, risk_aversion, cvar_level, retention_options, dtype
+                        ))
+                        print(f"[DEBUG] Payoff cache: {extra['cache']} ({key[:12]})")
+                    else:
+                        tensors = nash_payoff_tensors(S0s, sample, rng, utility, risk_aversion, cvar_level,
+                                                      retention_options, dtype)
+                    scenario_sample = TensorScenario(retention_options, tensors["profits"])
+                    objective = TensorScenario(retention_options, tensors["payoffs"])
+                
+                print(f"[DEBUG] Starting nash_equilibrium calculation (solver={solver})...")
+                best_retentions, profits_nash, details = solve_nash(solver, S0s, n_paths, objective,
+                                                                    retention_options, tensors)
+            extra.update(details)
+            extra["retentions"] = best_retentions
             print(f"[DEBUG] Nash done: retentions={best_retentions}, profits={profits_nash}")
-            profit_A, profit_B, profit_C = simulation_3_insurers_different_premiums(
-                S0A, S0B, S0C, mu, sigma, T, N, best_retentions
-            )
-            print(f"[DEBUG] Final simulation done")
+            if verify:
+                # One batched pass over all unilateral deviations, on the same payoffs
+                extra["nash_report"] = verify_equilibrium(
+                    best_retentions, S0s, mu, sigma, T, n_paths, retention_options,
+                    scenario=objective
+                )
+                print(f"[DEBUG] Nash report: {extra['nash_report']}")
+            means = scenario_sample.mean_profits(best_retentions)
+            if utility != 'mean':
+                extra["utilities"] = objective.mean_profits(best_retentions).tolist()
+            print(f"[DEBUG] Final profits evaluated on the same scenario")
         else:
             return jsonify({"error": "Invalid scenario."}), 400
 
-        import numpy as np
         result = {
-            "profit_A": float(np.mean(profit_A)),
-            "profit_B": float(np.mean(profit_B)),
-            "profit_C": float(np.mean(profit_C)),
+            "profit_A": float(means[0]),
+            "profit_B": float(means[1]),
+            "profit_C": float(means[2]),
             "scenario": scenario,
             "message": f"Simulation completed for scenario: {scenario}"
         }
+        result.update(extra)
         
         print(f"[DEBUG] Result: {result}")
         return jsonify(result)
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+
+# Bump when the content of cached tensors changes for the same parameters
+CACHE_VERSION = 1
+# Number of entries kept in memory (a 21-option 3-player tensor is about 300 kB)
+MAX_ENTRIES = 64
+# Number of .npz files kept on disk (least recently used removed first)
+MAX_FILES = 1024
+
+
+def cache_key(**params):
+    """
+    Content address of a computation: SHA-256 of its parameters.
+    
+    Parameters are serialized as canonical JSON (sorted keys, see
+    _canonical), so equal parameters always give the same key whether they
+    come as ints, floats, tuples or numpy arrays.
+    
+    Args:
+        **params: Everything the result depends on (model parameters, grid, seed, ...)
+    
+    Returns:
+        Hex digest string
+    """
+    payload = json.dumps(_canonical({'version': CACHE_VERSION, **params}), sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _canonical(value):
+    """
+    Plain JSON value of a cache-key parameter.
+    
+    Numbers become floats (1500 and 1500.0 are the same premium), sequences
+    and arrays become lists, dtypes their names.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return {str(name): _canonical(item) for name, item in value.items()}
+    if isinstance(value, np.ndarray):
+        return _canonical(value.tolist())
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    if isinstance(value, (np.dtype, type)):
+        return np.dtype(value).name
+    raise TypeError(f"Cannot hash {type(value).__name__} in a cache key")
+
+
+class PayoffCache:
+    """
+    Two-level cache of payoff tensors: in-process LRU, then .npz files on disk.
+    
+    Entries are dicts of numpy arrays stored under a cache_key(). A memory miss
+    falls back to <directory>/<key>.npz and promotes the entry; a disk miss
+    computes it and writes both levels. Files are written to a temporary name
+    and renamed, so concurrent requests never read half-written tensors. A
+    disk hit refreshes the file's modification time, and a write beyond
+    max_files removes the files used least recently.
+    Returned arrays are read-only: they are shared by every later hit.
+    
+    Only deterministic results belong here (exact expectations, or Monte Carlo
+    runs with a fixed seed).
+    
+    Attributes:
+        directory: Folder of the .npz files (None = memory only)
+        max_entries: Number of entries kept in memory
+        max_files: Number of .npz files kept on disk
+        hits, disk_hits, misses: Lookup counters
+    """
+    
+    def __init__(self, directory=None, max_entries=MAX_ENTRIES, max_files=MAX_FILES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_files = max_files
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """
+        Looks an entry up in memory, then on disk.
+        
+        Args:
+            key: Cache key (see cache_key)
+        
+        Returns:
+            (arrays, status): dict of arrays and 'memory' or 'disk',
+            or (None, 'miss')
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key], 'memory'
+        
+        arrays = self._load(key)
+        with self._lock:
+            if arrays is None:
+                self.misses += 1
+                return None, 'miss'
+            self.disk_hits += 1
+            self._remember(key, arrays)
+            return arrays, 'disk'
+    
+    def put(self, key, arrays):
+        """
+        Stores an entry in memory and on disk.
+        
+        Args:
+            key: Cache key (see cache_key)
+            arrays: Dict of name -> numpy array
+        
+        Returns:
+            The stored (read-only) arrays
+        """
+        arrays = {name: self._frozen(value) for name, value in arrays.items()}
+        with self._lock:
+            self._remember(key, arrays)
+        self._save(key, arrays)
+        return arrays
+    
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached entry for key, computing and storing it on a miss.
+        
+        Args:
+            key: Cache key (see cache_key)
+            compute: Function () -> dict of arrays, called on a miss only
+        
+        Returns:
+            (arrays, status) with status 'memory', 'disk' or 'miss'
+        """
+        arrays, status = self.get(key)
+        if arrays is None:
+            arrays = self.put(key, compute())
+        return arrays, status
+    
+    def clear(self):
+        """Drops the in-memory entries (files on disk are kept)."""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """
+        JSON-friendly counters.
+        
+        Returns:
+            Dict with hits, disk_hits, misses, hit_rate and entries (in memory)
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else None,
+                'entries': len(self._entries),
+            }
+    
+    def _remember(self, key, arrays):
+        """Inserts an entry in the LRU layer (caller holds the lock)."""
+        self._entries[key] = arrays
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def _path(self, key):
+        """File of an entry in the disk layer."""
+        return os.path.join(self.directory, f"{key}.npz")
+    
+    def _load(self, key):
+        """Reads <key>.npz, or None if absent or unreadable."""
+        if self.directory is None:
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                arrays = {name: self._frozen(data[name]) for name in data.files}
+            os.utime(self._path(key))
+            return arrays
+        except (OSError, ValueError, zipfile.BadZipFile):
+            return None
+    
+    def _save(self, key, arrays):
+        """Writes <key>.npz atomically (temporary file, then rename)."""
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                np.savez(file, **arrays)
+            os.replace(temporary, self._path(key))
+        except OSError:
+            # The disk layer is best effort: the entry stays cached in memory
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return
+        self._prune()
+    
+    def _prune(self):
+        """Removes the least recently used .npz files beyond max_files."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    # Removed by another process in the meantime
+                    pass
+        files.sort()
+        for _, path in files[:max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    @staticmethod
+    def _frozen(value):
+        """Read-only copy of an array."""
+        array = np.array(value)
+        array.setflags(write=False)
+        return array
@@ -1,8 +1,888 @@
+import math
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, permutations, product
+
+import nashpy
 import numpy as np
-from backend.simulation import simulation_3_insurers, simulation_3_insurers_different_premiums
+from scipy.optimize import minimize
+from backend.simulation import (
+    make_rng,
+    seed_sequence,
+    standard_normal_shocks,
+    gbm_terminal,
+    scratch_buffer,
+    AnalyticScenario,
+    SimulationScenario,
+    scenario_n_insurers,
+)
+
+# Fairness constraint: minimum retention required for each player
+MIN_RETENTION = 0.05
+# Number of feasible retention tuples simulated per vectorized block
+BLOCK_SIZE = 256
+# Largest shock buffer of one block in bytes (blocks shrink as N grows, at least one tuple)
+BLOCK_MEMORY = 64 * 2**20
+# Payoff evaluation methods accepted by the Nash solvers
+METHODS = ('analytic', 'crn', 'independent')
+# Number of retention tuples per process-pool shard (fixed, so results do not depend on workers)
+SHARD_SIZE = 4096
+# Number of parts each player's retention interval is split into per branch-and-bound level
+BRANCHING = 4
+# Mixed-equilibrium algorithms of nashpy accepted by mixed_equilibria
+MIXED_ALGORITHMS = ('lemke_howson', 'support_enumeration')
+# Default risk aversion of the 'mean_variance' and 'exponential' utilities (per unit of profit)
+RISK_AVERSION = 0.01
+# Default confidence level of the 'cvar' utility (mean of the worst 5% of paths)
+CVAR_LEVEL = 0.95
+
+
+def retention_grid(retention_options, min_retention=MIN_RETENTION, max_total=1.0):
+    """
+    Builds the broadcast (ret_A, ret_B, ret_C) grid and its feasibility mask.
+    
+    Constraints (same as the original scalar loop):
+    - Sum of retention rates ≤ max_total (reinsurers cannot cover more than 100%)
+    - Each retention rate ≥ min_retention (fairness, every player keeps some profit)
+    
+    Args:
+        retention_options: List of possible retention rates (e.g., [0, 0.1, 0.2, ...])
+        min_retention: Minimum retention rate required for each player
+        max_total: Maximum allowed sum of retention rates
+    
+    Returns:
+        grid: Open-mesh arrays (ret_A, ret_B, ret_C) broadcasting to shape (m, m, m)
+        feasible: Boolean mask of shape (m, m, m), True for valid tuples
+    """
+    options = np.asarray(retention_options, dtype=float)
+    ret_A, ret_B, ret_C = np.ix_(options, options, options)
+    
+    # Summed left to right like ret_A + ret_B + ret_C in the loop, so float edge cases match
+    feasible = (ret_A + ret_B + ret_C) <= max_total
+    feasible &= (ret_A >= min_retention) & (ret_B >= min_retention) & (ret_C >= min_retention)
+    return (ret_A, ret_B, ret_C), feasible
+
+
+def independent_mean_profits(S0s, mu, sigma, T, N, retentions, shared_sample=False,
+                             block_size=BLOCK_SIZE, rng=None, dtype=np.float64):
+    """
+    Mean profits with a fresh, independent Monte Carlo run for every retention vector.
+    
+    The runs of a whole block of vectors are drawn in a single vectorized GBM call
+    instead of one simulation call per vector. The block holds at most
+    block_size vectors and its shocks at most BLOCK_MEMORY bytes, so the
+    per-thread scratch buffer stays bounded when N is large.
+    
+    Args:
+        S0s: Array of initial premiums, one per insurer
+        mu, sigma, T, N: GBM parameters
+        retentions: Array (k, n_insurers) of retention vectors
+        shared_sample: True if all insurers share one premium/claim draw per run
+        block_size: Largest number of retention vectors simulated per vectorized call
+        rng: Seed or np.random.Generator (see make_rng)
+        dtype: np.float64 (default) or np.float32 paths; means are accumulated in float64
+    
+    Returns:
+        means: Array (k, n_insurers) of mean profits
+    """
+    rng = make_rng(rng)
+    retentions = np.asarray(retentions, dtype=float)
+    
+    # One premium/claim source for the shared game, one per insurer otherwise
+    n_sources = 1 if shared_sample else retentions.shape[1]
+    S0s = np.asarray(S0s, dtype=float)[:n_sources, None]
+    # Premium and claim shocks of one vector take 2 × n_sources × N values
+    block_size = min(block_size, max(1, BLOCK_MEMORY // (2 * n_sources * N * np.dtype(dtype).itemsize)))
+    
+    means = np.empty(retentions.shape)
+    for start in range(0, len(retentions), block_size):
+        stop = min(start + block_size, len(retentions))
+        shape = (2, stop - start, n_sources, N)
+        # Premium and claim shocks of the block share one per-thread buffer and
+        # become GBM values and margins in place
+        shocks = standard_normal_shocks(shape, rng, out=scratch_buffer('block_shocks', shape, dtype))
+        premiums = gbm_terminal(S0s, mu, sigma, T, shocks[0], out=shocks[0])
+        # Claims = 70% of premiums (realistic loss ratio for insurance)
+        claims = gbm_terminal(S0s * 0.7, mu, sigma, T, shocks[1], out=shocks[1])
+        
+        # Profit = Retention × (Premium - Claims), averaged over the N paths
+        margins = np.mean(np.subtract(premiums, claims, out=premiums), axis=2, dtype=np.float64)
+        means[start:stop] = retentions[start:stop] * margins
+    return means
+
+
+def payoff_tensor(S0s, mu, sigma, T, N, retention_options, shared_sample=False, block_size=BLOCK_SIZE,
+                  rng=None, dtype=np.float64, symmetric=None):
+    """
+    Builds the mean-profit payoff tensor over every feasible retention tuple.
+    
+    Every feasible tuple gets its own independent Monte Carlo run, as in the
+    original scalar loop, but sampled block by block (see independent_mean_profits).
+    In a symmetric game only the sorted tuples are simulated (see symmetric_payoffs).
+    
+    Args:
+        S0s: Initial premiums [S0A, S0B, S0C]
+        mu, sigma, T, N: GBM parameters
+        retention_options: List of possible retention rates
+        shared_sample: True if the 3 insurers share one premium/claim draw
+                       (identical-premium game, as in simulation_3_insurers)
+        block_size: Number of feasible tuples simulated per vectorized call
+        rng: Seed or np.random.Generator (see make_rng)
+        dtype: np.float64 (default) or np.float32 paths and payoff storage
+        symmetric: Evaluate sorted tuples only (None = when all S0s are equal)
+    
+    Returns:
+        feasible: Boolean mask of shape (m, m, m)
+        payoffs: Array of shape (3, m, m, m) with mean profits, NaN where infeasible
+    """
+    if symmetric is None:
+        symmetric = is_symmetric_game(S0s)
+    
+    def mean_profits(retentions):
+        return independent_mean_profits(S0s, mu, sigma, T, N, retentions, shared_sample, block_size, rng, dtype)
+    
+    return _payoff_tensor(retention_options, mean_profits, symmetric, dtype)
+
+
+def scenario_payoff_tensor(scenario, retention_options, dtype=np.float64, symmetric=None):
+    """
+    Builds the mean-profit payoff tensor against one scenario.
+    
+    With a SimulationScenario all feasible tuples are evaluated on the same
+    premiums and claims, so the whole tensor costs a single GBM draw and
+    differences between tuples carry no sampling noise. With an AnalyticScenario
+    the tensor holds exact expected profits and nothing is sampled.
+    
+    Args:
+        scenario: SimulationScenario or AnalyticScenario for the request
+        retention_options: List of possible retention rates
+        dtype: np.float64 (default) or np.float32 payoff storage
+        symmetric: Evaluate sorted tuples only (None = detect, see is_symmetric_game)
+    
+    Returns:
+        feasible: Boolean mask of shape (m, m, m)
+        payoffs: Array of shape (3, m, m, m) with mean profits, NaN where infeasible
+    """
+    if symmetric is None:
+        symmetric = is_symmetric_game(None, scenario)
+    return _payoff_tensor(retention_options, scenario.mean_profits, symmetric, dtype)
+
+
+def _payoff_tensor(retention_options, mean_profits, symmetric, dtype):
+    """
+    Fills the payoff tensor from a batch evaluator of mean profits.
+    
+    Args:
+        retention_options: List of possible retention rates
+        mean_profits: Function (k, 3) retention vectors -> (k, 3) mean profits
+        symmetric: Evaluate sorted tuples only and expand them to every ordering
+        dtype: Payoff storage dtype
+    
+    Returns:
+        feasible, payoffs: As in payoff_tensor
+    """
+    _, feasible = retention_grid(retention_options)
+    options = np.asarray(retention_options, dtype=float)
+    payoffs = np.full((3,) + feasible.shape, np.nan, dtype=dtype)
+    
+    # Feasible cells in loop order (ret_A outer, ret_C inner)
+    cells = np.argwhere(feasible)
+    if not symmetric:
+        payoffs[:, feasible] = mean_profits(options[cells]).T
+        return feasible, payoffs
+    
+    # One sorted representative per set of orderings, in lexicographic order
+    canonical = np.unique(np.sort(cells, axis=1), axis=0)
+    if len(canonical):
+        profiles, profits = symmetric_payoffs(canonical, mean_profits(options[canonical]))
+        payoffs[(slice(None),) + tuple(profiles.T)] = profits.T
+        # Float sums depend on the order of the terms: some orderings of a sorted
+        # feasible tuple can be infeasible (and the other way round)
+        payoffs[:, ~feasible] = np.nan
+    return feasible, payoffs
+
+
+def is_symmetric_game(S0s, scenario=None):
+    """
+    Checks whether permuting the players permutes their payoffs.
+    
+    True for a scenario whose players share one premium/claim draw
+    (identical-premium game), for exact expectations with identical margins,
+    and for independent runs (scenario None) when all S0s are equal.
+    
+    Args:
+        S0s: Array of initial premiums, one per insurer (used without a scenario)
+        scenario: Optional SimulationScenario, AnalyticScenario or RiskAdjustedScenario
+    
+    Returns:
+        True if the game is symmetric
+    """
+    if isinstance(scenario, RiskAdjustedScenario):
+        scenario = scenario.scenario
+    if isinstance(scenario, AnalyticScenario):
+        return bool(np.all(scenario.mean_margins == scenario.mean_margins[0])
+                    and np.all(scenario.variance_margins == scenario.variance_margins[0]))
+    if scenario is not None:
+        # A simulated sample is symmetric when all players share one draw
+        return len(getattr(scenario, 'margins', ())) == 1
+    S0s = np.asarray(S0s, dtype=float)
+    return bool(np.all(S0s == S0s[0]))
+
+
+def symmetric_payoffs(canonical, means):
+    """
+    Expands payoffs of sorted tuples to every ordering of the players.
+    
+    In a symmetric game the profile π(c) (player j gets c[π_j]) pays player j
+    what c pays player π_j, so n players need n! fewer payoff evaluations.
+    
+    Args:
+        canonical: Array (k, n_players) of sorted tuples (values or option indices)
+        means: Array (k, n_players) of their payoffs
+    
+    Returns:
+        profiles: Array (k × n!, n_players), every ordering of every tuple
+        payoffs: Array (k × n!, n_players) of the matching payoffs
+    """
+    n_players = canonical.shape[1]
+    orders = np.array(list(permutations(range(n_players))))
+    return canonical[:, orders].reshape(-1, n_players), means[:, orders].reshape(-1, n_players)
+
+
+def mean_statistics(margins, level):
+    """
+    Sample statistic of the risk-neutral utility.
+    
+    Args:
+        margins: Array (N,) of simulated margins M = Premium - Claims of one player
+        level: Confidence level of 'cvar' (unused by the other utilities)
+    
+    Returns:
+        (E[M],)
+    """
+    return (np.mean(margins, dtype=np.float64),)
+
+
+def mean_variance_statistics(margins, level):
+    """
+    Sample statistics of the mean-variance utility.
+    
+    Returns:
+        (E[M], Var[M]) (see mean_statistics for the arguments)
+    """
+    return np.mean(margins, dtype=np.float64), np.var(margins, dtype=np.float64)
 
 
-def nash_equilibrium_3_insurers(S0, mu, sigma, T, N, retention_options):
+def cvar_statistics(margins, level):
+    """
+    Sample statistic of the CVaR utility: the mean of the worst (1 - level) fraction of paths.
+    
+    CVaR is positively homogeneous, so for r ≥ 0 the tail mean of r × M is
+    r × the tail mean of M: one partial sort of the sample serves every retention.
+    
+    Returns:
+        (tail mean of M,) (see mean_statistics for the arguments)
+    """
+    tail = max(1, int(round((1 - level) * len(margins))))
+    return (np.mean(np.partition(margins, tail - 1)[:tail], dtype=np.float64),)
+
+
+def exponential_statistics(margins, level):
+    """
+    Sample statistics of the exponential utility: the margins shifted by their minimum m0.
+    
+    For r ≥ 0 every exponent -a × r × (M - m0) is then ≤ 0, so large losses
+    cannot overflow.
+    
+    Returns:
+        (m0, Array (N,) of M - m0 in float64) (see mean_statistics for the arguments)
+    """
+    lowest = np.min(margins)
+    return lowest, np.subtract(margins, lowest, dtype=np.float64)
+
+
+def mean_utility(statistics, retentions, risk_aversion):
+    """
+    Risk-neutral utility: E[r × M].
+    
+    Args:
+        statistics: Sample statistics of one player (see UTILITY_STATISTICS)
+        retentions: Array (k,) of retention rates
+        risk_aversion: Unused (same signature as the other utilities)
+    
+    Returns:
+        Array (k,) of expected profits
+    """
+    mean, = statistics
+    return retentions * mean
+
+
+def mean_variance_utility(statistics, retentions, risk_aversion):
+    """
+    Mean-variance utility: E[r × M] - risk_aversion / 2 × Var[r × M].
+    
+    Returns:
+        Array (k,) of risk-adjusted profits (see mean_utility for the arguments)
+    """
+    mean, variance = statistics
+    return retentions * mean - 0.5 * risk_aversion * retentions**2 * variance
+
+
+def cvar_utility(statistics, retentions, risk_aversion):
+    """
+    Expected profit over the worst (1 - level) fraction of paths (lower CVaR).
+    
+    Returns:
+        Array (k,) of tail-mean profits (see mean_utility for the arguments)
+    """
+    tail_mean, = statistics
+    return retentions * tail_mean
+
+
+def exponential_utility(statistics, retentions, risk_aversion):
+    """
+    Certainty equivalent of exponential (CARA) utility: -log E[exp(-a × r × M)] / a.
+    
+    Each retention costs one pass over the shifted margins (multiply, exp,
+    mean) in a per-thread buffer: k × N exponentials, the bulk of the time on
+    fine grids (seconds for 1000 options at N = 10^6, against a fraction of a
+    second risk-neutral). Batching options into (k, N) blocks saves no
+    exponential and is slower once a block leaves the cache, so callers cap
+    k × N instead (see MAX_EXPONENTIAL_OPTIONS in backend.app).
+    
+    Returns:
+        Array (k,) of certainty-equivalent profits (see mean_utility for the arguments)
+    """
+    lowest, shifted = statistics
+    buffer = scratch_buffer('utility', shifted.shape)
+    utilities = np.empty(len(retentions))
+    for k, retention in enumerate(retentions):
+        np.exp(np.multiply(shifted, -risk_aversion * retention, out=buffer), out=buffer)
+        utilities[k] = retention * lowest - np.log(np.mean(buffer)) / risk_aversion
+    return utilities
+
+
+def mean_utility_gradient(statistics, retentions, risk_aversion):
+    """
+    Derivative of mean_utility in the retention: E[M].
+    
+    Returns:
+        Array (k,) of marginal utilities (see mean_utility for the arguments)
+    """
+    mean, = statistics
+    return np.full(len(retentions), mean)
+
+
+def mean_variance_utility_gradient(statistics, retentions, risk_aversion):
+    """
+    Derivative of mean_variance_utility in the retention: E[M] - risk_aversion × r × Var[M].
+    
+    Returns:
+        Array (k,) of marginal utilities (see mean_utility for the arguments)
+    """
+    mean, variance = statistics
+    return mean - risk_aversion * retentions * variance
+
+
+def cvar_utility_gradient(statistics, retentions, risk_aversion):
+    """
+    Derivative of cvar_utility in the retention: the tail mean of M (r ≥ 0).
+    
+    Returns:
+        Array (k,) of marginal utilities (see mean_utility for the arguments)
+    """
+    tail_mean, = statistics
+    return np.full(len(retentions), tail_mean)
+
+
+def exponential_utility_gradient(statistics, retentions, risk_aversion):
+    """
+    Derivative of exponential_utility in the retention.
+    
+    The mean margin under the exponentially tilted weights w = exp(-a × r × M),
+    E[M × w] / E[w], computed on the same shifted margins as the utility.
+    
+    Returns:
+        Array (k,) of marginal utilities (see mean_utility for the arguments)
+    """
+    lowest, shifted = statistics
+    buffer = scratch_buffer('utility', shifted.shape)
+    gradients = np.empty(len(retentions))
+    for k, retention in enumerate(retentions):
+        np.exp(np.multiply(shifted, -risk_aversion * retention, out=buffer), out=buffer)
+        gradients[k] = lowest + np.dot(shifted, buffer) / np.sum(buffer)
+    return gradients
+
+
+# Sample statistics each utility reads from one player's margins (computed once per sample)
+UTILITY_STATISTICS = {
+    'mean': mean_statistics,
+    'mean_variance': mean_variance_statistics,
+    'cvar': cvar_statistics,
+    'exponential': exponential_statistics,
+}
+# Per-player utilities of profit, all expressed as certainty equivalents (same unit as profit)
+UTILITIES = {
+    'mean': mean_utility,
+    'mean_variance': mean_variance_utility,
+    'cvar': cvar_utility,
+    'exponential': exponential_utility,
+}
+# Derivatives of the utilities in the retention (for the continuous solver)
+UTILITY_GRADIENTS = {
+    'mean': mean_utility_gradient,
+    'mean_variance': mean_variance_utility_gradient,
+    'cvar': cvar_utility_gradient,
+    'exponential': exponential_utility_gradient,
+}
+# Utilities with a closed form on AnalyticScenario (the others need a simulated sample)
+ANALYTIC_UTILITIES = ('mean', 'mean_variance')
+
+
+class RiskAdjustedScenario:
+    """
+    Certainty-equivalent profits of every player under a utility, on a fixed scenario.
+    
+    An insurer's profit r_i × (P_i - C_i) only depends on its own retention, so
+    its utility does too: utilities are tabulated once per (player, retention)
+    on the shared sample, and every retention profile is then scored by table
+    lookup. The grid search itself costs the same as the risk-neutral one, and
+    the sample statistics (moments, tail order statistics) are computed once
+    per player instead of once per grid cell.
+    
+    mean_profits() has the same signature as on SimulationScenario, so every
+    Nash solver accepts this scenario unchanged and maximizes utilities instead
+    of mean profits.
+    
+    Attributes:
+        scenario: Underlying SimulationScenario or AnalyticScenario
+        utility: Name of the utility (see UTILITIES)
+        risk_aversion: Risk aversion of 'mean_variance' and 'exponential'
+        level: Confidence level of 'cvar'
+        n_insurers: Number of insurers in the scenario
+        n_rows: Number of distinct rows of margins (1 with a shared sample)
+        statistics: Dict of the sample statistics of each row (see sample_statistics)
+        values: Sorted array of the retentions tabulated so far
+        table: Array (n_insurers, len(values)) of utilities
+    """
+    
+    def __init__(self, scenario, utility='mean', risk_aversion=RISK_AVERSION, level=CVAR_LEVEL,
+                 retention_options=()):
+        if utility not in UTILITIES:
+            raise ValueError(f"Unknown utility: {utility}")
+        if isinstance(scenario, AnalyticScenario) and utility not in ANALYTIC_UTILITIES:
+            raise ValueError(f"The '{utility}' utility needs a simulated scenario")
+        self.scenario = scenario
+        self.utility = utility
+        self.risk_aversion = risk_aversion
+        self.level = level
+        self.n_insurers = scenario.n_insurers
+        # Rows of distinct sample statistics: one per player, or one for a shared sample
+        self.n_rows = len(scenario.margins) if isinstance(scenario, SimulationScenario) else self.n_insurers
+        self.statistics = {}
+        self.values = np.empty(0)
+        self.table = np.empty((self.n_insurers, 0))
+        self.tabulate(retention_options)
+    
+    def sample_statistics(self, row):
+        """
+        Sample statistics the utility reads from one row of margins, computed once.
+        
+        On an AnalyticScenario the rows are the players and the statistics are
+        their closed-form moments; on a sample they are the rows of margins
+        (a single one with a shared sample).
+        
+        Args:
+            row: Index of the player (or of the margins row)
+        
+        Returns:
+            Statistics tuple accepted by UTILITIES and UTILITY_GRADIENTS
+        """
+        if row not in self.statistics:
+            if isinstance(self.scenario, AnalyticScenario):
+                moments = (self.scenario.mean_margins[row], self.scenario.variance_margins[row])
+                self.statistics[row] = moments[:1] if self.utility == 'mean' else moments
+            else:
+                self.statistics[row] = UTILITY_STATISTICS[self.utility](self.scenario.margins[row], self.level)
+        return self.statistics[row]
+    
+    def utility_table(self, retentions, gradient=False):
+        """
+        Utility of every player at each retention rate.
+        
+        Args:
+            retentions: Array (k,) of retention rates
+            gradient: Return the derivatives of the utilities in the retention instead
+        
+        Returns:
+            Array (n_insurers, k) of certainty-equivalent profits (or their derivatives)
+        """
+        retentions = np.asarray(retentions, dtype=float)
+        function = (UTILITY_GRADIENTS if gradient else UTILITIES)[self.utility]
+        # With a shared sample every player has the same margins: one row serves all
+        rows = [function(self.sample_statistics(row), retentions, self.risk_aversion) for row in range(self.n_rows)]
+        return np.broadcast_to(np.array(rows), (self.n_insurers, len(retentions)))
+    
+    def player_utility(self, player, retention):
+        """
+        Utility of one player at one retention rate and its derivative.
+        
+        Same values as utility_table() and utility_table(gradient=True), but
+        only the player's own (cached) sample statistics are read.
+        
+        Args:
+            player: Index of the insurer
+            retention: Retention rate
+        
+        Returns:
+            (utility, derivative) as floats
+        """
+        statistics = self.sample_statistics(player if self.n_rows > 1 else 0)
+        retentions = np.array([float(retention)])
+        return (float(UTILITIES[self.utility](statistics, retentions, self.risk_aversion)[0]),
+                float(UTILITY_GRADIENTS[self.utility](statistics, retentions, self.risk_aversion)[0]))
+    
+    def tabulate(self, retentions):
+        """
+        Adds the retention rates not tabulated yet.
+        
+        Args:
+            retentions: Array of retention rates (any shape)
+        """
+        new = np.setdiff1d(np.asarray(retentions, dtype=float), self.values)
+        if len(new) == 0:
+            return
+        values = np.concatenate([self.values, new])
+        table = np.concatenate([self.table, self.utility_table(new)], axis=1)
+        order = np.argsort(values)
+        self.values, self.table = values[order], table[:, order]
+    
+    def mean_profits(self, retentions):
+        """
+        Utilities for any batch of retention vectors.
+        
+        Args:
+            retentions: Array (..., n_insurers) of retention vectors
+        
+        Returns:
+            Array (..., n_insurers) of certainty-equivalent profits
+        """
+        retentions = np.asarray(retentions, dtype=float)
+        self.tabulate(retentions)
+        return self.table[np.arange(self.n_insurers), np.searchsorted(self.values, retentions)]
+
+
+class TensorScenario:
+    """
+    Payoffs read from a precomputed payoff tensor (e.g. a cached one).
+    
+    Best-response dynamics and equilibrium checks only call mean_profits() on
+    grid profiles, so they can run on a tensor built by scenario_payoff_tensor()
+    without the sample it came from.
+    
+    Attributes:
+        n_insurers: Number of insurers (first axis of the tensor)
+        options: Array (m,) of retention options indexing the other axes
+        payoffs: Array (n_insurers, m, ..., m) of payoffs
+    """
+    
+    def __init__(self, retention_options, payoffs):
+        self.options = np.asarray(retention_options, dtype=float)
+        self.payoffs = payoffs
+        self.n_insurers = payoffs.shape[0]
+        self._order = np.argsort(self.options)
+    
+    def mean_profits(self, retentions):
+        """
+        Payoffs for any batch of grid retention vectors.
+        
+        Args:
+            retentions: Array (..., n_insurers) of retention vectors taken from the options
+        
+        Returns:
+            Array (..., n_insurers) of payoffs (float64)
+        """
+        retentions = np.asarray(retentions, dtype=float)
+        position = np.searchsorted(self.options[self._order], retentions).clip(max=len(self.options) - 1)
+        index = self._order[position]
+        if not np.array_equal(self.options[index], retentions):
+            raise ValueError("Retentions must be taken from the retention options")
+        cells = self.payoffs[(slice(None),) + tuple(np.moveaxis(index, -1, 0))]
+        return np.moveaxis(cells, 0, -1).astype(np.float64)
+
+
+class TableScenario:
+    """
+    Payoffs read from per-player tables (one row per insurer, one column per option).
+    
+    Each insurer's payoff only depends on its own retention, so m payoffs per
+    player describe the whole game (a tensor needs m^players cells); rows can
+    be computed and replaced one insurer at a time (see NashSession).
+    
+    Attributes:
+        n_insurers: Number of insurers (rows of the table)
+        options: Array (m,) of retention options indexing the columns
+        table: Array (n_insurers, m) of payoffs
+    """
+    
+    def __init__(self, retention_options, table):
+        self.options = np.asarray(retention_options, dtype=float)
+        self.table = np.asarray(table, dtype=np.float64)
+        self.n_insurers = self.table.shape[0]
+        self._order = np.argsort(self.options)
+    
+    def mean_profits(self, retentions):
+        """
+        Payoffs for any batch of grid retention vectors.
+        
+        Args:
+            retentions: Array (..., n_insurers) of retention vectors taken from the options
+        
+        Returns:
+            Array (..., n_insurers) of payoffs
+        """
+        retentions = np.asarray(retentions, dtype=float)
+        position = np.searchsorted(self.options[self._order], retentions).clip(max=len(self.options) - 1)
+        index = self._order[position]
+        if not np.array_equal(self.options[index], retentions):
+            raise ValueError("Retentions must be taken from the retention options")
+        return self.table[np.arange(self.n_insurers), index]
+
+
+class IndependentScenario:
+    """
+    Mean profits with a fresh, independent Monte Carlo run for every retention vector.
+    
+    Gives the 'independent' method the mean_profits() interface of the other
+    scenarios, so solvers written against a scenario serve it too. Nothing is
+    reused: every call draws new paths from rng (see independent_mean_profits).
+    
+    Attributes:
+        n_insurers: Number of insurers
+        S0s, mu, sigma, T, N, shared_sample, rng, dtype: Arguments of independent_mean_profits
+    """
+    
+    def __init__(self, S0s, mu, sigma, T, N, shared_sample=False, rng=None, dtype=np.float64):
+        self.S0s = S0s
+        self.mu, self.sigma, self.T, self.N = mu, sigma, T, N
+        self.shared_sample = shared_sample
+        self.rng = make_rng(rng)
+        self.dtype = dtype
+        self.n_insurers = len(S0s)
+    
+    def mean_profits(self, retentions):
+        """
+        Mean profits of a batch of retention vectors, one fresh run each.
+        
+        Args:
+            retentions: Array (..., n_insurers) of retention vectors
+        
+        Returns:
+            Array (..., n_insurers) of mean profits
+        """
+        retentions = np.asarray(retentions, dtype=float)
+        means = independent_mean_profits(self.S0s, self.mu, self.sigma, self.T, self.N,
+                                         retentions.reshape(-1, self.n_insurers), self.shared_sample,
+                                         rng=self.rng, dtype=self.dtype)
+        return means.reshape(retentions.shape)
+
+
+def player_payoff_rows(scenario, players, retention_options, utility='mean', risk_aversion=RISK_AVERSION,
+                       level=CVAR_LEVEL):
+    """
+    Payoffs and mean profits of selected insurers at every retention option.
+    
+    On a sample with one draw per insurer, each selected insurer is scored on
+    its own draw only, so refreshing one insurer costs one row, not a table.
+    
+    Args:
+        scenario: AnalyticScenario or SimulationScenario with every insurer
+        players: Indices of the insurers to evaluate
+        retention_options: List of retention rates (columns)
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+    
+    Returns:
+        payoffs: Array (len(players), m) of utilities (mean profits for 'mean')
+        profits: Array (len(players), m) of mean profits
+    """
+    options = np.asarray(retention_options, dtype=float)
+    payoffs, profits = [], []
+    for i in players:
+        part, row = scenario, i
+        if isinstance(scenario, SimulationScenario):
+            source = i if len(scenario.margins) > 1 else 0
+            part, row = SimulationScenario(scenario.premiums[source], scenario.claims[source], 1), 0
+        profit = part.mean_profits(np.repeat(options[:, None], part.n_insurers, axis=1))[:, row]
+        profits.append(profit)
+        if utility == 'mean':
+            payoffs.append(profit)
+        else:
+            payoffs.append(RiskAdjustedScenario(part, utility, risk_aversion, level).utility_table(options)[row])
+    m = len(options)
+    return np.array(payoffs).reshape(-1, m), np.array(profits).reshape(-1, m)
+
+
+def make_scenario(S0s, mu, sigma, T, N, method='analytic', shared_sample=False, rng=None,
+                  dtype=np.float64, utility='mean', risk_aversion=RISK_AVERSION, level=CVAR_LEVEL):
+    """
+    Builds the scenario used to evaluate mean profits for a given method.
+    
+    Utilities without a closed form ('cvar', 'exponential') switch an
+    'analytic' request to 'crn': they are evaluated on one shared sample.
+    
+    Args:
+        S0s: Array of initial premiums, one per insurer
+        mu, sigma, T, N: GBM parameters
+        method: 'analytic', 'crn' or 'independent' (see METHODS)
+        shared_sample: True if all insurers share one premium/claim draw
+        rng: Seed or np.random.Generator (see make_rng)
+        dtype: Storage dtype of a 'crn' sample (np.float64 or np.float32)
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+    
+    Returns:
+        AnalyticScenario, SimulationScenario, RiskAdjustedScenario (any utility
+        but 'mean'), or None for 'independent' (a fresh Monte Carlo run per
+        retention vector, no reusable scenario)
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    if utility not in UTILITIES:
+        raise ValueError(f"Unknown utility: {utility}")
+    if utility != 'mean':
+        if method == 'independent':
+            raise ValueError("Risk-aware utilities need a shared scenario ('analytic' or 'crn')")
+        if method == 'analytic' and utility not in ANALYTIC_UTILITIES:
+            method = 'crn'
+    
+    if method == 'analytic':
+        scenario = AnalyticScenario(S0s, mu, sigma, T)
+    elif method == 'crn':
+        scenario = scenario_n_insurers(S0s, mu, sigma, T, N, shared_sample, rng, dtype=dtype)
+    else:
+        return None
+    if utility == 'mean':
+        return scenario
+    return RiskAdjustedScenario(scenario, utility, risk_aversion, level)
+
+
+def utility_scenario(scenario, utility='mean', risk_aversion=RISK_AVERSION, level=CVAR_LEVEL):
+    """
+    Scenario given to a solver, scored under the requested utility.
+    
+    A sample (SimulationScenario or AnalyticScenario) is wrapped in a
+    RiskAdjustedScenario for any utility but 'mean'. Any other scenario already
+    has its payoffs: it is used as is for 'mean', and a RiskAdjustedScenario
+    also when it scores the requested utility with the same parameters.
+    
+    Args:
+        scenario: Scenario passed to the solver
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+    
+    Returns:
+        Scenario whose mean_profits() are the requested payoffs
+    
+    Raises:
+        ValueError: The scenario cannot be scored under the utility
+    """
+    if utility == 'mean':
+        return scenario
+    if isinstance(scenario, (SimulationScenario, AnalyticScenario)):
+        return RiskAdjustedScenario(scenario, utility, risk_aversion, level)
+    if isinstance(scenario, RiskAdjustedScenario):
+        if (scenario.utility, scenario.risk_aversion, scenario.level) == (utility, risk_aversion, level):
+            return scenario
+        raise ValueError(f"The scenario already scores the '{scenario.utility}' utility "
+                         f"(risk_aversion={scenario.risk_aversion}, level={scenario.level}); "
+                         f"pass its underlying scenario to score '{utility}'")
+    raise ValueError(f"The '{utility}' utility needs a SimulationScenario or AnalyticScenario, "
+                     f"not a {type(scenario).__name__}")
+
+
+def solver_scenario(S0s, mu, sigma, T, N, method='analytic', scenario=None, shared_sample=False, rng=None,
+                    dtype=np.float64, utility='mean', risk_aversion=RISK_AVERSION, level=CVAR_LEVEL,
+                    solver=None, fresh_runs=False):
+    """
+    Scenario a solver scores retention profiles on.
+    
+    A scenario passed by the caller is scored under the utility (see
+    utility_scenario); otherwise one is built for the method (see make_scenario).
+    'independent' has no reusable scenario: by default None is returned for the
+    solver to sample its own blocks.
+    
+    Args:
+        S0s, mu, sigma, T, N, method, shared_sample, rng, dtype: As in make_scenario
+        scenario: Optional scenario passed to the solver (overrides method)
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+        solver: Name of a solver that needs a shared scenario ('independent' then raises)
+        fresh_runs: Return an IndependentScenario for 'independent' instead
+    
+    Returns:
+        Scenario whose mean_profits() are the payoffs, or None (see above)
+    
+    Raises:
+        ValueError: 'independent' for a solver that needs a shared scenario, or
+                    a scenario that cannot be scored under the utility
+    """
+    if scenario is not None:
+        return utility_scenario(scenario, utility, risk_aversion, level)
+    scenario = make_scenario(S0s, mu, sigma, T, N, method, shared_sample, rng, dtype, utility, risk_aversion,
+                             level)
+    if scenario is None and solver is not None:
+        raise ValueError(f"{solver} needs a shared scenario ('analytic' or 'crn')")
+    if scenario is None and fresh_runs:
+        return IndependentScenario(S0s, mu, sigma, T, N, shared_sample, rng, dtype)
+    return scenario
+
+
+def welfare_objective(payoffs):
+    """
+    Total profit plus a fairness bonus of 0.1 × the minimum profit.
+    
+    Args:
+        payoffs: Array of shape (3, ...) with mean profits of each player
+    
+    Returns:
+        objective: Array of shape (...) with the combined objective
+    """
+    return payoffs.sum(axis=0) + 0.1 * payoffs.min(axis=0)
+
+
+def best_welfare_retentions(retention_options, feasible, payoffs):
+    """
+    Picks the feasible tuple maximizing the welfare objective.
+    
+    Ties go to the first tuple in loop order, like the original strict '>' check.
+    
+    Args:
+        retention_options: List of possible retention rates
+        feasible: Boolean feasibility mask of shape (m, m, m)
+        payoffs: Mean-profit tensor of shape (3, m, m, m)
+    
+    Returns:
+        best_retentions: List of optimal retention rates [ret_A, ret_B, ret_C]
+        profits_at_nash: Corresponding profits [profit_A, profit_B, profit_C]
+    """
+    # Fallback if no valid combination found
+    if not feasible.any():
+        return [0.33, 0.33, 0.34], [0.0, 0.0, 0.0]
+    
+    objective = np.full(feasible.shape, -np.inf)
+    objective[feasible] = welfare_objective(payoffs[:, feasible])
+    best = np.unravel_index(np.argmax(objective), objective.shape)
+    
+    best_retentions = [float(retention_options[i]) for i in best]
+    profits_at_nash = [float(p) for p in payoffs[(slice(None),) + best]]
+    return best_retentions, profits_at_nash
+
+
+def nash_equilibrium_3_insurers(S0, mu, sigma, T, N, retention_options,
+                               method='analytic', scenario=None, rng=None, dtype=np.float64, utility='mean',
+                               risk_aversion=RISK_AVERSION, level=CVAR_LEVEL):
     """
     Finds an approximate Nash equilibrium for 3 insurers with identical premiums.
     
@@ -17,60 +897,37 @@ def nash_equilibrium_3_insurers(S0, mu, sigma, T, N, retention_options):
     Args:
         S0, mu, sigma, T, N: GBM parameters
         retention_options: List of possible retention rates (e.g., [0, 0.1, 0.2, ...])
+        method: How mean profits are evaluated:
+                'analytic' - exact closed-form expectations, no sampling (default)
+                'crn' - one shared Monte Carlo sample for every tuple
+                'independent' - a fresh Monte Carlo run per tuple
+        scenario: Optional SimulationScenario or AnalyticScenario to reuse (overrides method)
+        rng: Seed or np.random.Generator for the Monte Carlo methods (see make_rng)
+        dtype: np.float64 (default) or np.float32 paths and payoff tensor
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
     
     Returns:
         best_retentions: List of optimal retention rates [ret_A, ret_B, ret_C]
         profits_at_nash: Corresponding profits [profit_A, profit_B, profit_C]
     """
+    rng = make_rng(rng)
+    scenario = solver_scenario([S0, S0, S0], mu, sigma, T, N, method, scenario, True, rng, dtype, utility,
+                               risk_aversion, level)
     
-    best_retentions = [0.0, 0.0, 0.0]
-    best_objective = float('-inf')
-    profits_at_nash = [0.0, 0.0, 0.0]
-
-    # Test all valid combinations
-    for ret_A in retention_options:
-        for ret_B in retention_options:
-            for ret_C in retention_options:
-                # Constraint 1: sum of retention rates ≤ 1
-                # (reinsurers cannot cover more than 100%)
-                if ret_A + ret_B + ret_C > 1.0:
-                    continue
-                
-                # Constraint 2: Fairness - ensure all players get non-zero profit
-                # Require minimum 0.05 retention for each player
-                if ret_A < 0.05 or ret_B < 0.05 or ret_C < 0.05:
-                    continue
-                
-                retentions = [ret_A, ret_B, ret_C]
-                profit_A, profit_B, profit_C = simulation_3_insurers(S0, mu, sigma, T, N, retentions)
-                
-                # Calculate objectives
-                mean_A = np.mean(profit_A)
-                mean_B = np.mean(profit_B)
-                mean_C = np.mean(profit_C)
-                
-                # Objective: Maximize total welfare while ensuring fairness
-                total_profit = mean_A + mean_B + mean_C
-                
-                # Fairness bonus: penalize if one player dominates too much
-                min_profit = min(mean_A, mean_B, mean_C)
-                
-                # Combined objective: maximize total + fairness bonus
-                objective = total_profit + (0.1 * min_profit)
-                
-                if objective > best_objective:
-                    best_objective = objective
-                    best_retentions = retentions
-                    profits_at_nash = [mean_A, mean_B, mean_C]
-    
-    # Fallback if no valid combination found
-    if best_retentions == [0.0, 0.0, 0.0]:
-        best_retentions = [0.33, 0.33, 0.34]
-    
-    return best_retentions, profits_at_nash
+    if scenario is not None:
+        feasible, payoffs = scenario_payoff_tensor(scenario, retention_options, dtype)
+    else:
+        feasible, payoffs = payoff_tensor(
+            [S0, S0, S0], mu, sigma, T, N, retention_options, shared_sample=True, rng=rng, dtype=dtype
+        )
+    return best_welfare_retentions(retention_options, feasible, payoffs)
 
 
-def nash_equilibrium_3_insurers_different_premiums(S0A, S0B, S0C, mu, sigma, T, N, retention_options):
+def nash_equilibrium_3_insurers_different_premiums(S0A, S0B, S0C, mu, sigma, T, N, retention_options,
+                                                   method='analytic', scenario=None, rng=None,
+                                                   dtype=np.float64, utility='mean', risk_aversion=RISK_AVERSION,
+                                                   level=CVAR_LEVEL):
     """
     Finds an approximate Nash equilibrium for 3 insurers with different premiums.
     
@@ -80,58 +937,1127 @@ def nash_equilibrium_3_insurers_different_premiums(S0A, S0B, S0C, mu, sigma, T,
         S0A, S0B, S0C: Initial premium amounts for each insurer
         mu, sigma, T, N: GBM parameters
         retention_options: List of possible retention rates
+        method: How mean profits are evaluated:
+                'analytic' - exact closed-form expectations, no sampling (default)
+                'crn' - one shared Monte Carlo sample for every tuple
+                'independent' - a fresh Monte Carlo run per tuple
+        scenario: Optional SimulationScenario or AnalyticScenario to reuse (overrides method)
+        rng: Seed or np.random.Generator for the Monte Carlo methods (see make_rng)
+        dtype: np.float64 (default) or np.float32 paths and payoff tensor
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
     
     Returns:
         best_retentions: List of optimal retention rates [ret_A, ret_B, ret_C]
         profits_at_nash: Corresponding profits [profit_A, profit_B, profit_C]
     """
+    rng = make_rng(rng)
+    scenario = solver_scenario([S0A, S0B, S0C], mu, sigma, T, N, method, scenario, False, rng, dtype, utility,
+                               risk_aversion, level)
+    
+    if scenario is not None:
+        feasible, payoffs = scenario_payoff_tensor(scenario, retention_options, dtype)
+    else:
+        feasible, payoffs = payoff_tensor([S0A, S0B, S0C], mu, sigma, T, N, retention_options, rng=rng,
+                                          dtype=dtype)
+    return best_welfare_retentions(retention_options, feasible, payoffs)
+
+
+def feasible_retentions(retention_options, n_players, min_retention=MIN_RETENTION, max_total=1.0,
+                        symmetric=False):
+    """
+    Enumerates every feasible retention tuple for n players, lazily.
+    
+    Tuples come in the same order as nested loops over retention_options, but
+    branches whose partial sum already exceeds max_total are pruned instead of
+    enumerated, so only the simplex-constrained strategy space is visited.
+    
+    With symmetric=True only sorted tuples (non-decreasing in option order) are
+    yielded, one per set of orderings. Float sums depend on the order of the
+    terms, so the sum test then gets a 1e-9 slack: a tuple is kept if any of its
+    orderings may be feasible, and feasible_mask() decides on the orderings.
+    
+    Args:
+        retention_options: List of possible retention rates
+        n_players: Number of insurers
+        min_retention: Minimum retention rate required for each player
+        max_total: Maximum allowed sum of retention rates
+        symmetric: Yield sorted tuples only
+    
+    Yields:
+        Tuples (ret_1, ..., ret_n) of retention rates
+    """
+    options = [float(ret) for ret in retention_options if ret >= min_retention]
+    if symmetric:
+        max_total += 1e-9
+    
+    def extend(prefix, partial_sum, first):
+        if len(prefix) == n_players:
+            yield prefix
+            return
+        for k in range(first, len(options)):
+            # Retentions are non-negative, so an exceeded partial sum cannot recover
+            total = partial_sum + options[k]
+            if total > max_total:
+                continue
+            yield from extend(prefix + (options[k],), total, k if symmetric else 0)
+    
+    yield from extend((), 0.0, 0)
+
+
+def nash_equilibrium_n_insurers(S0s, mu, sigma, T, N, retention_options, method='analytic',
+                                scenario=None, shared_sample=False, block_size=BLOCK_SIZE, rng=None,
+                                dtype=np.float64, utility='mean', symmetric=None, risk_aversion=RISK_AVERSION,
+                                level=CVAR_LEVEL):
+    """
+    Finds an approximate Nash equilibrium for any number of insurers.
+    
+    Same welfare objective and constraints as the 3-insurer solvers. Feasible
+    tuples are streamed from feasible_retentions() and evaluated block by block,
+    so memory stays O(block_size × players) whatever the number of players.
+    
+    In a symmetric game (identical insurers) payoffs are only evaluated on
+    sorted tuples and expanded to every ordering (see symmetric_payoffs): n!
+    times fewer evaluations, same answer as the full enumeration.
+    
+    Args:
+        S0s: Array of initial premiums, one per insurer
+        mu, sigma, T, N: GBM parameters
+        retention_options: List of possible retention rates
+        method: 'analytic' (default), 'crn' or 'independent' (see make_scenario)
+        scenario: Optional SimulationScenario or AnalyticScenario to reuse (overrides method)
+        shared_sample: True if all insurers share one premium/claim draw
+        block_size: Number of retention tuples evaluated per vectorized call
+        rng: Seed or np.random.Generator for the Monte Carlo methods (see make_rng)
+        dtype: np.float64 (default) or np.float32 Monte Carlo paths
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+        symmetric: Evaluate sorted tuples only (None = detect, see is_symmetric_game)
+    
+    Returns:
+        best_retentions: List of optimal retention rates, one per insurer
+        profits_at_nash: Corresponding mean profits
+    """
+    n_players = len(S0s)
+    rng = make_rng(rng)
+    scenario = solver_scenario(S0s, mu, sigma, T, N, method, scenario, shared_sample, rng, dtype, utility,
+                               risk_aversion, level)
+    if symmetric is None:
+        symmetric = is_symmetric_game(S0s, scenario)
+    
+    best_objective = -np.inf
+    best_key = None
+    best_retentions = None
+    profits_at_nash = [0.0] * n_players
+    
+    # Loop position of a tuple: its option indices, compared lexicographically
+    position = {float(ret): k for k, ret in reversed(list(enumerate(retention_options)))}
+    if symmetric:
+        # Each sorted tuple expands to n! profiles: keep the expanded block near block_size
+        block_size = max(1, block_size // math.factorial(n_players))
+    
+    tuples = feasible_retentions(retention_options, n_players, symmetric=symmetric)
+    while True:
+        block = np.array(list(islice(tuples, block_size)), dtype=float)
+        if len(block) == 0:
+            break
+        
+        if scenario is not None:
+            means = scenario.mean_profits(block)
+        else:
+            means = independent_mean_profits(S0s, mu, sigma, T, N, block, shared_sample, block_size, rng, dtype)
+        if symmetric:
+            block, means = symmetric_payoffs(block, means)
+            valid = feasible_mask(block)
+            block, means = block[valid], means[valid]
+            if len(block) == 0:
+                continue
+        
+        objective = welfare_objective(means.T)
+        # Ties go to the first tuple in enumeration order (as with a strict '>' scan)
+        ties = np.flatnonzero(objective == objective.max())
+        keys = [tuple(position[ret] for ret in block[i]) for i in ties]
+        key = min(keys)
+        best = int(ties[keys.index(key)])
+        if objective[best] > best_objective or (objective[best] == best_objective and key < best_key):
+            best_objective = objective[best]
+            best_key = key
+            best_retentions = [float(ret) for ret in block[best]]
+            profits_at_nash = [float(p) for p in means[best]]
+    
+    # Fallback if no valid combination found: equal split of the whole risk
+    if best_retentions is None:
+        best_retentions = [1.0 / n_players] * n_players
+    
+    return best_retentions, profits_at_nash
+
+
+def feasible_mask(profiles, min_retention=MIN_RETENTION, max_total=1.0):
+    """
+    Feasibility of a batch of retention profiles.
+    
+    Sums are accumulated left to right, exactly like ret_A + ret_B + ret_C, so a
+    profile is feasible here if and only if feasible_retentions() would yield it.
+    
+    Args:
+        profiles: Array (k, n_players) of retention vectors
+        min_retention: Minimum retention rate required for each player
+        max_total: Maximum allowed sum of retention rates
+    
+    Returns:
+        Boolean array (k,), True for valid profiles
+    """
+    profiles = np.asarray(profiles, dtype=float)
+    total = np.zeros(len(profiles))
+    for j in range(profiles.shape[1]):
+        total = total + profiles[:, j]
+    return (total <= max_total) & np.all(profiles >= min_retention, axis=1)
+
+
+def player_payoff_table(scenario, retention_options):
+    """
+    Payoff of every player at every retention option, one evaluation per option.
+    
+    Each insurer's payoff only depends on its own retention, so the profile
+    (r, r, ..., r) gives every player's payoff at r.
+    
+    Args:
+        scenario: Scenario with a mean_profits() method
+        retention_options: List of retention rates
+    
+    Returns:
+        Array (n_insurers, m) of payoffs
+    """
+    options = np.asarray(retention_options, dtype=float)
+    return scenario.mean_profits(np.repeat(options[:, None], scenario.n_insurers, axis=1)).T
+
+
+def _range_max_table(table):
+    """
+    Sparse table for O(1) range-maximum queries along the last axis.
+    
+    Args:
+        table: Array (n, m)
+    
+    Returns:
+        values, args: Arrays (levels, n, m); level k holds the max (and its
+        first index) of table[:, x : x + 2^k], -inf past the end
+    """
+    n, m = table.shape
+    values = [table.astype(np.float64)]
+    args = [np.broadcast_to(np.arange(m), (n, m))]
+    width = 1
+    while 2 * width <= m:
+        length = values[-1].shape[1] - width
+        left, right = values[-1][:, :length], values[-1][:, width:]
+        take_right = right > left
+        values.append(np.where(take_right, right, left))
+        args.append(np.where(take_right, args[-1][:, width:], args[-1][:, :length]))
+        width *= 2
+    padded_values = np.full((len(values), n, m), -np.inf)
+    padded_args = np.zeros((len(values), n, m), dtype=np.int64)
+    for k, (level_values, level_args) in enumerate(zip(values, args)):
+        padded_values[k, :, :level_values.shape[1]] = level_values
+        padded_args[k, :, :level_args.shape[1]] = level_args
+    return padded_values, padded_args
+
+
+def _range_max(values, args, lo, hi):
+    """
+    Maximum of each player's row over [lo, hi] (inclusive), for a batch of boxes.
+    
+    Args:
+        values, args: Sparse table (see _range_max_table)
+        lo, hi: Integer arrays (k, n) with lo ≤ hi
+    
+    Returns:
+        maxima: Array (k, n) of range maxima
+        argmax: Integer array (k, n) of their indices
+    """
+    level = np.floor(np.log2(hi - lo + 1)).astype(np.int64)
+    players = np.arange(lo.shape[1])
+    start = hi - (1 << level) + 1
+    left, right = values[level, players, lo], values[level, players, start]
+    take_right = right > left
+    maxima = np.where(take_right, right, left)
+    argmax = np.where(take_right, args[level, players, start], args[level, players, lo])
+    return maxima, argmax
+
+
+def branch_and_bound_equilibrium(S0s, mu, sigma, T, N, retention_options, method='analytic',
+                                 scenario=None, shared_sample=False, rng=None, dtype=np.float64,
+                                 utility='mean', initial_retentions=None, branching=BRANCHING,
+                                 risk_aversion=RISK_AVERSION, level=CVAR_LEVEL):
+    """
+    Welfare search over a fine retention grid by branch and bound.
+    
+    Same objective, constraints and answer (ties included) as
+    nash_equilibrium_n_insurers on the same grid, without enumerating it.
+    Each insurer's payoff only depends on its own retention (profit is linear
+    in it), so payoffs are tabulated once per (player, option) and the best
+    payoff of a player over an interval of options is a range maximum.
+    
+    The grid is explored as nested boxes of option indices, coarse to fine:
+    every box is split into branching parts per player, and each part gets
+    - an upper bound on its welfare: the best payoff of every player on its
+      interval, capped by the budget the others' smallest retentions leave
+      (the objective is non-decreasing in each payoff, so this bounds it);
+    - two feasible candidates (every player's capped best, and the box's
+      lowest corner) that raise the incumbent.
+    Parts whose bound is below the incumbent cannot hold an optimum and are
+    pruned, so only the neighbourhood of the optimum is refined down to
+    single tuples.
+    
+    Args:
+        S0s: Array of initial premiums, one per insurer
+        mu, sigma, T, N: GBM parameters
+        retention_options: List of possible retention rates (any resolution, e.g. 0.01 steps)
+        method: 'analytic' (default) or 'crn' (see make_scenario; a shared scenario is required)
+        scenario: Optional SimulationScenario, AnalyticScenario or RiskAdjustedScenario to reuse
+        shared_sample: True if all insurers share one premium/claim draw
+        rng: Seed or np.random.Generator for a 'crn' sample (see make_rng)
+        dtype: np.float64 (default) or np.float32 Monte Carlo paths
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+        initial_retentions: Optional feasible grid profile (e.g. the last equilibrium) whose
+                            welfare seeds the incumbent (warm start; the result is unchanged)
+        branching: Number of parts per player and level (branching^players children per box)
+    
+    Returns:
+        best_retentions: List of optimal retention rates, one per insurer
+        profits_at_nash: Corresponding payoffs
+        nodes: Number of boxes bounded (a full enumeration visits every feasible tuple)
+    """
+    scenario = solver_scenario(S0s, mu, sigma, T, N, method, scenario, shared_sample, rng, dtype, utility,
+                               risk_aversion, level, solver='Branch and bound')
+    return branch_and_bound_on_scenario(scenario, retention_options, initial_retentions, branching)
+
+
+def branch_and_bound_on_scenario(scenario, retention_options, initial_retentions=None, branching=BRANCHING):
+    """
+    Branch-and-bound welfare search on a given scenario (see branch_and_bound_equilibrium).
+    
+    Args:
+        scenario: Any scenario with n_insurers and mean_profits() (e.g. a TableScenario)
+        retention_options: List of possible retention rates
+        initial_retentions: Optional feasible grid profile seeding the incumbent
+        branching: Number of parts per player and level
+    
+    Returns:
+        best_retentions, profits_at_nash, nodes (see branch_and_bound_equilibrium)
+    """
+    n_players = scenario.n_insurers
+    # Loop position of each option, to break ties like the enumeration order
+    position = {float(ret): k for k, ret in reversed(list(enumerate(retention_options)))}
+    values = np.array(sorted(ret for ret in position if ret >= MIN_RETENTION))
+    m = len(values)
+    players = np.arange(n_players)
+    if m == 0:
+        return [1.0 / n_players] * n_players, [0.0] * n_players, 0
+    table = player_payoff_table(scenario, values)
+    range_values, range_args = _range_max_table(table)
+    offsets = np.array(list(product(range(branching), repeat=n_players)))
+    
+    # Root box: option indices [0, step) for every player, step a power of branching ≥ m
+    step = branching
+    while step < m:
+        step *= branching
+    lo = np.zeros((1, n_players), dtype=np.int64)
+    incumbent = -np.inf
+    if initial_retentions is not None:
+        start = np.asarray(initial_retentions, dtype=float)
+        index = np.searchsorted(values, start).clip(max=m - 1)
+        if np.array_equal(values[index], start) and feasible_mask(start[None, :])[0]:
+            incumbent = float(welfare_objective(table[players, index][:, None])[0])
+    nodes = 0
+    while True:
+        step //= branching
+        lo = (lo[:, None, :] + offsets * step).reshape(-1, n_players)
+        lo = lo[np.all(lo < m, axis=1)]
+        hi = np.minimum(lo + step - 1, m - 1)
+        
+        # Largest option each player can take once the others take their smallest one
+        # (1e-9 slack: feasible_mask() settles float sums on single tuples)
+        lowest = values[lo]
+        room = 1.0 + 1e-9 - (lowest.sum(axis=1)[:, None] - lowest)
+        top = np.minimum(hi, np.searchsorted(values, room, side='right') - 1)
+        alive = np.all(top >= lo, axis=1)
+        lo, top = lo[alive], top[alive]
+        nodes += len(lo)
+        if step == 1:
+            break
+        
+        best_payoffs, best_index = _range_max(range_values, range_args, lo, top)
+        for candidate in (best_index, lo):
+            valid = feasible_mask(values[candidate])
+            if valid.any():
+                incumbent = max(incumbent, welfare_objective(table[players, candidate[valid]].T).max())
+        # Keep ties: the first tuple in enumeration order may sit in any of them
+        lo = lo[welfare_objective(best_payoffs.T) >= incumbent]
+    
+    lo = lo[feasible_mask(values[lo])]
+    if len(lo) == 0:
+        # Fallback if no valid combination found: equal split of the whole risk
+        return [1.0 / n_players] * n_players, [0.0] * n_players, nodes
+    payoffs = table[players, lo]
+    objective = welfare_objective(payoffs.T)
+    ties = np.flatnonzero(objective == objective.max())
+    keys = [tuple(position[ret] for ret in values[lo[i]]) for i in ties]
+    best = int(ties[keys.index(min(keys))])
+    
+    best_retentions = [float(ret) for ret in values[lo[best]]]
+    profits_at_nash = [float(p) for p in payoffs[best]]
+    return best_retentions, profits_at_nash, nodes
+
+
+def best_response_equilibrium(S0s, mu, sigma, T, N, retention_options, method='analytic',
+                              scenario=None, shared_sample=False, initial_retentions=None,
+                              tol=1e-9, max_iterations=100, rng=None, dtype=np.float64, utility='mean',
+                              risk_aversion=RISK_AVERSION, level=CVAR_LEVEL):
+    """
+    Finds a pure Nash equilibrium by iterated best-response dynamics.
+    
+    In each round every insurer, in turn, picks the retention option that
+    maximizes its own mean profit while the others stay fixed (subject to the
+    sum ≤ 1 and minimum retention constraints). A player only moves if it gains
+    more than tol, so the returned profile is one where no insurer can improve
+    by deviating alone. Each round costs m × players evaluations instead of the
+    m^players of the exhaustive welfare search.
+    
+    Args:
+        S0s: Array of initial premiums, one per insurer
+        mu, sigma, T, N: GBM parameters
+        retention_options: List of possible retention rates
+        method: 'analytic' (default), 'crn' or 'independent' (see make_scenario)
+        scenario: Optional SimulationScenario or AnalyticScenario to reuse (overrides method)
+        shared_sample: True if all insurers share one premium/claim draw
+        initial_retentions: Starting profile (default, or if it breaks the constraints:
+                            smallest feasible option for everyone)
+        tol: Minimum profit gain for a player to change its retention
+        max_iterations: Maximum number of best-response rounds
+        rng: Seed or np.random.Generator for the Monte Carlo methods (see make_rng)
+        dtype: np.float64 (default) or np.float32 Monte Carlo paths
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+    
+    Returns:
+        best_retentions: List of equilibrium retention rates, one per insurer
+        profits_at_nash: Corresponding mean profits
+        rounds: Number of best-response rounds played
+        status: 'converged', 'cycle' (a profile repeated), 'max_iterations'
+                or 'infeasible' (no valid profile, equal-split fallback returned)
+    """
+    scenario = solver_scenario(S0s, mu, sigma, T, N, method, scenario, shared_sample, rng, dtype, utility,
+                               risk_aversion, level, fresh_runs=True)
+    return best_response_on_scenario(scenario, retention_options, initial_retentions, tol, max_iterations)
+
+
+def best_response_on_scenario(scenario, retention_options, initial_retentions=None, tol=1e-9,
+                              max_iterations=100):
+    """
+    Iterated best responses on a given scenario (see best_response_equilibrium).
+    
+    Args:
+        scenario: Any scenario with n_insurers and scenario.mean_profits() (e.g. a TableScenario)
+        retention_options: List of possible retention rates
+        initial_retentions: Starting profile (default, or if it breaks the constraints:
+                            smallest feasible option for everyone)
+        tol: Minimum payoff gain for a player to change its retention
+        max_iterations: Maximum number of best-response rounds
+    
+    Returns:
+        best_retentions, profits_at_nash, rounds, status (see best_response_equilibrium)
+    """
+    n_players = scenario.n_insurers
+    options = np.asarray([ret for ret in retention_options if ret >= MIN_RETENTION], dtype=float)
+    
+    # Fallback if no valid combination exists at all
+    if len(options) == 0 or not feasible_mask(np.full((1, n_players), options.min()))[0]:
+        return [1.0 / n_players] * n_players, [0.0] * n_players, 0, 'infeasible'
+    
+    current = None if initial_retentions is None else np.asarray(initial_retentions, dtype=float).copy()
+    if current is None or not feasible_mask(current[None, :])[0]:
+        # Best responses only move between feasible profiles: an infeasible start would never move
+        current = np.full(n_players, options.min())
+    
+    seen = {tuple(current): 0}
+    status = 'max_iterations'
+    rounds = 0
+    while rounds < max_iterations:
+        rounds += 1
+        moved = False
+        for i in range(n_players):
+            # Player i tries every option while the others stay fixed
+            candidates = np.tile(current, (len(options), 1))
+            candidates[:, i] = options
+            valid = feasible_mask(candidates)
+            if not valid.any():
+                continue
+            own_profit = scenario.mean_profits(candidates[valid])[:, i]
+            best = int(np.argmax(own_profit))
+            
+            if feasible_mask(current[None, :])[0]:
+                current_profit = scenario.mean_profits(current[None, :])[0, i]
+            else:
+                current_profit = -np.inf
+            
+            choice = candidates[valid][best, i]
+            if choice != current[i] and own_profit[best] > current_profit + tol:
+                current[i] = choice
+                moved = True
+        
+        if not moved:
+            status = 'converged'
+            break
+        
+        # Cycle detector: the same profile at the end of two rounds never converges
+        key = tuple(current)
+        if key in seen:
+            status = 'cycle'
+            break
+        seen[key] = rounds
+    
+    best_retentions = [float(ret) for ret in current]
+    profits_at_nash = [float(p) for p in scenario.mean_profits(current[None, :])[0]]
+    return best_retentions, profits_at_nash, rounds, status
+
+
+def continuous_best_response_equilibrium(S0s, mu, sigma, T, N, method='crn', scenario=None,
+                                         shared_sample=False, initial_retentions=None, tol=1e-9,
+                                         max_iterations=100, rng=None, dtype=np.float64, utility='mean',
+                                         risk_aversion=RISK_AVERSION, level=CVAR_LEVEL):
+    """
+    Best-response dynamics over continuous retention rates (no grid).
+    
+    Same dynamics as best_response_equilibrium, but each insurer's best
+    response is found by L-BFGS-B on [MIN_RETENTION, 1 - sum of the others]
+    instead of a sweep over retention options. Every evaluation uses the same
+    frozen scenario (one common-random-number sample by default), so the
+    objective is a deterministic, smooth function of the retention: profit is
+    linear in it, and the utilities come with exact derivatives (see
+    UTILITY_GRADIENTS) instead of noisy finite differences. A best response
+    typically takes a handful of evaluations.
+    
+    Args:
+        S0s: Array of initial premiums, one per insurer
+        mu, sigma, T, N: GBM parameters
+        method: 'crn' (default) or 'analytic' (see make_scenario; a shared scenario is required)
+        scenario: Optional SimulationScenario, AnalyticScenario or RiskAdjustedScenario to reuse
+        shared_sample: True if all insurers share one premium/claim draw
+        initial_retentions: Starting profile (default, or if it breaks the constraints:
+                            MIN_RETENTION for everyone)
+        tol: Minimum utility gain for a player to change its retention
+        max_iterations: Maximum number of best-response rounds
+        rng: Seed or np.random.Generator for a 'crn' sample (see make_rng)
+        dtype: np.float64 (default) or np.float32 Monte Carlo paths
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+    
+    Returns:
+        best_retentions: List of equilibrium retention rates, one per insurer
+        profits_at_nash: Corresponding mean profits (utilities for a risk-aware utility)
+        rounds: Number of best-response rounds played
+        status: 'converged', 'max_iterations' or 'infeasible' (equal-split fallback returned)
+        evaluations: Number of utility evaluations (each with its gradient)
+    """
+    n_players = len(S0s)
+    scenario = solver_scenario(S0s, mu, sigma, T, N, method, scenario, shared_sample, rng, dtype, utility,
+                               risk_aversion, level, solver='The continuous solver')
+    if not isinstance(scenario, RiskAdjustedScenario):
+        # Mean profits are the 'mean' utility, whose derivative is the mean margin
+        scenario = RiskAdjustedScenario(scenario)
+    
+    if not feasible_mask(np.full((1, n_players), MIN_RETENTION))[0]:
+        return [1.0 / n_players] * n_players, [0.0] * n_players, 0, 'infeasible', 0
+    
+    evaluations = 0
+    
+    def loss(x, i):
+        # Minimized by L-BFGS-B: minus player i's utility and its derivative
+        nonlocal evaluations
+        evaluations += 1
+        value, slope = scenario.player_utility(i, x[0])
+        return -value, np.array([-slope])
+    
+    current = None if initial_retentions is None else np.asarray(initial_retentions, dtype=float).copy()
+    if current is None or not feasible_mask(current[None, :])[0]:
+        # From an infeasible start no player has room to move: use the default one
+        current = np.full(n_players, MIN_RETENTION)
+    
+    status = 'max_iterations'
+    rounds = 0
+    while rounds < max_iterations:
+        rounds += 1
+        moved = False
+        for i in range(n_players):
+            upper = 1.0 - (current.sum() - current[i])
+            if upper < MIN_RETENTION:
+                continue
+            start = min(max(current[i], MIN_RETENTION), upper)
+            result = minimize(loss, [start], args=(i,), jac=True, method='L-BFGS-B',
+                              bounds=[(MIN_RETENTION, upper)])
+            candidate = current.copy()
+            candidate[i] = min(max(float(result.x[0]), MIN_RETENTION), upper)
+            # Rounding of 1 - sum: step down until the left-to-right sum is ≤ 1 again
+            while not feasible_mask(candidate[None, :])[0] and candidate[i] > MIN_RETENTION:
+                candidate[i] = np.nextafter(candidate[i], -np.inf)
+            
+            if feasible_mask(current[None, :])[0]:
+                current_utility = -loss([current[i]], i)[0]
+            else:
+                current_utility = -np.inf
+            
+            if candidate[i] != current[i] and -result.fun > current_utility + tol:
+                current = candidate
+                moved = True
+        
+        if not moved:
+            status = 'converged'
+            break
+    
+    players = np.arange(n_players)
+    best_retentions = [float(ret) for ret in current]
+    profits_at_nash = [float(p) for p in scenario.utility_table(current)[players, players]]
+    return best_retentions, profits_at_nash, rounds, status, evaluations
+
+
+def verify_equilibrium(retentions, S0s, mu, sigma, T, N, retention_options, method='analytic',
+                       scenario=None, shared_sample=False, tol=1e-9, rng=None, dtype=np.float64,
+                       utility='mean', risk_aversion=RISK_AVERSION, level=CVAR_LEVEL):
+    """
+    Checks a retention profile against every unilateral deviation (epsilon-Nash).
+    
+    All deviations of all players (players × m profiles) are evaluated in one
+    broadcasted batch, so auditing an equilibrium costs a single payoff call
+    instead of a second grid search.
+    
+    Args:
+        retentions: Retention profile to check, one rate per insurer
+        S0s: Array of initial premiums, one per insurer
+        mu, sigma, T, N: GBM parameters
+        retention_options: List of possible retention rates
+        method: 'analytic' (default), 'crn' or 'independent' (see make_scenario)
+        scenario: Optional SimulationScenario or AnalyticScenario to reuse (overrides method)
+        shared_sample: True if all insurers share one premium/claim draw
+        tol: Gains up to tol are treated as zero
+        rng: Seed or np.random.Generator for the Monte Carlo methods (see make_rng)
+        dtype: np.float64 (default) or np.float32 Monte Carlo paths
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+    
+    Returns:
+        report: Dict with
+            feasible: False if the profile itself breaks the constraints (see
+                      feasible_mask); it is then not an equilibrium and the
+                      other fields are None, or False for is_nash
+            epsilon: Largest profit gain any player gets by deviating alone (≥ 0)
+            is_nash: True if the profile is feasible and epsilon ≤ tol
+            deviating_player: Index of the player with the largest gain (None if Nash)
+            deviation: Retention that player should switch to (None if Nash)
+            gains: Best deviation gain of each player
+    """
+    n_players = len(S0s)
+    scenario = solver_scenario(S0s, mu, sigma, T, N, method, scenario, shared_sample, rng, dtype, utility,
+                               risk_aversion, level, fresh_runs=True)
+    
+    current = np.asarray(retentions, dtype=float)
+    if not feasible_mask(current[None, :])[0]:
+        # Deviations would be measured against a profile nobody may play
+        return {'feasible': False, 'epsilon': None, 'is_nash': False, 'deviating_player': None,
+                'deviation': None, 'gains': None}
+    options = np.asarray(retention_options, dtype=float)
+    m = len(options)
+    
+    # deviations[i, k] = current profile with player i switched to option k
+    deviations = np.broadcast_to(current, (n_players, m, n_players)).copy()
+    players = np.arange(n_players)
+    deviations[players, :, players] = options
+    
+    flat = deviations.reshape(-1, n_players)
+    valid = feasible_mask(flat)
+    own_profit = np.full(len(flat), -np.inf)
+    if valid.any():
+        # Profits of the deviating player only: row i × m + k belongs to player i
+        owner = np.repeat(players, m)[valid]
+        own_profit[valid] = scenario.mean_profits(flat[valid])[np.arange(valid.sum()), owner]
+    own_profit = own_profit.reshape(n_players, m)
+    
+    current_profit = scenario.mean_profits(current[None, :])[0]
+    gains = own_profit - current_profit[:, None]
+    best_option = np.argmax(gains, axis=1)
+    best_gain = gains[players, best_option]
+    
+    deviating_player = int(np.argmax(best_gain))
+    epsilon = max(float(best_gain[deviating_player]), 0.0)
+    is_nash = epsilon <= tol
     
-    best_retentions = [0.0, 0.0, 0.0]
-    best_objective = float('-inf')
-    profits_at_nash = [0.0, 0.0, 0.0]
-
-    # Test all valid combinations
-    for ret_A in retention_options:
-        for ret_B in retention_options:
-            for ret_C in retention_options:
-                # Constraint 1: sum of retention rates ≤ 1
-                if ret_A + ret_B + ret_C > 1.0:
-                    continue
-                
-                # Constraint 2: Fairness - ensure all players get non-zero profit
-                # Require minimum 0.05 retention for each player to ensure positive profit
-                if ret_A < 0.05 or ret_B < 0.05 or ret_C < 0.05:
-                    continue
-                
-                retentions = [ret_A, ret_B, ret_C]
-                profit_A, profit_B, profit_C = simulation_3_insurers_different_premiums(
-                    S0A, S0B, S0C, mu, sigma, T, N, retentions
-                )
-                
-                # Calculate objectives
-                mean_A = np.mean(profit_A)
-                mean_B = np.mean(profit_B)
-                mean_C = np.mean(profit_C)
-                
-                # Objective: Maximize total welfare while ensuring fairness
-                # Total welfare = sum of profits
-                total_profit = mean_A + mean_B + mean_C
-                
-                # Fairness bonus: penalize if one player dominates too much
-                # Use minimum profit as fairness metric
-                min_profit = min(mean_A, mean_B, mean_C)
-                
-                # Combined objective: maximize total + fairness bonus
-                # This ensures both high total profit AND fair distribution
-                objective = total_profit + (0.1 * min_profit)
-                
-                if objective > best_objective:
-                    best_objective = objective
-                    best_retentions = retentions
-                    profits_at_nash = [mean_A, mean_B, mean_C]
-    
-    # Fallback if no valid combination found (shouldn't happen)
-    if best_retentions == [0.0, 0.0, 0.0]:
-        best_retentions = [0.33, 0.33, 0.34]
+    return {
+        'feasible': True,
+        'epsilon': epsilon,
+        'is_nash': bool(is_nash),
+        'deviating_player': None if is_nash else deviating_player,
+        'deviation': None if is_nash else float(options[best_option[deviating_player]]),
+        'gains': [max(float(gain), 0.0) for gain in best_gain],
+    }
+
+
+def subgame_payoff_matrices(scenario, retention_options, players=(0, 1), retentions=None):
+    """
+    Payoff matrices of a two-player sub-game, in one vectorized pass.
+    
+    The two players choose among the retention options while every other
+    insurer keeps its retention; all m × m profiles are scored by a single
+    mean_profits() call on the shared scenario. A profile that breaks the
+    sum ≤ 1 constraint is void: each player gets a payoff strictly below its
+    worst feasible payoff (see void_payoffs), so a void profile is never a
+    best response while a feasible one is available. Options below
+    MIN_RETENTION, and options that are void against every choice of the
+    opponent, are left out.
+    
+    Args:
+        scenario: Scenario with a mean_profits() method
+        retention_options: List of possible retention rates
+        players: Indices (row, column) of the two players
+        retentions: Retentions of all insurers (the two players' entries are
+                    ignored; default MIN_RETENTION for everyone)
+    
+    Returns:
+        row_options, column_options: Arrays of the options kept for each player
+        row_payoffs, column_payoffs: Arrays (len(row_options), len(column_options))
+    """
+    row, column = players
+    options = np.asarray([ret for ret in retention_options if ret >= MIN_RETENTION], dtype=float)
+    m = len(options)
+    if retentions is None:
+        retentions = np.full(scenario.n_insurers, MIN_RETENTION)
+    
+    profiles = np.broadcast_to(np.asarray(retentions, dtype=float), (m, m, scenario.n_insurers)).copy()
+    profiles[:, :, row] = options[:, None]
+    profiles[:, :, column] = options[None, :]
+    valid = feasible_mask(profiles.reshape(-1, scenario.n_insurers)).reshape(m, m)
+    rows, columns = valid.any(axis=1), valid.any(axis=0)
+    kept = np.ix_(rows, columns)
+    payoffs = void_payoffs(scenario.mean_profits(profiles)[kept][..., [row, column]], valid[kept])
+    return options[rows], options[columns], payoffs[..., 0], payoffs[..., 1]
+
+
+def void_payoffs(payoffs, valid):
+    """
+    Replace the payoffs of void (infeasible) profiles by a penalty.
+    
+    A fixed payoff such as 0 is not neutral: under a risk-aware utility every
+    feasible payoff can be negative, and void profiles would then dominate.
+    Each player's void payoff is its worst feasible payoff minus its payoff
+    range minus 1, strictly below anything a feasible profile pays it.
+    
+    Args:
+        payoffs: Array (..., n_players) of payoffs, last axis = player
+        valid: Boolean array (...) of feasible profiles
+    
+    Returns:
+        Array like payoffs, void entries replaced by each player's penalty
+    """
+    feasible = payoffs[valid]
+    if feasible.size == 0:
+        return np.zeros_like(payoffs)
+    low, high = feasible.min(axis=0), feasible.max(axis=0)
+    return np.where(valid[..., None], payoffs, low - (high - low) - 1.0)
+
+
+def mixed_equilibria(S0s, mu, sigma, T, N, retention_options, method='analytic', scenario=None,
+                     shared_sample=False, rng=None, dtype=np.float64, utility='mean', players=(0, 1),
+                     retentions=None, algorithm='lemke_howson', tol=1e-6, risk_aversion=RISK_AVERSION,
+                     level=CVAR_LEVEL):
+    """
+    Mixed-strategy Nash equilibria of a two-player sub-game (nashpy).
+    
+    The bimatrix game comes from subgame_payoff_matrices() and is solved by
+    nashpy: 'lemke_howson' follows the Lemke-Howson path from every initial
+    dropped label (fast, finds some equilibria), 'support_enumeration' tries
+    every pair of supports (all equilibria of a non-degenerate game, but
+    exponential in the number of options: coarse grids only). The game is
+    degenerate (a player's payoff does not depend on the opponent until the
+    budget is exceeded), so every candidate is checked against all
+    unilateral deviations and duplicates are dropped. Void profiles are
+    penalized (see void_payoffs), and a candidate is only reported if every
+    pair of retentions in its two supports is a feasible profile.
+    
+    Args:
+        S0s: Array of initial premiums, one per insurer
+        mu, sigma, T, N: GBM parameters
+        retention_options: List of possible retention rates
+        method: 'analytic' (default) or 'crn' (see make_scenario; a shared scenario is required)
+        scenario: Optional SimulationScenario, AnalyticScenario or RiskAdjustedScenario to reuse
+        shared_sample: True if all insurers share one premium/claim draw
+        rng: Seed or np.random.Generator for a 'crn' sample (see make_rng)
+        dtype: np.float64 (default) or np.float32 Monte Carlo paths
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+        players: Indices (row, column) of the two players
+        retentions: Retentions of the other insurers (see subgame_payoff_matrices)
+        algorithm: 'lemke_howson' (default) or 'support_enumeration' (see MIXED_ALGORITHMS)
+        tol: Largest deviation gain, relative to the payoff scale, of an accepted equilibrium
+    
+    Returns:
+        equilibria: List of dicts with
+            strategies: Probabilities of each retention option (same order as
+                        retention_options) for the row and column player
+            payoffs: Expected payoffs of the two players
+            support: Retentions played with positive probability by each player
+    """
+    if algorithm not in MIXED_ALGORITHMS:
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+    scenario = solver_scenario(S0s, mu, sigma, T, N, method, scenario, shared_sample, rng, dtype, utility,
+                               risk_aversion, level, solver='The mixed equilibrium search')
+    
+    row_options, column_options, row_payoffs, column_payoffs = subgame_payoff_matrices(
+        scenario, retention_options, players, retentions
+    )
+    if row_payoffs.size == 0:
+        return []
+    game = nashpy.Game(row_payoffs, column_payoffs)
+    with warnings.catch_warnings():
+        # Degenerate games make nashpy warn; candidates are verified below instead
+        warnings.simplefilter('ignore')
+        if algorithm == 'lemke_howson':
+            candidates = list(game.lemke_howson_enumeration())
+        else:
+            candidates = list(game.support_enumeration())
+    
+    if retentions is None:
+        retentions = np.full(scenario.n_insurers, MIN_RETENTION)
+    
+    def feasible_support(row_support, column_support):
+        # Every profile played with positive probability must respect the budget
+        profiles = np.broadcast_to(np.asarray(retentions, dtype=float),
+                                   (row_support.sum(), column_support.sum(), scenario.n_insurers)).copy()
+        profiles[:, :, players[0]] = row_options[row_support][:, None]
+        profiles[:, :, players[1]] = column_options[column_support][None, :]
+        return feasible_mask(profiles.reshape(-1, scenario.n_insurers)).all()
+    
+    scale = max(np.ptp(row_payoffs), np.ptp(column_payoffs), 1.0)
+    options = [float(ret) for ret in retention_options]
+    equilibria = []
+    seen = set()
+    for row_strategy, column_strategy in candidates:
+        row_strategy = np.clip(np.nan_to_num(row_strategy), 0.0, None)
+        column_strategy = np.clip(np.nan_to_num(column_strategy), 0.0, None)
+        if row_strategy.sum() == 0 or column_strategy.sum() == 0:
+            continue
+        row_strategy /= row_strategy.sum()
+        column_strategy /= column_strategy.sum()
+        
+        # Expected payoff of every pure strategy against the opponent's mixture
+        row_values = row_payoffs @ column_strategy
+        column_values = row_strategy @ column_payoffs
+        payoffs = (float(row_strategy @ row_values), float(column_values @ column_strategy))
+        if row_values.max() - payoffs[0] > tol * scale or column_values.max() - payoffs[1] > tol * scale:
+            continue
+        if not feasible_support(row_strategy > 0, column_strategy > 0):
+            continue
+        key = (tuple(np.round(row_strategy, 6)), tuple(np.round(column_strategy, 6)))
+        if key in seen:
+            continue
+        seen.add(key)
+        
+        strategies = []
+        for kept, strategy in ((row_options, row_strategy), (column_options, column_strategy)):
+            probabilities = dict(zip(kept.tolist(), strategy.tolist()))
+            strategies.append([probabilities.get(ret, 0.0) for ret in options])
+        equilibria.append({
+            'strategies': strategies,
+            'payoffs': list(payoffs),
+            'support': [kept[strategy > 0].tolist() for kept, strategy in
+                        ((row_options, row_strategy), (column_options, column_strategy))],
+        })
+    return equilibria
+
+
+def replicator_dynamics(S0s, mu, sigma, T, N, retention_options, method='analytic', scenario=None,
+                        shared_sample=False, rng=None, dtype=np.float64, utility='mean',
+                        initial_strategies=None, step=0.5, tol=1e-10, max_iterations=100000,
+                        risk_aversion=RISK_AVERSION, level=CVAR_LEVEL):
+    """
+    Multi-population replicator dynamics on the full n-player game.
+    
+    Each insurer is a population mixing over retention options, and the share
+    of an option grows with its payoff against the other populations' current
+    mixtures:
+        x_ik ← x_ik + h × x_ik × (f_ik - Σ_l x_il f_il)
+    The payoff tensor over all m^n profiles is scored once by a single
+    mean_profits() call (void profiles are penalized, see void_payoffs) and
+    each f_i is one einsum of player i's tensor with the other mixtures, so an
+    iteration never touches the sample. h = step / (payoff range) keeps every
+    share positive. The tensor has m^n entries per player: few insurers and
+    coarse grids only.
+    
+    Args:
+        S0s: Array of initial premiums, one per insurer
+        mu, sigma, T, N: GBM parameters
+        retention_options: List of possible retention rates
+        method: 'analytic' (default) or 'crn' (see make_scenario; a shared scenario is required)
+        scenario: Optional SimulationScenario, AnalyticScenario or RiskAdjustedScenario to reuse
+        shared_sample: True if all insurers share one premium/claim draw
+        rng: Seed or np.random.Generator for a 'crn' sample (see make_rng)
+        dtype: np.float64 (default) or np.float32 Monte Carlo paths
+        utility: Per-player objective, 'mean' (default) or a risk-aware utility (see UTILITIES)
+        risk_aversion, level: Parameters of the utility (see RiskAdjustedScenario)
+        initial_strategies: Array (n_insurers, len(retention_options)) of starting
+                            mixtures (default uniform over the options ≥ MIN_RETENTION)
+        step: Euler step as a fraction of the payoff range (0 < step < 1)
+        tol: Largest change of a share at convergence
+        max_iterations: Maximum number of updates
+    
+    Returns:
+        strategies: List (one per insurer) of probabilities of each retention option
+        payoffs: Expected payoff of each insurer
+        epsilon: Largest gain of a pure deviation against the final mixtures (0 at a Nash equilibrium)
+        iterations: Number of updates
+        status: 'converged', 'max_iterations', or 'infeasible' if the final
+                mixtures put more than tol probability on void profiles
+    """
+    n_players = len(S0s)
+    scenario = solver_scenario(S0s, mu, sigma, T, N, method, scenario, shared_sample, rng, dtype, utility,
+                               risk_aversion, level, solver='The replicator dynamics solver')
+    
+    options = np.asarray(retention_options, dtype=float)
+    usable = options >= MIN_RETENTION
+    kept = options[usable]
+    m = len(kept)
+    profiles = kept[np.indices((m,) * n_players).reshape(n_players, -1).T]
+    valid = feasible_mask(profiles)
+    # tensor[i, k_0, ..., k_{n-1}] = payoff of player i at profile (k_0, ..., k_{n-1})
+    tensor = np.moveaxis(
+        void_payoffs(scenario.mean_profits(profiles), valid).reshape((m,) * n_players + (n_players,)), -1, 0
+    )
+    valid = valid.reshape((m,) * n_players)
+    if initial_strategies is None:
+        shares = np.full((n_players, usable.sum()), 1.0 / usable.sum())
+    else:
+        shares = np.asarray(initial_strategies, dtype=float)[:, usable]
+        shares = shares / shares.sum(axis=1, keepdims=True)
+    
+    def option_payoffs(shares):
+        # f[i, k] = E[payoff of player i playing option k | the others' mixtures]
+        axes = list(range(n_players))
+        rows = []
+        for i in range(n_players):
+            operands = [tensor[i], axes]
+            for j in range(n_players):
+                if j != i:
+                    operands += [shares[j], [j]]
+            rows.append(np.einsum(*operands, [i]))
+        return np.array(rows)
+    
+    spread = np.ptp(tensor)
+    rate = step / spread if spread > 0 else 0.0
+    status = 'max_iterations'
+    iterations = 0
+    while iterations < max_iterations:
+        iterations += 1
+        values = option_payoffs(shares)
+        average = np.sum(shares * values, axis=1, keepdims=True)
+        updated = shares + rate * shares * (values - average)
+        updated /= updated.sum(axis=1, keepdims=True)
+        change = np.max(np.abs(updated - shares))
+        shares = updated
+        if change <= tol:
+            status = 'converged'
+            break
+    
+    values = option_payoffs(shares)
+    payoffs = np.sum(shares * values, axis=1)
+    void = np.einsum((~valid).astype(float), list(range(n_players)), *[operand for j in range(n_players)
+                                                      for operand in (shares[j], [j])], [])
+    if void > tol:
+        status = 'infeasible'
+    strategies = np.zeros((n_players, len(options)))
+    strategies[:, usable] = shares
+    return (strategies.tolist(), payoffs.tolist(), float(max(np.max(values - payoffs[:, None]), 0.0)),
+            iterations, status)
+
+
+class NashSession:
+    """
+    Payoff tables and last equilibrium of a sequence of related requests (warm start).
+    
+    Interactive use changes one input at a time (one premium, one utility
+    parameter, ...). Each insurer's payoff only depends on its own parameters,
+    so the session keeps one payoff row per insurer, keyed by everything that
+    row depends on: rows whose key did not change are reused and only the
+    affected insurers are re-evaluated. The search then starts from the last
+    equilibrium: best-response dynamics resume from the previous profile
+    (the unchanged insurers usually still play best responses, so only the
+    neighbourhood of the old equilibrium is explored), and the welfare search
+    uses the previous profile as its first incumbent. The welfare optimum is
+    the same as a cold solve; best responses may settle on another
+    equilibrium than a cold start would, the one closest to the last answer.
+    
+    update() and solve() change the session: concurrent requests of one
+    session must hold its lock from the update through the solve (and while
+    reading scenario()), or a solve could mix rows of two requests.
+    
+    Attributes:
+        retention_options: Retention options of the session (table columns)
+        keys: Parameter key of each insurer's row
+        payoffs, profits: Arrays (n_insurers, m) of objective payoffs and mean profits
+        retentions: Last equilibrium (None before the first solve)
+        evaluations: Number of rows computed so far
+        lock: threading.Lock serializing the requests of the session
+    """
+    
+    def __init__(self, retention_options):
+        self.retention_options = [float(ret) for ret in retention_options]
+        self.keys = []
+        self.payoffs = np.empty((0, len(self.retention_options)))
+        self.profits = np.empty((0, len(self.retention_options)))
+        self.retentions = None
+        self.evaluations = 0
+        self.lock = threading.Lock()
+    
+    def update(self, keys, rows):
+        """
+        Recomputes the rows whose key changed.
+        
+        Args:
+            keys: One hashable per insurer: every parameter its payoffs depend on
+            rows: Function (players) -> (payoffs, profits), arrays (len(players), m)
+                  for those insurers (see player_payoff_rows); only called if needed
+        
+        Returns:
+            List of the re-evaluated insurers
+        """
+        keys = list(keys)
+        if len(keys) != len(self.keys):
+            # Another game: nothing to reuse
+            m = len(self.retention_options)
+            self.payoffs, self.profits = np.empty((len(keys), m)), np.empty((len(keys), m))
+            self.keys = [None] * len(keys)
+            self.retentions = None
+        changed = [i for i, key in enumerate(keys) if key != self.keys[i]]
+        if changed:
+            self.payoffs[changed], self.profits[changed] = rows(changed)
+            self.evaluations += len(changed)
+        self.keys = keys
+        return changed
+    
+    def solve(self, solver='welfare'):
+        """
+        Equilibrium of the current tables, warm-started from the last one.
+        
+        Args:
+            solver: 'welfare' (branch and bound) or 'best_response'
+        
+        Returns:
+            best_retentions: List of equilibrium retention rates, one per insurer
+            payoffs_at_nash: Corresponding payoffs
+            details: Dict with nodes ('welfare') or rounds and status ('best_response')
+        """
+        scenario = TableScenario(self.retention_options, self.payoffs)
+        if solver == 'best_response':
+            best, payoffs, rounds, status = best_response_on_scenario(
+                scenario, self.retention_options, initial_retentions=self.retentions
+            )
+            details = {'rounds': rounds, 'status': status}
+        else:
+            best, payoffs, nodes = branch_and_bound_on_scenario(
+                scenario, self.retention_options, initial_retentions=self.retentions
+            )
+            details = {'nodes': nodes}
+        self.retentions = best
+        return best, payoffs, details
+    
+    def scenario(self, profits=False):
+        """TableScenario of a copy of the current payoffs (or mean profits), e.g. for verify_equilibrium."""
+        return TableScenario(self.retention_options, np.array(self.profits if profits else self.payoffs))
+
+
+def _evaluate_shard(task):
+    """
+    Process-pool worker: evaluates one shard of retention tuples.
+    
+    Each shard draws from its own PCG64 stream seeded by a spawned SeedSequence
+    child, so its result only depends on the shard, not on the worker running it.
+    
+    Args:
+        task: Tuple (S0s, mu, sigma, T, N, shard, shared_sample, seed_sequence)
+    
+    Returns:
+        (best_objective, best_retentions, profits) of the shard
+    """
+    S0s, mu, sigma, T, N, shard, shared_sample, seed_sequence = task
+    rng = make_rng(seed_sequence)
+    means = independent_mean_profits(S0s, mu, sigma, T, N, shard, shared_sample, rng=rng)
+    
+    objective = welfare_objective(means.T)
+    best = int(np.argmax(objective))
+    return float(objective[best]), shard[best].tolist(), means[best].tolist()
+
+
+def parallel_nash_equilibrium_n_insurers(S0s, mu, sigma, T, N, retention_options, seed=None,
+                                         max_workers=None, shard_size=SHARD_SIZE,
+                                         shared_sample=False):
+    """
+    Exhaustive welfare search with independent Monte Carlo runs, sharded over processes.
+    
+    The feasible tuples are cut into fixed-size shards in enumeration order and
+    shard k gets the k-th child of np.random.SeedSequence(seed). Shard results
+    are reduced in shard order with the same strict '>' rule as the serial
+    solvers, so the answer is identical for any number of workers.
+    
+    Args:
+        S0s: Array of initial premiums, one per insurer
+        mu, sigma, T, N: GBM parameters
+        retention_options: List of possible retention rates
+        seed: Root seed (int, SeedSequence, Generator or None for fresh entropy)
+        max_workers: Number of worker processes (None = all cores, 1 = run in-process)
+        shard_size: Number of retention tuples per shard
+        shared_sample: True if all insurers share one premium/claim draw per run
+    
+    Returns:
+        best_retentions: List of optimal retention rates, one per insurer
+        profits_at_nash: Corresponding mean profits
+    """
+    n_players = len(S0s)
+    root = seed_sequence(seed)
+    S0s = list(map(float, S0s))
+    
+    def tasks():
+        tuples = feasible_retentions(retention_options, n_players)
+        while True:
+            shard = np.array(list(islice(tuples, shard_size)), dtype=float)
+            if len(shard) == 0:
+                return
+            yield (S0s, mu, sigma, T, N, shard, shared_sample, root.spawn(1)[0])
+    
+    if max_workers == 1:
+        results = map(_evaluate_shard, tasks())
+        return _reduce_shards(results, n_players)
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # map() yields results in submission order: the reduction is deterministic
+        return _reduce_shards(executor.map(_evaluate_shard, tasks()), n_players)
+
+
+def _reduce_shards(results, n_players):
+    """
+    Reduces shard results in shard order, keeping the first best tuple on ties.
+    
+    Args:
+        results: Iterable of (best_objective, best_retentions, profits) per shard
+        n_players: Number of insurers
+    
+    Returns:
+        best_retentions, profits_at_nash (equal-split fallback if no shard)
+    """
+    best_objective = -np.inf
+    best_retentions = None
+    profits_at_nash = [0.0] * n_players
+    for objective, retentions, profits in results:
+        if objective > best_objective:
+            best_objective, best_retentions, profits_at_nash = objective, retentions, profits
     
+    # Fallback if no valid combination found: equal split of the whole risk
+    if best_retentions is None:
+        best_retentions = [1.0 / n_players] * n_players
     return best_retentions, profits_at_nash
@@ -1,15 +1,302 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import numpy as np
+from scipy.stats import norm, qmc
+from backend.stats import RunningMoments, QuantileSketch, control_variate_mean
 
-def simulate_GBM(S0, mu, sigma, T, N):
+# Paths simulated per chunk by the streaming simulators (bounds peak memory)
+CHUNK_SIZE = 2**18
+# Paths per shard of the parallel streaming simulator (one seed per shard)
+SHARD_PATHS = 2**20
+# First batch of the adaptive simulator, used to estimate how many paths are needed
+BATCH_SIZE = 10000
+# Shock samplers: pseudo-random draws or scrambled low-discrepancy points
+SAMPLERS = ('pseudo', 'sobol', 'halton')
+# Independent scrambles used to estimate the error of a quasi-Monte Carlo mean
+QMC_REPLICATES = 16
+# Claim-size distributions of the compound Poisson model and their parameters
+SEVERITIES = {
+    'lognormal': ('mu', 'sigma'),    # log-mean and log-standard deviation
+    'pareto': ('alpha', 'scale'),    # tail index and minimum claim size
+    'gamma': ('shape', 'scale'),
+}
+
+# Per-thread work arrays reused across calls (see scratch_buffer)
+_scratch = threading.local()
+
+def make_rng(rng=None):
+    """
+    Returns a PCG64-backed np.random.Generator.
+    
+    Args:
+        rng: None (fresh OS entropy), an int seed, a np.random.SeedSequence,
+             or an existing np.random.Generator (returned unchanged)
+    
+    Returns:
+        np.random.Generator
+    """
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.Generator(np.random.PCG64(rng))
+
+def seed_sequence(seed=None):
+    """
+    Root np.random.SeedSequence of a seed, for spawning independent child streams.
+    
+    Args:
+        seed: None (fresh OS entropy), an int, a np.random.SeedSequence (returned
+              unchanged) or a np.random.Generator (its own seed sequence)
+    
+    Returns:
+        np.random.SeedSequence
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed.bit_generator.seed_seq
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+def scratch_buffer(name, shape, dtype=np.float64):
+    """
+    Returns a reusable work array private to the calling thread.
+    
+    Each thread keeps one flat buffer per name and only reallocates it when a
+    larger shape is requested, so repeated simulations (chunks, requests served
+    by the same thread) do not churn the allocator. The array is overwritten by
+    the next call with the same name on the same thread: never return it to a
+    caller.
+    
+    Args:
+        name: Buffer name, one per independent use
+        shape: Shape of the requested array
+        dtype: Element type (each dtype gets its own buffer)
+    
+    Returns:
+        Uninitialized array view of the given shape
+    """
+    buffers = getattr(_scratch, 'buffers', None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    key = (name, np.dtype(dtype))
+    size = int(np.prod(shape))
+    buffer = buffers.get(key)
+    if buffer is None or buffer.size < size:
+        buffer = buffers[key] = np.empty(size, dtype=dtype)
+    return buffer[:size].reshape(shape)
+
+def standard_normal_shocks(N, rng=None, antithetic=False, sampler='pseudo', out=None,
+                           dtype=np.float64):
+    """
+    Draws standard normal shocks for GBM paths.
+    
+    The last axis of N counts paths; with a quasi-Monte Carlo sampler every path
+    is one low-discrepancy point whose coordinates fill the leading axes, so all
+    shocks of a path come from the same point. Scrambled points are mapped to
+    normals through the inverse normal CDF.
+    
+    Args:
+        N: Number of paths, or a shape whose last axis counts paths
+        rng: Seed or np.random.Generator (see make_rng); also drives the scrambling
+        antithetic: Draw ⌈N/2⌉ shocks Z and use (Z, -Z) along the last axis, so path
+                    j and path j + ⌈N/2⌉ form an antithetic pair
+        sampler: 'pseudo', 'sobol' (scrambled Sobol', best with N a power of 2)
+                 or 'halton' (scrambled Halton)
+        out: Optional array of shape N to fill instead of allocating
+        dtype: np.float64 or np.float32 (ignored when out is given); float32
+               pseudo-random draws come from NumPy's float32 normal generator
+    
+    Returns:
+        Array of shape N (out when given)
+    """
+    if sampler not in SAMPLERS:
+        raise ValueError(f"Unknown sampler {sampler!r}, expected one of {SAMPLERS}")
+    shape = tuple(int(n) for n in np.atleast_1d(N))
+    paths = shape[-1]
+    draws = (paths + 1) // 2 if antithetic else paths
+    dims = int(np.prod(shape[:-1]))
+    rng = make_rng(rng)
+    if out is not None:
+        dtype = out.dtype
+    
+    if out is not None and sampler == 'pseudo' and not antithetic:
+        # Same draws as the allocating call, written straight into the buffer
+        return rng.standard_normal(dtype=dtype, out=out)
+    if sampler == 'pseudo':
+        Z = rng.standard_normal((dims, draws), dtype=dtype)
+    else:
+        engine = qmc.Sobol(dims, rng=rng) if sampler == 'sobol' else qmc.Halton(dims, rng=rng)
+        # Scrambled points are almost surely inside (0, 1); clip to keep ppf finite
+        u = np.clip(engine.random(draws), np.finfo(float).tiny, 1 - np.finfo(float).eps)
+        Z = norm.ppf(u).T.astype(dtype, copy=False)
+    Z = Z.reshape(shape[:-1] + (draws,))
+    if antithetic:
+        Z = np.concatenate([Z, -Z], axis=-1)[..., :paths]
+    if out is not None:
+        out[...] = Z
+        return out
+    return Z
+
+def correlation_factor(correlation):
+    """
+    Lower-triangular factor L of a correlation matrix (L @ L.T = correlation).
+    
+    The factorization is cached per matrix, so repeated runs with the same
+    correlation (chunks, requests, grid points) factor it only once. Positive
+    definite matrices use the Cholesky factor; singular but positive
+    semi-definite ones (e.g. perfect correlation) fall back to an
+    eigendecomposition.
+    
+    Args:
+        correlation: Array (n, n), symmetric with unit diagonal
+    
+    Returns:
+        Read-only array (n, n) L
+    """
+    correlation = np.asarray(correlation, dtype=float)
+    return _correlation_factor(tuple(map(tuple, correlation.tolist())))
+
+@lru_cache(maxsize=32)
+def _correlation_factor(key):
+    """
+    Cached body of correlation_factor, keyed by the matrix as nested tuples.
+    """
+    correlation = np.array(key)
+    if (correlation.ndim != 2 or correlation.shape[0] != correlation.shape[1]
+            or not np.allclose(correlation, correlation.T) or not np.allclose(np.diag(correlation), 1)):
+        raise ValueError("Correlation matrix must be square, symmetric and with a unit diagonal")
+    try:
+        factor = np.linalg.cholesky(correlation)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(correlation)
+        if eigenvalues.min() < -1e-10:
+            raise ValueError("Correlation matrix must be positive semi-definite")
+        # Any square root works for sampling: L = V √Λ, then L @ L.T = V Λ V.T
+        factor = eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+    # Shared between callers through the cache: must not be modified
+    factor.setflags(write=False)
+    return factor
+
+def correlate_shocks(Z, correlation, out=None):
+    """
+    Turns independent standard normal shocks into correlated ones.
+    
+    All paths are transformed by a single matrix product L @ Z, computed in Z's
+    dtype, so a correlated run costs about the same as an independent one.
+    
+    Args:
+        Z: Array (n, N) of independent shocks, one row per insurer
+        correlation: Array (n, n) correlation matrix between the rows
+        out: Optional array (n, N) to write into (must not be Z)
+    
+    Returns:
+        Array (n, N) of shocks with the given correlation (out when given)
+    """
+    factor = correlation_factor(correlation)
+    if factor.shape[0] != Z.shape[0]:
+        raise ValueError("Correlation matrix size must match the number of insurers")
+    return np.matmul(factor.astype(Z.dtype, copy=False), Z, out=out)
+
+def simulate_GBM(S0, mu, sigma, T, N, rng=None, antithetic=False, sampler='pseudo', dtype=np.float64):
     """
     Simulates claims via Geometric Brownian Motion (GBM).
     S0: Initial premium or insured capital
+    rng: Seed or np.random.Generator (see make_rng); the same seed gives the same draws
+    antithetic: Use antithetic shock pairs (see standard_normal_shocks)
+    sampler: 'pseudo', 'sobol' or 'halton' shocks (see standard_normal_shocks)
+    dtype: np.float64 (default) or np.float32 paths (half the memory, ~1e-7 relative precision)
+    """
+    Z = standard_normal_shocks(N, rng, antithetic, sampler, dtype=dtype)
+    return gbm_terminal(S0, mu, sigma, T, Z)
+
+def gbm_terminal(S0, mu, sigma, T, Z, out=None):
+    """
+    GBM terminal value for given standard normal shocks Z, computed in Z's dtype.
+    out: Optional array to write into (may be Z itself); no temporaries are then
+         allocated and the result is identical to the allocating call
     """
-    Z = np.random.normal(0, 1, N)
-    ST = S0 * np.exp((mu - 0.5*sigma**2)*T + sigma*np.sqrt(T)*Z)
-    return ST
+    # Coefficients are cast to the shock dtype so float32 paths stay float32
+    dtype = np.asarray(Z).dtype
+    S0 = np.asarray(S0, dtype=dtype)
+    drift = dtype.type((mu - 0.5*sigma**2)*T)
+    volatility = dtype.type(sigma*np.sqrt(T))
+    if out is None:
+        ST = S0 * np.exp(drift + volatility*Z)
+        return ST
+    np.multiply(volatility, Z, out=out)
+    np.add(drift, out, out=out)
+    np.exp(out, out=out)
+    np.multiply(S0, out, out=out)
+    return out
 
-def calculate_profit(premiums, claims, retention):
+def claim_severities(severity, params, size=None, rng=None):
+    """
+    Draws individual claim sizes.
+    
+    Args:
+        severity: 'lognormal', 'pareto' or 'gamma' (see SEVERITIES)
+        params: Dict of the distribution parameters; values may be scalars or
+                arrays of the requested size (one parameter set per claim)
+        size: Number of claims
+        rng: Seed or np.random.Generator (see make_rng)
+    
+    Returns:
+        Array of claim sizes
+    """
+    if severity not in SEVERITIES:
+        raise ValueError(f"Unknown severity {severity!r}, expected one of {tuple(SEVERITIES)}")
+    missing = [name for name in SEVERITIES[severity] if name not in params]
+    if missing:
+        raise ValueError(f"Missing {severity} severity parameters: {missing}")
+    rng = make_rng(rng)
+    
+    if severity == 'lognormal':
+        return rng.lognormal(params['mu'], params['sigma'], size)
+    if severity == 'pareto':
+        # NumPy draws the Lomax (Pareto II) law; shifting by 1 gives the classical Pareto
+        return params['scale'] * (1.0 + rng.pareto(params['alpha'], size))
+    return rng.gamma(params['shape'], params['scale'], size)
+
+def compound_poisson_claims(frequency, N, severity='lognormal', params=None, rng=None, dtype=np.float64):
+    """
+    Simulates aggregate claims with a frequency-severity (compound Poisson) model.
+    
+    S = X_1 + ... + X_K per path, with K ~ Poisson(frequency) and i.i.d. claim
+    sizes X_k. Fully vectorized: all claim counts are drawn at once, all
+    sum(K) claim sizes in one flat array, and the sizes are summed per path
+    with a single np.bincount over their path index, so there is no loop over
+    paths whatever N is.
+    
+    Args:
+        frequency: Expected number of claims per path (scalar, or an array
+                   broadcastable to N, e.g. a column with one rate per insurer)
+        N: Number of paths, or a shape whose last axis counts paths
+        severity: 'lognormal' (default), 'pareto' or 'gamma' (see SEVERITIES)
+        params: Dict of severity parameters; values are scalars or arrays
+                broadcastable to N like frequency
+        rng: Seed or np.random.Generator (see make_rng)
+        dtype: np.float64 (default) or np.float32 totals
+    
+    Returns:
+        Array of shape N with the aggregate claims of every path
+    """
+    params = {} if params is None else params
+    rng = make_rng(rng)
+    shape = tuple(int(n) for n in np.atleast_1d(N))
+    
+    counts = rng.poisson(np.broadcast_to(frequency, shape)).ravel()
+    # Path of each individual claim, in claim order
+    owner = np.repeat(np.arange(counts.size), counts)
+    # Per-path parameters are expanded to one value per claim
+    claim_params = {
+        name: value if np.ndim(value) == 0 else np.broadcast_to(value, shape).ravel()[owner]
+        for name, value in params.items()
+    }
+    sizes = claim_severities(severity, claim_params, len(owner), rng)
+    totals = np.bincount(owner, weights=sizes, minlength=counts.size)
+    return totals.reshape(shape).astype(dtype, copy=False)
+
+def calculate_profit(premiums, claims, retention, out=None, dtype=None):
     """
     Calculates profit for an insurer under quota-share reinsurance.
     
@@ -22,14 +309,25 @@ def calculate_profit(premiums, claims, retention):
         premiums: Array of premiums collected (P)
         claims: Array of claims paid (C)
         retention: Insurer's retention rate (0-1, % kept by primary insurer)
+        out: Optional array of the broadcast shape to write the profits into
+             (avoids the premiums - claims temporary)
+        dtype: Storage dtype of the profits (default: that of premiums and claims,
+               at least float32)
     
     Returns:
         profit: Array of profits calculated as retention × (premiums - claims)
     """
-    profit = retention * (premiums - claims)
+    if dtype is None:
+        dtype = np.result_type(np.asarray(premiums), np.asarray(claims), np.float32)
+    # A float64 retention vector would otherwise promote float32 samples
+    retention = np.asarray(retention, dtype=dtype)
+    if out is not None:
+        np.subtract(premiums, claims, out=out)
+        return np.multiply(retention, out, out=out)
+    profit = retention * (np.asarray(premiums, dtype=dtype) - np.asarray(claims, dtype=dtype))
     return profit
 
-def simulation_3_insurers(S0, mu, sigma, T, N, retentions):
+def simulation_3_insurers(S0, mu, sigma, T, N, retentions, rng=None, antithetic=False):
     """
     Simulates quota-share reinsurance for 3 insurers with identical initial premiums.
     
@@ -37,22 +335,19 @@ def simulation_3_insurers(S0, mu, sigma, T, N, retentions):
         S0: Initial premium amount (applies equally to all 3 insurers)
         mu, sigma, T, N: GBM parameters (drift, volatility, time horizon, simulations)
         retentions: List [ret_A, ret_B, ret_C] of retention rates for each insurer
+        rng: Seed or np.random.Generator (see make_rng)
+        antithetic: Use antithetic shock pairs (see simulate_GBM)
     
     Returns:
         (profit_A, profit_B, profit_C): Arrays of simulated profits
     """
-    # Generate premiums and claims for all 3 insurers
-    premiums = simulate_GBM(S0, mu, sigma, T, N)
-    # Claims = 70% of premiums (realistic loss ratio for insurance)
-    claims = simulate_GBM(S0 * 0.7, mu, sigma, T, N)
-    
-    # Calculate profits using retention rates
-    profit_A = calculate_profit(premiums, claims, retentions[0])
-    profit_B = calculate_profit(premiums, claims, retentions[1])
-    profit_C = calculate_profit(premiums, claims, retentions[2])
-    return profit_A, profit_B, profit_C
+    # All 3 insurers share the same premiums and claims
+    profits = simulation_n_insurers([S0, S0, S0], mu, sigma, T, N, retentions, shared_sample=True,
+                                    rng=rng, antithetic=antithetic)
+    return tuple(profits)
 
-def simulation_3_insurers_different_premiums(S0A, S0B, S0C, mu, sigma, T, N, retentions):
+def simulation_3_insurers_different_premiums(S0A, S0B, S0C, mu, sigma, T, N, retentions, rng=None,
+                                             antithetic=False, correlation=None):
     """
     Simulates quota-share reinsurance for 3 insurers with different initial premiums.
     
@@ -60,22 +355,825 @@ def simulation_3_insurers_different_premiums(S0A, S0B, S0C, mu, sigma, T, N, ret
         S0A, S0B, S0C: Initial premium amounts for each insurer
         mu, sigma, T, N: GBM parameters (drift, volatility, time horizon, simulations)
         retentions: List [ret_A, ret_B, ret_C] of retention rates for each insurer
+        rng: Seed or np.random.Generator (see make_rng)
+        antithetic: Use antithetic shock pairs (see simulate_GBM)
+        correlation: Optional 3 × 3 correlation matrix of the insurers' claim shocks
     
     Returns:
         (profit_A, profit_B, profit_C): Arrays of simulated profits
     """
-    # Generate premiums and claims for each insurer independently
-    premiums_A = simulate_GBM(S0A, mu, sigma, T, N)
-    claims_A = simulate_GBM(S0A * 0.7, mu, sigma, T, N)
+    # Premiums and claims are drawn for each insurer independently (claims correlated if requested)
+    profits = simulation_n_insurers([S0A, S0B, S0C], mu, sigma, T, N, retentions, rng=rng,
+                                    antithetic=antithetic, correlation=correlation)
+    return tuple(profits)
+
+def simulation_n_insurers(S0s, mu, sigma, T, N, retentions, shared_sample=False, rng=None,
+                          antithetic=False, out=None, dtype=np.float64, correlation=None):
+    """
+    Simulates quota-share reinsurance for any number of insurers.
+    
+    Memory-lean kernel: premiums are simulated in place in the output array and
+    claims in a per-thread scratch array (see scratch_buffer), then the profits
+    overwrite the premiums. Besides the output, only one n_sources × N array is
+    held in memory, against six GBM and profit arrays plus temporaries before.
+    The profits equal those of scenario_n_insurers(...).profit_matrix(retentions).
+    
+    Args:
+        S0s: Array of initial premium amounts, one per insurer
+        mu, sigma, T, N: GBM parameters (drift, volatility, time horizon, simulations)
+        retentions: Array of retention rates, one per insurer
+        shared_sample: True if all insurers share one premium/claim draw
+                       (requires identical premiums)
+        rng: Seed or np.random.Generator (see make_rng)
+        antithetic: Use antithetic shock pairs (see standard_normal_shocks)
+        out: Optional array (n_insurers, N) to write the profits into
+        dtype: np.float64 (default) or np.float32 storage (ignored when out is given)
+        correlation: Optional (n_insurers, n_insurers) correlation matrix of the
+                     claim shocks (see correlate_shocks); None = independent claims
+    
+    Returns:
+        profits: Array (n_insurers, N) of simulated profits (out when given)
+    """
+    rng = make_rng(rng)
+    S0s, n_insurers = _premium_sources(S0s, shared_sample, correlation)
+    shape = (len(S0s), N)
+    if out is None:
+        out = np.empty((n_insurers, N), dtype=dtype)
+    dtype = out.dtype
+    
+    # Premiums are simulated in the output itself unless one draw is shared by all rows
+    premiums = out if len(S0s) == n_insurers else scratch_buffer('premiums', shape, dtype)
+    premiums = standard_normal_shocks(shape, rng, antithetic, out=premiums)
+    gbm_terminal(S0s, mu, sigma, T, premiums, out=premiums)
+    # Claims = 70% of premiums (realistic loss ratio for insurance)
+    claims = standard_normal_shocks(shape, rng, antithetic, out=scratch_buffer('claims', shape, dtype))
+    if correlation is not None:
+        claims = correlate_shocks(claims, correlation, out=scratch_buffer('correlated_claims', shape, dtype))
+    gbm_terminal(S0s * 0.7, mu, sigma, T, claims, out=claims)
+    
+    retentions = np.asarray(retentions, dtype=float).reshape(n_insurers, 1)
+    return calculate_profit(premiums, claims, retentions, out=out)
+
+
+class SimulationScenario:
+    """
+    Premiums and claims drawn once and reused for every retention vector.
+    
+    Common random numbers: since Profit = Retention × (Premium - Claims) is linear
+    in the retention, every candidate retention vector can be evaluated against the
+    same GBM sample. Comparisons between vectors are then free of sampling noise.
+    
+    The sample may be stored in float32; mean margins are always accumulated
+    and returned in float64.
+    
+    Attributes:
+        n_insurers: Number of insurers in the scenario
+        premiums: Array (n_sources, N) of simulated premiums
+        claims: Array (n_sources, N) of simulated claims
+        margins: Array (n_sources, N) of Premium - Claims per path
+        mean_margins: Array (n_sources,) of mean margins
+    
+    n_sources is 1 when all insurers share one draw (identical premiums),
+    n_insurers otherwise.
+    """
+    
+    def __init__(self, premiums, claims, n_insurers):
+        self.n_insurers = n_insurers
+        self.premiums = np.atleast_2d(premiums)
+        self.claims = np.atleast_2d(claims)
+        self.margins = self.premiums - self.claims
+        self.mean_margins = np.mean(self.margins, axis=1, dtype=np.float64)
+    
+    def profit_matrix(self, retentions):
+        """
+        Simulated profits of every insurer for one retention vector.
+        
+        Args:
+            retentions: Array of retention rates, one per insurer
+        
+        Returns:
+            Array (n_insurers, N) of profits
+        """
+        retentions = np.asarray(retentions, dtype=float).reshape(self.n_insurers, 1)
+        return calculate_profit(self.premiums, self.claims, retentions)
+    
+    def profits(self, retentions):
+        """
+        Simulated profits of each insurer for one retention vector.
+        
+        Args:
+            retentions: List [ret_A, ret_B, ...] of retention rates for each insurer
+        
+        Returns:
+            Tuple of profit arrays, one per insurer
+        """
+        return tuple(self.profit_matrix(retentions))
+    
+    def mean_profits(self, retentions):
+        """
+        Mean profits for any batch of retention vectors.
+        
+        Args:
+            retentions: Array (..., n_insurers) of retention vectors
+        
+        Returns:
+            Array (..., n_insurers) of mean profits on this sample
+        """
+        return np.asarray(retentions, dtype=float) * self.mean_margins
+
+
+def scenario_3_insurers(S0, mu, sigma, T, N, rng=None, dtype=np.float64):
+    """
+    Draws one shared premium/claim sample for 3 insurers with identical premiums.
+    
+    Args:
+        S0: Initial premium amount (applies equally to all 3 insurers)
+        mu, sigma, T, N: GBM parameters (drift, volatility, time horizon, simulations)
+        rng: Seed or np.random.Generator (see make_rng)
+        dtype: np.float64 (default) or np.float32 storage of the sample
+    
+    Returns:
+        SimulationScenario reusable for every retention vector
+    """
+    return scenario_n_insurers([S0, S0, S0], mu, sigma, T, N, shared_sample=True, rng=rng, dtype=dtype)
+
+
+def scenario_3_insurers_different_premiums(S0A, S0B, S0C, mu, sigma, T, N, rng=None, dtype=np.float64,
+                                           correlation=None):
+    """
+    Draws one premium/claim sample per insurer for 3 insurers with different premiums.
+    
+    Args:
+        S0A, S0B, S0C: Initial premium amounts for each insurer
+        mu, sigma, T, N: GBM parameters (drift, volatility, time horizon, simulations)
+        rng: Seed or np.random.Generator (see make_rng)
+        dtype: np.float64 (default) or np.float32 storage of the sample
+        correlation: Optional 3 × 3 correlation matrix of the insurers' claim shocks
+    
+    Returns:
+        SimulationScenario reusable for every retention vector
+    """
+    return scenario_n_insurers([S0A, S0B, S0C], mu, sigma, T, N, rng=rng, dtype=dtype,
+                               correlation=correlation)
+
+
+def scenario_n_insurers(S0s, mu, sigma, T, N, shared_sample=False, rng=None, antithetic=False,
+                        sampler='pseudo', dtype=np.float64, correlation=None):
+    """
+    Draws one premium/claim sample for any number of insurers.
+    
+    The premium and claim shocks of all insurers are drawn in a single
+    (2, n_sources, N) call, so with a quasi-Monte Carlo sampler each path is one
+    2·n_sources-dimensional point.
+    
+    Args:
+        S0s: Array of initial premium amounts, one per insurer
+        mu, sigma, T, N: GBM parameters (drift, volatility, time horizon, simulations)
+        shared_sample: True if all insurers share one premium/claim draw
+                       (requires identical premiums)
+        rng: Seed or np.random.Generator (see make_rng)
+        antithetic: Use antithetic shock pairs (see standard_normal_shocks)
+        sampler: 'pseudo', 'sobol' or 'halton' shocks (see standard_normal_shocks)
+        dtype: np.float64 (default) or np.float32 storage of the sample
+        correlation: Optional (n_insurers, n_insurers) correlation matrix of the
+                     claim shocks (see correlate_shocks)
+    
+    Returns:
+        SimulationScenario reusable for every retention vector
+    """
+    S0s, n_insurers = _premium_sources(S0s, shared_sample, correlation)
+    factors = unit_gbm_factors(len(S0s), mu, sigma, T, N, rng, antithetic, sampler, dtype, correlation)
+    return scaled_scenario(factors, S0s[:, 0], n_insurers)
+
+
+def unit_gbm_factors(n_sources, mu, sigma, T, N, rng=None, antithetic=False, sampler='pseudo',
+                     dtype=np.float64, correlation=None):
+    """
+    Draws the premium and claim GBM values of unit initial amounts.
+    
+    GBM values are proportional to their initial amount, so one draw of these
+    factors serves any premiums (see scaled_scenario): a change of premium
+    rescales the paths instead of drawing them again.
+    
+    Args:
+        n_sources: Number of premium/claim sources
+        mu, sigma, T, N: GBM parameters (drift, volatility, time horizon, simulations)
+        rng: Seed or np.random.Generator (see make_rng)
+        antithetic: Use antithetic shock pairs (see standard_normal_shocks)
+        sampler: 'pseudo', 'sobol' or 'halton' shocks (see standard_normal_shocks)
+        dtype: np.float64 (default) or np.float32 storage
+        correlation: Optional (n_sources, n_sources) correlation matrix of the
+                     claim shocks (see correlate_shocks)
+    
+    Returns:
+        Array (2, n_sources, N): premium factors, then claim factors
+    """
+    Z = standard_normal_shocks((2, n_sources, N), rng, antithetic, sampler, dtype=dtype)
+    if correlation is not None:
+        Z[1] = correlate_shocks(Z[1], correlation)
+    return gbm_terminal(1.0, mu, sigma, T, Z, out=Z)
+
+
+def scaled_scenario(factors, S0s, n_insurers=None):
+    """
+    Premium/claim sample of given initial premiums from unit GBM factors.
+    
+    The result is identical to drawing the sample directly with the same
+    shocks (gbm_terminal multiplies by the initial amount last), so one source
+    can be rescaled without touching the others.
+    
+    Args:
+        factors: Array (2, n_sources, N) from unit_gbm_factors
+        S0s: Initial premium of each source
+        n_insurers: Number of insurers (default one per source)
+    
+    Returns:
+        SimulationScenario
+    """
+    S0s = np.asarray(S0s, dtype=float)[:, None]
+    premiums = np.asarray(S0s, dtype=factors.dtype) * factors[0]
+    # Claims = 70% of premiums (realistic loss ratio for insurance)
+    claims = np.asarray(S0s * 0.7, dtype=factors.dtype) * factors[1]
+    return SimulationScenario(premiums, claims, len(S0s) if n_insurers is None else n_insurers)
+
+
+def scenario_compound_poisson_n_insurers(S0s, mu, sigma, T, N, frequencies, severity='lognormal',
+                                         params=None, rng=None, dtype=np.float64):
+    """
+    Draws GBM premiums with compound Poisson claims for any number of insurers.
+    
+    Same premiums as scenario_n_insurers, but each insurer's claims come from a
+    frequency-severity model (see compound_poisson_claims) instead of a GBM
+    at 70% of the premium, so claim counts and heavy tails are represented.
+    
+    Args:
+        S0s: Array of initial premium amounts, one per insurer
+        mu, sigma, T, N: GBM parameters of the premiums
+        frequencies: Expected number of claims per path, one per insurer (or a scalar)
+        severity: 'lognormal' (default), 'pareto' or 'gamma' (see SEVERITIES)
+        params: Dict of severity parameters, each a scalar or one value per insurer
+        rng: Seed or np.random.Generator (see make_rng)
+        dtype: np.float64 (default) or np.float32 storage of the sample
+    
+    Returns:
+        SimulationScenario reusable for every retention vector
+    """
+    S0s, n_insurers = _premium_sources(S0s, False)
+    rng = make_rng(rng)
+    premiums = simulate_GBM(S0s, mu, sigma, T, (n_insurers, N), rng, dtype=dtype)
+    
+    # Per-insurer values become columns so they broadcast over the N paths
+    def column(value):
+        return value if np.ndim(value) == 0 else np.asarray(value, dtype=float).reshape(n_insurers, 1)
+    
+    params = {} if params is None else params
+    claims = compound_poisson_claims(
+        column(frequencies), (n_insurers, N), severity,
+        {name: column(value) for name, value in params.items()}, rng, dtype
+    )
+    return SimulationScenario(premiums, claims, n_insurers)
+
+
+def _premium_sources(S0s, shared_sample, correlation=None):
+    """
+    Initial premiums of the premium/claim sources as a column, and the number of insurers.
+    """
+    S0s = np.asarray(S0s, dtype=float)
+    n_insurers = len(S0s)
+    if shared_sample:
+        if np.any(S0s != S0s[0]):
+            raise ValueError("A shared sample requires identical initial premiums")
+        if correlation is not None:
+            raise ValueError("A shared sample is already perfectly correlated")
+        S0s = S0s[:1]
+    return S0s[:, None], n_insurers
+
+
+def gbm_moments(S0, mu, sigma, T):
+    """
+    Exact mean and variance of the GBM terminal value simulated by simulate_GBM.
+    
+    E[S_T] = S0 × e^(μT)
+    Var[S_T] = S0² × e^(2μT) × (e^(σ²T) - 1)
+    
+    Args:
+        S0: Initial value (scalar or array)
+        mu, sigma, T: GBM parameters (drift, volatility, time horizon)
+    
+    Returns:
+        (mean, variance) of S_T
+    """
+    mean = S0 * np.exp(mu * T)
+    variance = mean**2 * np.expm1(sigma**2 * T)
+    return mean, variance
+
+
+def compound_poisson_moments(frequency, severity='lognormal', params=None):
+    """
+    Exact mean and variance of the aggregate claims of compound_poisson_claims.
+    
+    E[S] = λ × E[X]
+    Var[S] = λ × E[X²]
+    
+    Args:
+        frequency: Expected number of claims λ (scalar or array)
+        severity: 'lognormal' (default), 'pareto' or 'gamma'
+        params: Dict of severity parameters (see SEVERITIES)
+    
+    Returns:
+        (mean, variance) of S; infinite when the Pareto tail is too heavy
+        (alpha ≤ 1 for the mean, alpha ≤ 2 for the variance)
+    """
+    params = {} if params is None else params
+    if severity == 'lognormal':
+        mu, sigma = params['mu'], params['sigma']
+        first = np.exp(mu + 0.5 * sigma**2)
+        second = np.exp(2 * mu + 2 * sigma**2)
+    elif severity == 'pareto':
+        alpha, scale = np.asarray(params['alpha'], dtype=float), params['scale']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            first = np.where(alpha > 1, alpha * scale / (alpha - 1), np.inf)
+            second = np.where(alpha > 2, alpha * scale**2 / (alpha - 2), np.inf)
+    elif severity == 'gamma':
+        shape, scale = params['shape'], params['scale']
+        first = shape * scale
+        second = shape * (shape + 1) * scale**2
+    else:
+        raise ValueError(f"Unknown severity {severity!r}, expected one of {tuple(SEVERITIES)}")
+    return frequency * first, frequency * second
+
+
+class AnalyticScenario:
+    """
+    Closed-form counterpart of SimulationScenario for the GBM model.
+    
+    Premiums and claims are independent GBM draws, with claims starting at 70%
+    of the premium, so for each insurer:
+    - E[Profit] = Retention × (S0 × e^(μT) - 0.7 × S0 × e^(μT))
+    - Var[Profit] = Retention² × (Var[P] + Var[C])
+    
+    mean_profits() has the same signature as on SimulationScenario, so the Nash
+    engine can use either without sampling anything in the analytic case.
+    
+    Attributes:
+        n_insurers: Number of insurers in the scenario
+        mean_margins: Array (n_insurers,) of exact E[Premium - Claims]
+        variance_margins: Array (n_insurers,) of exact Var[Premium - Claims]
+    """
+    
+    def __init__(self, S0s, mu, sigma, T):
+        S0s = np.asarray(S0s, dtype=float)
+        mean_premium, var_premium = gbm_moments(S0s, mu, sigma, T)
+        mean_claims, var_claims = gbm_moments(S0s * 0.7, mu, sigma, T)
+        self.n_insurers = len(S0s)
+        self.mean_margins = mean_premium - mean_claims
+        self.variance_margins = var_premium + var_claims
+    
+    def mean_profits(self, retentions):
+        """
+        Exact mean profits for any batch of retention vectors.
+        
+        Args:
+            retentions: Array (..., n_insurers) of retention vectors
+        
+        Returns:
+            Array (..., n_insurers) of expected profits
+        """
+        return np.asarray(retentions, dtype=float) * self.mean_margins
+    
+    def variance_profits(self, retentions):
+        """
+        Exact profit variances for any batch of retention vectors.
+        
+        Args:
+            retentions: Array (..., n_insurers) of retention vectors
+        
+        Returns:
+            Array (..., n_insurers) of profit variances
+        """
+        return np.asarray(retentions, dtype=float)**2 * self.variance_margins
+
+
+def expected_profits_3_insurers(S0, mu, sigma, T, retentions, return_variance=False):
+    """
+    Exact expected profits for 3 insurers with identical initial premiums.
+    
+    Args:
+        S0: Initial premium amount (applies equally to all 3 insurers)
+        mu, sigma, T: GBM parameters (drift, volatility, time horizon)
+        retentions: List [ret_A, ret_B, ret_C] of retention rates for each insurer
+        return_variance: Also return the exact profit variances
+    
+    Returns:
+        means: Array [mean_A, mean_B, mean_C] of expected profits
+        variances: Array of profit variances (only if return_variance)
+    """
+    return expected_profits_3_insurers_different_premiums(
+        S0, S0, S0, mu, sigma, T, retentions, return_variance
+    )
+
+
+def expected_profits_3_insurers_different_premiums(S0A, S0B, S0C, mu, sigma, T, retentions,
+                                                   return_variance=False):
+    """
+    Exact expected profits for 3 insurers with different initial premiums.
+    
+    Replaces the Monte Carlo mean of simulation_3_insurers_different_premiums:
+    no paths are sampled, and N plays no role.
+    
+    Args:
+        S0A, S0B, S0C: Initial premium amounts for each insurer
+        mu, sigma, T: GBM parameters (drift, volatility, time horizon)
+        retentions: List [ret_A, ret_B, ret_C] of retention rates for each insurer
+        return_variance: Also return the exact profit variances
+    
+    Returns:
+        means: Array [mean_A, mean_B, mean_C] of expected profits
+        variances: Array of profit variances (only if return_variance)
+    """
+    scenario = AnalyticScenario([S0A, S0B, S0C], mu, sigma, T)
+    means = scenario.mean_profits(retentions)
+    if return_variance:
+        return means, scenario.variance_profits(retentions)
+    return means
+
+
+
+def streaming_simulation_n_insurers(S0s, mu, sigma, T, N, retentions, shared_sample=False,
+                                    chunk_size=CHUNK_SIZE, rng=None, dtype=np.float64, correlation=None,
+                                    sketch=None):
+    """
+    Simulates N paths in fixed-size chunks and keeps only running statistics.
+    
+    Each chunk of premiums and claims is drawn, turned into profits, folded into
+    Welford-style accumulators and discarded, so memory stays constant in N
+    (N = 10^8 needs no more RAM than N = chunk_size). Chunks are simulated into
+    the same per-thread buffers (see simulation_n_insurers).
+    
+    Args:
+        S0s: Array of initial premium amounts, one per insurer
+        mu, sigma, T, N: GBM parameters (drift, volatility, time horizon, simulations)
+        retentions: Array of retention rates, one per insurer
+        shared_sample: True if all insurers share one premium/claim draw
+        chunk_size: Number of paths simulated per chunk
+        rng: Seed or np.random.Generator (see make_rng)
+        dtype: np.float64 (default) or np.float32 paths; the running statistics
+               are always accumulated in float64
+        correlation: Optional correlation matrix of the claim shocks (see correlate_shocks)
+        sketch: Optional QuantileSketch over the insurers, updated with every chunk
+                (tail risk: VaR / TVaR of the profits, see QuantileSketch.summary)
+    
+    Returns:
+        RunningMoments over the profits of each insurer (mean, variance, min, max)
+    """
+    rng = make_rng(rng)
+    moments = RunningMoments(len(S0s))
+    for start in range(0, N, chunk_size):
+        paths = min(chunk_size, N - start)
+        profits = scratch_buffer('profits', (len(S0s), paths), dtype)
+        simulation_n_insurers(S0s, mu, sigma, T, paths, retentions, shared_sample, rng, out=profits,
+                              correlation=correlation)
+        moments.update(profits)
+        if sketch is not None:
+            sketch.update(profits)
+    return moments
+
+
+def _simulate_shard(task):
+    """
+    Process-pool worker: streams one shard of paths.
+    
+    Args:
+        task: Tuple (S0s, mu, sigma, T, paths, retentions, shared_sample, compression, seed_sequence)
+    
+    Returns:
+        (RunningMoments, QuantileSketch) of the shard
+    """
+    S0s, mu, sigma, T, paths, retentions, shared_sample, compression, seed = task
+    rng = make_rng(seed)
+    sketch = QuantileSketch(len(S0s), compression)
+    moments = streaming_simulation_n_insurers(S0s, mu, sigma, T, paths, retentions, shared_sample,
+                                              rng=rng, sketch=sketch)
+    return moments, sketch
+
+
+def parallel_streaming_simulation_n_insurers(S0s, mu, sigma, T, N, retentions, seed=None, max_workers=None,
+                                             shard_paths=SHARD_PATHS, shared_sample=False, compression=1000):
+    """
+    Streaming simulation sharded over processes, with mergeable statistics.
+    
+    The N paths are cut into shards of shard_paths and shard k gets the k-th
+    child of the root SeedSequence. Each worker returns its running moments and
+    quantile sketch; they are merged in shard order, so the result is identical
+    for any number of workers.
+    
+    Args:
+        S0s: Array of initial premium amounts, one per insurer
+        mu, sigma, T, N: GBM parameters (drift, volatility, time horizon, simulations)
+        retentions: Array of retention rates, one per insurer
+        seed: Root seed (int, SeedSequence, Generator or None for fresh entropy)
+        max_workers: Number of worker processes (None = all cores, 1 = run in-process)
+        shard_paths: Number of paths per shard
+        shared_sample: True if all insurers share one premium/claim draw
+        compression: Accuracy parameter δ of the quantile sketches
+    
+    Returns:
+        moments: RunningMoments over the profits of each insurer
+        sketch: QuantileSketch of the profits of each insurer
+    """
+    root = seed_sequence(seed)
+    S0s = list(map(float, S0s))
+    retentions = list(map(float, retentions))
+    tasks = [
+        (S0s, mu, sigma, T, min(shard_paths, N - start), retentions, shared_sample, compression, child)
+        for start, child in zip(range(0, N, shard_paths), root.spawn(-(-N // shard_paths)))
+    ]
+    
+    moments = RunningMoments(len(S0s))
+    sketch = QuantileSketch(len(S0s), compression)
+    if max_workers == 1:
+        return _merge_shards(map(_simulate_shard, tasks), moments, sketch)
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # map() yields results in submission order: the merge is deterministic
+        return _merge_shards(executor.map(_simulate_shard, tasks), moments, sketch)
+
+
+def _merge_shards(results, moments, sketch):
+    """
+    Merges shard statistics in shard order into moments and sketch.
+    
+    Args:
+        results: Iterable of (RunningMoments, QuantileSketch) per shard
+        moments, sketch: Empty accumulators to merge into
+    
+    Returns:
+        (moments, sketch)
+    """
+    for shard_moments, shard_sketch in results:
+        moments.merge(shard_moments)
+        sketch.merge(shard_sketch)
+    return moments, sketch
+
+
+
+def adaptive_simulation_n_insurers(S0s, mu, sigma, T, retentions, target_se=None, target_rel=None,
+                                   batch_size=BATCH_SIZE, max_N=10**8, shared_sample=False,
+                                   chunk_size=CHUNK_SIZE, rng=None, dtype=np.float64, correlation=None,
+                                   sketch=None):
+    """
+    Simulates only as many paths as needed to reach a target precision.
+    
+    After each batch the standard error of every insurer's mean profit is
+    compared with the target. While it is too large, the number of paths still
+    needed is projected from SE ∝ 1/√N and the next batch covers that gap (at
+    least batch_size paths, never more than max_N in total). Low-volatility
+    requests therefore stop after one batch, high-volatility ones keep going.
     
-    premiums_B = simulate_GBM(S0B, mu, sigma, T, N)
-    claims_B = simulate_GBM(S0B * 0.7, mu, sigma, T, N)
+    Args:
+        S0s: Array of initial premium amounts, one per insurer
+        mu, sigma, T: GBM parameters (drift, volatility, time horizon)
+        retentions: Array of retention rates, one per insurer
+        target_se: Target standard error of each mean profit (absolute)
+        target_rel: Target standard error relative to |mean profit| (e.g. 0.001)
+        batch_size: Minimum number of paths simulated per batch
+        max_N: Maximum total number of paths
+        shared_sample: True if all insurers share one premium/claim draw
+        chunk_size: Number of paths held in memory at once
+        rng: Seed or np.random.Generator (see make_rng)
+        dtype: np.float64 (default) or np.float32 paths (see streaming_simulation_n_insurers)
+        correlation: Optional correlation matrix of the claim shocks (see correlate_shocks)
+        sketch: Optional QuantileSketch updated with every path (see streaming_simulation_n_insurers)
+    
+    Returns:
+        moments: RunningMoments over the profits (count = paths used, std_error = achieved error)
+        converged: True if every insurer reached the target before max_N
+    """
+    if target_se is None and target_rel is None:
+        raise ValueError("target_se or target_rel is required")
+    
+    rng = make_rng(rng)
+    moments = RunningMoments(len(S0s))
+    paths = min(max(batch_size, 2), max_N)
+    while True:
+        moments.merge(streaming_simulation_n_insurers(
+            S0s, mu, sigma, T, paths, retentions, shared_sample, chunk_size, rng, dtype, correlation, sketch
+        ))
+        
+        # Both targets must hold when both are given
+        target = np.full(len(S0s), np.inf)
+        if target_se is not None:
+            target = np.minimum(target, target_se)
+        if target_rel is not None:
+            target = np.minimum(target, target_rel * np.abs(moments.mean))
+        
+        std_error = moments.std_error
+        if np.all(std_error <= target):
+            return moments, True
+        if moments.count >= max_N:
+            return moments, False
+        
+        # SE scales as 1/√N: paths needed for the worst insurer at the current estimate,
+        # over the insurers still above a nonzero target (a zero retention has SE = target = 0)
+        pending = (std_error > target) & (target > 0)
+        needed = np.max(moments.count * (std_error[pending] / target[pending])**2) if pending.any() else max_N
+        needed = min(needed, max_N) if np.isfinite(needed) else max_N
+        paths = int(min(max(needed - moments.count, batch_size), max_N - moments.count))
+
+
+
+def surplus_simulation_n_insurers(S0s, mu, sigma, years, N, retentions, initial_capital, dt=1.0,
+                                  shared_sample=False, chunk_size=CHUNK_SIZE, rng=None, dtype=np.float64,
+                                  correlation=None):
+    """
+    Simulates year-by-year surplus processes and the probability of ruin.
+    
+    Premium and claim levels follow GBM paths (claims starting at 70% of the
+    premium, as in the single-period model); in every period each insurer adds
+    its retained result Retention × (Premium - Claims) to its surplus:
+    
+        U_t = U_(t-1) + Retention × (P_t - C_t),   U_0 = initial capital
+    
+    and a path is ruined once its surplus drops below zero. The simulation
+    streams through the periods chunk by chunk, keeping only the current log
+    levels, the running surplus and a per-path "ruined" mask, so memory depends
+    on chunk_size only, not on the horizon or N. With one period of length T
+    the surplus is U_0 plus the profit of simulation_n_insurers.
+    
+    Args:
+        S0s: Array of initial premium amounts, one per insurer
+        mu, sigma: GBM drift and volatility (per year)
+        years: Number of periods
+        N: Number of paths
+        retentions: Array of retention rates, one per insurer
+        initial_capital: Initial surplus U_0 (scalar or one per insurer)
+        dt: Length of a period in years
+        shared_sample: True if all insurers share one premium/claim path
+        chunk_size: Number of paths held in memory at once
+        rng: Seed or np.random.Generator (see make_rng)
+        dtype: np.float64 (default) or np.float32 paths
+        correlation: Optional correlation matrix of the claim shocks (see correlate_shocks)
+    
+    Returns:
+        Dict with:
+            ruin_probability: Array (n_insurers,) of P(ruin before the horizon)
+            std_errors: Array (n_insurers,) of their binomial standard errors
+            ruin_probability_by_year: Array (n_insurers, years) of P(ruin by period t)
+            final_surplus: RunningMoments of the surplus at the horizon (all paths)
+    """
+    rng = make_rng(rng)
+    S0s, n_insurers = _premium_sources(S0s, shared_sample, correlation)
+    retentions = np.asarray(retentions, dtype=dtype).reshape(n_insurers, 1)
+    capital = np.broadcast_to(np.asarray(initial_capital, dtype=dtype), (n_insurers,))[:, None]
+    drift = np.dtype(dtype).type((mu - 0.5*sigma**2)*dt)
+    volatility = np.dtype(dtype).type(sigma*np.sqrt(dt))
+    
+    ruined_by_year = np.zeros((n_insurers, years), dtype=np.int64)
+    final_surplus = RunningMoments(n_insurers)
+    for start in range(0, N, chunk_size):
+        paths = min(chunk_size, N - start)
+        shape = (len(S0s), paths)
+        log_premiums = scratch_buffer('surplus_log_premiums', shape, dtype)
+        log_claims = scratch_buffer('surplus_log_claims', shape, dtype)
+        surplus = scratch_buffer('surplus', (n_insurers, paths), dtype)
+        ruined = np.zeros((n_insurers, paths), dtype=bool)
+        below = np.empty((n_insurers, paths), dtype=bool)
+        log_premiums[...] = np.log(S0s)
+        # Claims = 70% of premiums (realistic loss ratio for insurance)
+        log_claims[...] = np.log(S0s * 0.7)
+        surplus[...] = capital
+        
+        for year in range(years):
+            premiums = standard_normal_shocks(shape, rng, out=scratch_buffer('surplus_premiums', shape, dtype))
+            claims = standard_normal_shocks(shape, rng, out=scratch_buffer('surplus_claims', shape, dtype))
+            if correlation is not None:
+                claims = correlate_shocks(claims, correlation,
+                                          out=scratch_buffer('surplus_correlated', shape, dtype))
+            # Log levels advance by one GBM step, then the levels are taken in place
+            for level, shocks in ((log_premiums, premiums), (log_claims, claims)):
+                np.multiply(volatility, shocks, out=shocks)
+                np.add(drift, shocks, out=shocks)
+                np.add(level, shocks, out=level)
+                np.exp(level, out=shocks)
+            
+            margins = np.subtract(premiums, claims, out=premiums)
+            retained = scratch_buffer('surplus_retained', (n_insurers, paths), dtype)
+            surplus += np.multiply(retentions, margins, out=retained)
+            np.logical_or(ruined, np.less(surplus, 0, out=below), out=ruined)
+            ruined_by_year[:, year] += ruined.sum(axis=1)
+        final_surplus.update(surplus)
+    
+    by_year = ruined_by_year / N
+    probability = by_year[:, -1] if years > 0 else np.zeros(n_insurers)
+    return {
+        'ruin_probability': probability,
+        'std_errors': np.sqrt(probability * (1 - probability) / N),
+        'ruin_probability_by_year': by_year,
+        'final_surplus': final_surplus,
+    }
+
+
+def estimate_mean_profits_n_insurers(S0s, mu, sigma, T, N, retentions, antithetic=False,
+                                     control_variate=False, shared_sample=False, rng=None,
+                                     sampler='pseudo', replicates=QMC_REPLICATES, dtype=np.float64,
+                                     correlation=None):
+    """
+    Estimates each insurer's mean profit with optional variance reduction.
+    
+    - Antithetic variates: paths come in (Z, -Z) pairs and each pair average is
+      one independent sample; GBM is monotone in Z, so pairs are negatively
+      correlated and the pair average has a much smaller variance.
+    - Control variate: the simulated premiums, whose mean S0 × e^(μT) is known
+      exactly, are used as control: mean(Y) - β (mean(P) - E[P]), β fitted by
+      least squares.
+    - Quasi-Monte Carlo: scrambled low-discrepancy shocks (see
+      standard_normal_shocks). Their error shrinks close to O(1/N) for these
+      smooth payoffs, but the points are not independent, so the N paths are
+      split into independently scrambled replicates and the standard error comes
+      from the spread of the replicate means.
+    
+    Args:
+        S0s: Array of initial premium amounts, one per insurer
+        mu, sigma, T, N: GBM parameters (drift, volatility, time horizon, simulations)
+        retentions: Array of retention rates, one per insurer
+        antithetic: Use antithetic variates
+        control_variate: Use the premiums as control variate
+        shared_sample: True if all insurers share one premium/claim draw
+        rng: Seed or np.random.Generator (see make_rng)
+        sampler: 'pseudo', 'sobol' or 'halton' shocks
+        replicates: Number of scrambled replicates of N // replicates paths, rounded
+                    down to a power of 2 for 'sobol' (Sobol' points are only
+                    balanced in blocks of 2^k); quasi-Monte Carlo samplers only
+        dtype: np.float64 (default) or np.float32 paths; estimates are accumulated in float64
+        correlation: Optional correlation matrix of the claim shocks (see correlate_shocks)
+    
+    Returns:
+        Dict with arrays (one value per insurer):
+            means: Estimated mean profits
+            std_errors: Standard errors of the estimates
+            variance_reduction_factors: Plain Monte Carlo variance of the mean at
+                the same N divided by the achieved variance (1 = no gain)
+        and N, the number of paths actually simulated (at most the requested N)
+    """
+    if sampler == 'pseudo':
+        means, std_errors, plain_variance, n_used = _estimate_mean_profits(
+            S0s, mu, sigma, T, N, retentions, antithetic, control_variate, shared_sample, rng, sampler, dtype,
+            correlation
+        )
+    else:
+        size = int(N) // replicates
+        if replicates < 2 or size < 1:
+            raise ValueError("Quasi-Monte Carlo needs at least 2 replicates of at least one path")
+        if sampler == 'sobol':
+            size = 1 << (size.bit_length() - 1)
+        N = size * replicates
+        rng = make_rng(rng)
+        runs = [
+            _estimate_mean_profits(S0s, mu, sigma, T, size, retentions, antithetic,
+                                   control_variate, shared_sample, rng, sampler, dtype, correlation)
+            for _ in range(replicates)
+        ]
+        replicate_means = np.array([run[0] for run in runs])
+        means = np.mean(replicate_means, axis=0)
+        std_errors = np.std(replicate_means, axis=0, ddof=1) / np.sqrt(replicates)
+        plain_variance = np.mean([run[2] for run in runs], axis=0)
+        n_used = sum(run[3] for run in runs)
+    
+    # Zero-variance estimates (e.g. zero retention) give inf or NaN factors
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factors = (plain_variance / n_used) / std_errors**2
+    return {'means': means, 'std_errors': std_errors, 'variance_reduction_factors': factors, 'N': N}
+
+
+def _estimate_mean_profits(S0s, mu, sigma, T, N, retentions, antithetic, control_variate,
+                           shared_sample, rng, sampler, dtype, correlation):
+    """
+    One sample of estimate_mean_profits_n_insurers.
+    
+    Returns:
+        means, std_errors: Arrays (n_insurers,) of the estimates and their i.i.d. standard errors
+        plain_variance: Array (n_insurers,) of the per-path profit variance
+        n_used: Number of paths the estimate is built on
+    """
+    scenario = scenario_n_insurers(S0s, mu, sigma, T, N, shared_sample, rng, antithetic, sampler, dtype,
+                                   correlation)
+    profits = scenario.profit_matrix(retentions)
+    premiums = np.broadcast_to(scenario.premiums, profits.shape)
+    plain_variance = np.var(profits, axis=1, ddof=1, dtype=np.float64)
     
-    premiums_C = simulate_GBM(S0C, mu, sigma, T, N)
-    claims_C = simulate_GBM(S0C * 0.7, mu, sigma, T, N)
+    if antithetic:
+        # Independent units are the averages of the (Z, -Z) pairs: path j pairs with
+        # path j + ⌈N/2⌉ (for odd N the middle path has no partner and is dropped)
+        offset = (N + 1) // 2
+        pairs = N - offset
+        profits = 0.5 * (profits[:, :pairs] + profits[:, offset:offset + pairs])
+        premiums = 0.5 * (premiums[:, :pairs] + premiums[:, offset:offset + pairs])
+    n_used = profits.shape[1] * (2 if antithetic else 1)
     
-    # Calculate profits using retention rates
-    profit_A = calculate_profit(premiums_A, claims_A, retentions[0])
-    profit_B = calculate_profit(premiums_B, claims_B, retentions[1])
-    profit_C = calculate_profit(premiums_C, claims_C, retentions[2])
-    return profit_A, profit_B, profit_C
\ No newline at end of file
+    if control_variate:
+        mean_premium, _ = gbm_moments(np.asarray(S0s, dtype=float), mu, sigma, T)
+        means, std_errors = control_variate_mean(profits, premiums, mean_premium)
+    else:
+        means = np.mean(profits, axis=1, dtype=np.float64)
+        std_errors = np.std(profits, axis=1, ddof=1, dtype=np.float64) / np.sqrt(profits.shape[1])
+    return means, std_errors, plain_variance, n_used
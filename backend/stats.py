@@ -0,0 +1,301 @@
+import numpy as np
+
+
+class RunningMoments:
+    """
+    Running mean, variance and extremes of several series, updated chunk by chunk.
+    
+    Welford-style accumulators: each chunk is reduced to its own count, mean and
+    sum of squared deviations (M2), then merged into the running totals with the
+    pairwise update of Chan et al. Memory is O(n_series) whatever the number of
+    samples, and two accumulators built on disjoint chunks (e.g. by different
+    workers) can be merged exactly.
+    
+    Attributes:
+        count: Number of samples seen per series
+        mean: Array (n_series,) of running means
+        m2: Array (n_series,) of running sums of squared deviations
+        min, max: Arrays (n_series,) of running extremes
+    """
+    
+    def __init__(self, n_series):
+        self.count = 0
+        self.mean = np.zeros(n_series)
+        self.m2 = np.zeros(n_series)
+        self.min = np.full(n_series, np.inf)
+        self.max = np.full(n_series, -np.inf)
+    
+    def update(self, batch):
+        """
+        Adds a chunk of samples.
+        
+        Args:
+            batch: Array (n_series, k) with k new samples of every series
+        """
+        batch = np.asarray(batch)
+        if batch.shape[1] == 0:
+            return
+        chunk = RunningMoments(len(self.mean))
+        chunk.count = batch.shape[1]
+        chunk.mean = np.mean(batch, axis=1, dtype=np.float64)
+        chunk.m2 = np.sum((batch - chunk.mean[:, None])**2, axis=1, dtype=np.float64)
+        chunk.min = np.min(batch, axis=1)
+        chunk.max = np.max(batch, axis=1)
+        self.merge(chunk)
+    
+    def merge(self, other):
+        """
+        Merges the accumulator of a disjoint set of samples into this one.
+        
+        Args:
+            other: RunningMoments over the same series
+        """
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / total)
+        self.m2 = self.m2 + other.m2 + delta**2 * (self.count * other.count / total)
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.count = total
+    
+    @property
+    def variance(self):
+        """Population variance of each series (same as np.var)."""
+        return self.m2 / self.count
+    
+    @property
+    def std(self):
+        """Population standard deviation of each series (same as np.std)."""
+        return np.sqrt(self.variance)
+    
+    @property
+    def std_error(self):
+        """Standard error of each running mean (sample variance, ddof=1)."""
+        if self.count < 2:
+            return np.full(len(self.mean), np.inf)
+        return np.sqrt(self.m2 / (self.count - 1) / self.count)
+    
+    def summary(self):
+        """
+        JSON-friendly statistics of every series.
+        
+        Returns:
+            Dict of lists: count, mean, std, std_error, min, max
+        """
+        return {
+            'count': int(self.count),
+            'mean': self.mean.tolist(),
+            'std': self.std.tolist(),
+            'std_error': self.std_error.tolist(),
+            'min': self.min.tolist(),
+            'max': self.max.tolist(),
+        }
+
+
+def control_variate_mean(samples, controls, control_means):
+    """
+    Control-variate estimate of the mean of each series.
+    
+    For every series, Y is regressed on a control X whose mean is known exactly,
+    and the estimate is mean(Y) - β (mean(X) - E[X]) with the least-squares β.
+    The residual variance gives the standard error.
+    
+    Args:
+        samples: Array (n_series, k) of samples Y
+        controls: Array (n_series, k) of control samples X
+        control_means: Array (n_series,) of exact E[X]
+    
+    Returns:
+        means: Array (n_series,) of control-variate estimates
+        std_errors: Array (n_series,) of their standard errors
+    """
+    samples = np.asarray(samples, dtype=float)
+    controls = np.asarray(controls, dtype=float)
+    k = samples.shape[1]
+    
+    centered_x = controls - np.mean(controls, axis=1, keepdims=True)
+    centered_y = samples - np.mean(samples, axis=1, keepdims=True)
+    beta = np.sum(centered_x * centered_y, axis=1) / np.sum(centered_x**2, axis=1)
+    
+    adjusted = samples - beta[:, None] * (controls - np.asarray(control_means)[:, None])
+    means = np.mean(adjusted, axis=1)
+    # One degree of freedom for the mean, one for β
+    std_errors = np.std(adjusted, axis=1, ddof=2) / np.sqrt(k)
+    return means, std_errors
+
+
+class QuantileSketch:
+    """
+    Mergeable t-digest of several series, updated chunk by chunk.
+    
+    Each series is summarized by weighted centroids (mean, count). On every
+    update the new samples and the current centroids are sorted together and
+    merged so that each centroid spans at most one unit of the scale function
+    k(q) = δ/(2π) × arcsin(2q - 1). That scale is steep near q = 0 and q = 1,
+    so tail centroids stay small: a centroid at quantile q covers a rank
+    fraction of about 2π√(q(1 - q))/δ, i.e. relative accuracy in the tails
+    where VaR and TVaR are read. About δ/2 centroids are kept per series
+    whatever the number of samples, and digests built on disjoint chunks
+    (e.g. by different workers) merge by pooling their centroids.
+    
+    Centroids keep exact sums, so tail means (TVaR) are exact up to the one
+    centroid straddling the tail boundary.
+    
+    Attributes:
+        count: Number of samples seen per series
+        compression: Scale parameter δ (accuracy vs. number of centroids)
+        means, weights: Lists (one per series) of centroid means and counts
+        min, max: Arrays (n_series,) of exact extremes
+    """
+    
+    def __init__(self, n_series, compression=1000):
+        self.count = 0
+        self.compression = compression
+        self.means = [np.empty(0) for _ in range(n_series)]
+        self.weights = [np.empty(0) for _ in range(n_series)]
+        self.min = np.full(n_series, np.inf)
+        self.max = np.full(n_series, -np.inf)
+    
+    def update(self, batch):
+        """
+        Adds a chunk of samples.
+        
+        Args:
+            batch: Array (n_series, m) with m new samples of every series
+        """
+        batch = np.asarray(batch, dtype=np.float64)
+        if batch.shape[1] == 0:
+            return
+        for i, samples in enumerate(batch):
+            self.means[i], self.weights[i] = self._compress(
+                np.concatenate([self.means[i], samples]),
+                np.concatenate([self.weights[i], np.ones(len(samples))])
+            )
+        self.count += batch.shape[1]
+        self.min = np.minimum(self.min, batch.min(axis=1))
+        self.max = np.maximum(self.max, batch.max(axis=1))
+    
+    def merge(self, other):
+        """
+        Merges the digest of a disjoint set of samples into this one.
+        
+        Args:
+            other: QuantileSketch over the same series
+        """
+        if other.count == 0:
+            return
+        for i in range(len(self.means)):
+            self.means[i], self.weights[i] = self._compress(
+                np.concatenate([self.means[i], other.means[i]]),
+                np.concatenate([self.weights[i], other.weights[i]])
+            )
+        self.count += other.count
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+    
+    def _scale(self, q):
+        """Scale function k(q) = δ/(2π) × arcsin(2q - 1)."""
+        return self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))
+    
+    def _compress(self, means, weights):
+        """
+        Merges sorted centroids that share a unit interval of the scale function.
+        
+        Returns:
+            (means, weights) of the merged centroids, sorted by mean
+        """
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        left = (np.cumsum(weights) - weights) / np.sum(weights)
+        # Centroids whose left edge falls in the same unit of k(q) are merged
+        cluster = np.floor(self._scale(left) - self._scale(0.0)).astype(np.int64)
+        cluster = np.cumsum(np.r_[0, np.diff(cluster) != 0])
+        merged_weights = np.bincount(cluster, weights=weights)
+        merged_means = np.bincount(cluster, weights=means * weights) / merged_weights
+        return merged_means, merged_weights
+    
+    def quantile(self, q):
+        """
+        Approximate q-quantile of each series.
+        
+        Centroid means are placed at the middle of their rank span and
+        interpolated linearly, with the exact extremes at ranks 0 and count.
+        
+        Args:
+            q: Probability in [0, 1]
+        
+        Returns:
+            Array (n_series,) of quantiles (NaN before any update)
+        """
+        quantiles = np.full(len(self.means), np.nan)
+        for i, (means, weights) in enumerate(zip(self.means, self.weights)):
+            if len(means) == 0:
+                continue
+            centers = np.cumsum(weights) - weights / 2
+            ranks = np.r_[0.0, centers, self.count]
+            values = np.r_[self.min[i], means, self.max[i]]
+            quantiles[i] = np.interp(q * self.count, ranks, values)
+        return quantiles
+    
+    def lower_tail_mean(self, q):
+        """
+        Approximate mean of the lowest q fraction of each series.
+        
+        Args:
+            q: Tail probability in (0, 1]
+        
+        Returns:
+            Array (n_series,) of tail means (NaN before any update)
+        """
+        tail_means = np.full(len(self.means), np.nan)
+        budget = q * self.count
+        for i, (means, weights) in enumerate(zip(self.means, self.weights)):
+            if len(means) == 0:
+                continue
+            # Each centroid contributes the part of its count that falls inside the tail
+            inside = np.clip(budget - (np.cumsum(weights) - weights), 0, weights)
+            tail_means[i] = np.sum(means * inside) / budget
+        return tail_means
+    
+    def rank_error(self, q):
+        """
+        Rank uncertainty of the q-quantile, as a fraction of the sample count.
+        
+        Half the rank span of the centroid holding rank q × count: the digest
+        cannot tell samples apart within one centroid.
+        
+        Args:
+            q: Probability in [0, 1]
+        
+        Returns:
+            Array (n_series,) of rank errors (NaN before any update)
+        """
+        errors = np.full(len(self.means), np.nan)
+        for i, weights in enumerate(self.weights):
+            if len(weights) == 0:
+                continue
+            index = min(int(np.searchsorted(np.cumsum(weights), q * self.count)), len(weights) - 1)
+            errors[i] = weights[index] / 2 / self.count
+        return errors
+    
+    def summary(self, level=0.995):
+        """
+        JSON-friendly tail risk of every series, read as profits (loss = -profit).
+        
+        Args:
+            level: Confidence level of the VaR and TVaR
+        
+        Returns:
+            Dict of lists: var and tvar (positive = loss), quantile (the
+            (1 - level) profit quantile) and its rank_error
+        """
+        tail = 1 - level
+        quantile = self.quantile(tail)
+        return {
+            'var': (-quantile).tolist(),
+            'tvar': (-self.lower_tail_mean(tail)).tolist(),
+            'quantile': quantile.tolist(),
+            'rank_error': self.rank_error(tail).tolist(),
+        }
@@ -0,0 +1,687 @@
+#!/usr/bin/env python
+"""
+Test script for the vectorized Nash payoff engine.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.simulation import (
+    scenario_3_insurers,
+    scenario_3_insurers_different_premiums,
+    expected_profits_3_insurers_different_premiums,
+    simulation_3_insurers_different_premiums,
+    simulation_n_insurers,
+    scenario_n_insurers,
+    simulate_GBM,
+    make_rng,
+    AnalyticScenario,
+    SimulationScenario,
+)
+from backend.nash import (
+    retention_grid,
+    payoff_tensor,
+    scenario_payoff_tensor,
+    best_welfare_retentions,
+    nash_equilibrium_3_insurers,
+    nash_equilibrium_3_insurers_different_premiums,
+    feasible_retentions,
+    nash_equilibrium_n_insurers,
+    best_response_equilibrium,
+    verify_equilibrium,
+    parallel_nash_equilibrium_n_insurers,
+    make_scenario,
+    branch_and_bound_equilibrium,
+    continuous_best_response_equilibrium,
+    feasible_mask,
+    subgame_payoff_matrices,
+    mixed_equilibria,
+    replicator_dynamics,
+    player_payoff_rows,
+    TableScenario,
+    NashSession,
+    player_payoff_table,
+    RiskAdjustedScenario,
+    UTILITIES,
+    RISK_AVERSION,
+    MIN_RETENTION,
+    is_symmetric_game,
+    TensorScenario,
+)
+from backend.cache import PayoffCache, cache_key
+import backend.app as server
+
+# Simulation parameters
+mu = 0.05
+sigma = 0.2
+T = 1
+N = 1000
+retention_options = [round(i * 0.1, 1) for i in range(11)]
+
+print("=" * 80)
+print("NASH ENGINE TEST")
+print("=" * 80)
+
+# Test 1: Feasibility mask matches the scalar constraints
+print("\n[TEST 1] Feasibility Mask")
+print("-" * 80)
+_, feasible = retention_grid(retention_options)
+expected = np.zeros_like(feasible)
+for a, ret_A in enumerate(retention_options):
+    for b, ret_B in enumerate(retention_options):
+        for c, ret_C in enumerate(retention_options):
+            if ret_A + ret_B + ret_C > 1.0:
+                continue
+            if ret_A < 0.05 or ret_B < 0.05 or ret_C < 0.05:
+                continue
+            expected[a, b, c] = True
+print(f"  Feasible tuples: {int(feasible.sum())} / {feasible.size}")
+assert np.array_equal(feasible, expected), "Mask differs from scalar constraint loop"
+print("  ✓ Mask matches the scalar loop")
+
+# Test 2: Payoff tensor shape and infeasible cells
+print("\n[TEST 2] Payoff Tensor")
+print("-" * 80)
+feasible, payoffs = payoff_tensor([1500, 1200, 800], mu, sigma, T, N, retention_options, block_size=16, rng=42)
+print(f"  Tensor shape: {payoffs.shape}")
+assert payoffs.shape == (3, 11, 11, 11), "Unexpected tensor shape"
+assert np.all(np.isnan(payoffs[:, ~feasible])), "Infeasible cells should be NaN"
+assert np.all(np.isfinite(payoffs[:, feasible])), "Feasible cells should be finite"
+# Profit is proportional to retention: a 0.1 tuple earns about 0.3 × S0 × e^(μT) × 0.1
+expected_A = 0.1 * 0.3 * 1500 * np.exp(mu * T)
+print(f"  Player A at (0.1, 0.1, 0.1): {payoffs[0, 1, 1, 1]:.2f} (expected ≈ {expected_A:.2f})")
+assert abs(payoffs[0, 1, 1, 1] - expected_A) < 0.2 * expected_A, "Payoff far from expected profit"
+print("  ✓ Payoff tensor valid")
+
+# Test 3: Argmax picks the best feasible tuple
+print("\n[TEST 3] Welfare Argmax")
+print("-" * 80)
+best_retentions, profits = best_welfare_retentions(retention_options, feasible, payoffs)
+objective = sum(profits) + 0.1 * min(profits)
+print(f"  Best retentions: {best_retentions}, objective: {objective:.2f}")
+cells = np.argwhere(feasible)
+for cell in cells:
+    cell_profits = payoffs[(slice(None),) + tuple(cell)]
+    assert cell_profits.sum() + 0.1 * cell_profits.min() <= objective + 1e-9
+print("  ✓ No feasible tuple beats the returned one")
+
+# Test 4: Public solvers keep their return format
+print("\n[TEST 4] Nash Solvers")
+print("-" * 80)
+best_retentions, profits = nash_equilibrium_3_insurers(1000, mu, sigma, T, N, retention_options)
+print(f"  Identical premiums: {best_retentions}")
+assert len(best_retentions) == 3 and len(profits) == 3
+assert sum(best_retentions) <= 1.0 and min(best_retentions) >= 0.05
+best_retentions, profits = nash_equilibrium_3_insurers_different_premiums(
+    1500, 1200, 800, mu, sigma, T, N, retention_options
+)
+print(f"  Different premiums: {best_retentions}")
+assert sum(best_retentions) <= 1.0 and min(best_retentions) >= 0.05
+best_retentions, profits = nash_equilibrium_3_insurers_different_premiums(
+    1000, 1000, 1000, mu, sigma, T, N, [0.0, 0.5, 1.0]
+)
+print(f"  No feasible tuple: {best_retentions}")
+assert best_retentions == [0.33, 0.33, 0.34], "Fallback should be used"
+print("  ✓ Solvers return valid retentions")
+
+# Test 5: Common random numbers
+print("\n[TEST 5] Common Random Numbers")
+print("-" * 80)
+scenario = scenario_3_insurers_different_premiums(1500, 1200, 800, mu, sigma, T, N, rng=42)
+retentions = [0.2, 0.3, 0.4]
+profits = scenario.profits(retentions)
+means = scenario.mean_profits(retentions)
+print(f"  Mean profits on the shared sample: {np.round(means, 2)}")
+assert np.allclose([np.mean(p) for p in profits], means), "Mean profits differ from per-path profits"
+batch = scenario.mean_profits([[0.1, 0.1, 0.1], [0.2, 0.2, 0.2]])
+assert np.allclose(batch[1], 2 * batch[0]), "Profit should be linear in retention on one sample"
+shared = scenario_3_insurers(1000, mu, sigma, T, N)
+shared_profits = shared.profits([0.1, 0.2, 0.3])
+assert np.allclose(shared_profits[1], 2 * shared_profits[0]), "Shared sample should be reused by all insurers"
+first = nash_equilibrium_3_insurers_different_premiums(
+    1500, 1200, 800, mu, sigma, T, N, retention_options, scenario=scenario
+)
+second = nash_equilibrium_3_insurers_different_premiums(
+    1500, 1200, 800, mu, sigma, T, N, retention_options, scenario=scenario
+)
+feasible, payoffs = scenario_payoff_tensor(scenario, retention_options)
+assert np.allclose(payoffs[:, 1, 2, 3], scenario.mean_profits([0.1, 0.2, 0.3]))
+print(f"  Equilibrium on the shared sample: {first[0]}")
+assert first == second, "Same sample should give the same equilibrium"
+independent = nash_equilibrium_3_insurers_different_premiums(
+    1500, 1200, 800, mu, sigma, T, N, retention_options, method='independent'
+)
+assert sum(independent[0]) <= 1.0
+print("  ✓ One sample serves every retention tuple")
+
+# Test 6: Closed-form expected profits
+print("\n[TEST 6] Closed-Form Expected Profits")
+print("-" * 80)
+retentions = [0.2, 0.3, 0.4]
+means, variances = expected_profits_3_insurers_different_premiums(
+    1500, 1200, 800, mu, sigma, T, retentions, return_variance=True
+)
+expected = np.array(retentions) * 0.3 * np.array([1500, 1200, 800]) * np.exp(mu * T)
+print(f"  Exact means: {np.round(means, 2)}")
+assert np.allclose(means, expected), "Exact mean should be Retention × 0.3 × S0 × e^(μT)"
+profits = simulation_3_insurers_different_premiums(1500, 1200, 800, mu, sigma, T, 200000, retentions, rng=42)
+mc_means = np.array([np.mean(p) for p in profits])
+mc_vars = np.array([np.var(p) for p in profits])
+print(f"  Monte Carlo means (N=200000): {np.round(mc_means, 2)}")
+assert np.allclose(mc_means, means, rtol=0.02), "Monte Carlo mean far from exact mean"
+assert np.allclose(mc_vars, variances, rtol=0.05), "Monte Carlo variance far from exact variance"
+best_retentions, profits = nash_equilibrium_3_insurers_different_premiums(
+    1500, 1200, 800, mu, sigma, T, N, retention_options
+)
+print(f"  Analytic equilibrium: {best_retentions}")
+assert np.allclose(profits, np.array(best_retentions) * expected / np.array(retentions))
+print("  ✓ Analytic evaluator matches Monte Carlo")
+
+# Test 7: N-player API
+print("\n[TEST 7] N-Player API")
+print("-" * 80)
+profits = simulation_n_insurers([1000, 1200, 800, 1500, 900], mu, sigma, T, N, [0.1, 0.2, 0.2, 0.2, 0.3])
+print(f"  Profit matrix shape: {profits.shape}")
+assert profits.shape == (5, N), "Profit matrix should be (players × paths)"
+_, feasible = retention_grid(retention_options)
+tuples = list(feasible_retentions(retention_options, 3))
+assert len(tuples) == int(feasible.sum()), "Generator and mask disagree on feasible tuples"
+assert tuples == [tuple(retention_options[i] for i in cell) for cell in np.argwhere(feasible)]
+scenario = scenario_n_insurers([1500, 1200, 800], mu, sigma, T, N, rng=42)
+three = nash_equilibrium_3_insurers_different_premiums(
+    1500, 1200, 800, mu, sigma, T, N, retention_options, scenario=scenario
+)
+general = nash_equilibrium_n_insurers([1500, 1200, 800], mu, sigma, T, N, retention_options,
+                                      scenario=scenario, block_size=7)
+assert np.allclose(three[0], general[0]) and np.allclose(three[1], general[1]), "N-player solver differs"
+S0s = [1000, 1200, 800, 1500, 900, 1100]
+best_retentions, profits = nash_equilibrium_n_insurers(S0s, mu, sigma, T, N, retention_options)
+print(f"  6 insurers: {best_retentions}")
+assert len(best_retentions) == 6 and sum(best_retentions) <= 1.0 and min(best_retentions) >= 0.05
+print("  ✓ N-player solver matches the 3-insurer engine")
+
+# Test 8: Best-response dynamics
+print("\n[TEST 8] Best-Response Dynamics")
+print("-" * 80)
+best_retentions, profits, rounds, status = best_response_equilibrium(
+    [1500, 1200, 800], mu, sigma, T, N, retention_options
+)
+print(f"  Equilibrium: {best_retentions} after {rounds} rounds ({status})")
+assert status == 'converged', "Best response should converge on the analytic game"
+assert sum(best_retentions) <= 1.0 and min(best_retentions) >= 0.05
+# No player can gain by deviating alone to any feasible option
+for i in range(3):
+    for ret in retention_options:
+        deviation = list(best_retentions)
+        deviation[i] = ret
+        if sum(deviation) > 1.0 or ret < 0.05:
+            continue
+        deviation_profit = ret * 0.3 * [1500, 1200, 800][i] * np.exp(mu * T)
+        assert deviation_profit <= profits[i] + 1e-9, "Profitable unilateral deviation found"
+_, _, rounds, status = best_response_equilibrium(
+    [1000, 1000, 1000], mu, sigma, T, N, retention_options, initial_retentions=[0.3, 0.3, 0.3]
+)
+assert status == 'converged' and rounds <= 3
+# An infeasible start falls back to the default one instead of being returned as converged
+assert best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, retention_options,
+                                 initial_retentions=[0.5, 0.5, 0.5]) == \
+    best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, retention_options)
+_, _, _, status = best_response_equilibrium([1000, 1000, 1000], mu, sigma, T, N, [0.5, 1.0])
+assert status == 'infeasible', "No feasible profile should be reported"
+print("  ✓ Best response reaches a stable profile")
+
+# Test 9: Epsilon-Nash verification
+print("\n[TEST 9] Epsilon-Nash Verification")
+print("-" * 80)
+best_retentions, _, _, _ = best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, retention_options)
+report = verify_equilibrium(best_retentions, [1500, 1200, 800], mu, sigma, T, N, retention_options)
+print(f"  Best-response profile: {report}")
+assert report['is_nash'] and report['epsilon'] == 0.0
+report = verify_equilibrium([0.3, 0.3, 0.3], [1500, 1200, 800], mu, sigma, T, N, retention_options)
+print(f"  Equal split profile: epsilon={report['epsilon']:.2f}, player {report['deviating_player']} → {report['deviation']}")
+expected_gain = 0.1 * 0.3 * 1500 * np.exp(mu * T)
+assert not report['is_nash'] and report['deviating_player'] == 0 and report['deviation'] == 0.4
+assert np.isclose(report['epsilon'], expected_gain), "Epsilon should be the best unilateral gain"
+for profile in ([0.5, 0.5, 0.5], [0.0, 0.0, 0.0]):
+    report = verify_equilibrium(profile, [1500, 1200, 800], mu, sigma, T, N, retention_options)
+    assert report['feasible'] is False and not report['is_nash'], "An infeasible profile is never an equilibrium"
+print("  ✓ Deviation report matches the scalar check")
+
+# Test 10: Process-pool evaluation with spawned seed streams
+print("\n[TEST 10] Parallel Grid Evaluation")
+print("-" * 80)
+fine_options = [round(i * 0.05, 2) for i in range(21)]
+serial = parallel_nash_equilibrium_n_insurers(
+    [1500, 1200, 800], mu, sigma, T, 200, fine_options, seed=7, max_workers=1, shard_size=64
+)
+pooled = parallel_nash_equilibrium_n_insurers(
+    [1500, 1200, 800], mu, sigma, T, 200, fine_options, seed=7, max_workers=2, shard_size=64
+)
+print(f"  1 worker:  {serial[0]}")
+print(f"  2 workers: {pooled[0]}")
+assert serial == pooled, "Result should not depend on the number of workers"
+other_seed = parallel_nash_equilibrium_n_insurers(
+    [1500, 1200, 800], mu, sigma, T, 200, fine_options, seed=8, max_workers=1, shard_size=64
+)
+assert other_seed[1] != serial[1], "Different seeds should give different samples"
+print("  ✓ Sharded search is reproducible across worker counts")
+
+# Test 11: Reproducible seeded RNG
+print("\n[TEST 11] Seeded Random Number Generators")
+print("-" * 80)
+assert np.array_equal(simulate_GBM(1000, mu, sigma, T, N, rng=123), simulate_GBM(1000, mu, sigma, T, N, rng=123))
+assert not np.array_equal(simulate_GBM(1000, mu, sigma, T, N, rng=123), simulate_GBM(1000, mu, sigma, T, N, rng=124))
+generator = make_rng(5)
+assert make_rng(generator) is generator, "A Generator should be used as-is"
+assert type(generator.bit_generator).__name__ == 'PCG64'
+first = simulation_n_insurers([1000, 1200], mu, sigma, T, N, [0.3, 0.4], rng=99)
+second = simulation_n_insurers([1000, 1200], mu, sigma, T, N, [0.3, 0.4], rng=np.random.default_rng(99))
+assert np.array_equal(first, second), "Seed and Generator with the same seed should match"
+for method in ('crn', 'independent'):
+    first = nash_equilibrium_3_insurers_different_premiums(
+        1500, 1200, 800, mu, sigma, T, 200, retention_options, method=method, rng=11
+    )
+    second = nash_equilibrium_3_insurers_different_premiums(
+        1500, 1200, 800, mu, sigma, T, 200, retention_options, method=method, rng=11
+    )
+    print(f"  {method}: {first[0]}, profits bit-for-bit equal: {first == second}")
+    assert first == second, "Seeded Nash search should be reproducible"
+print("  ✓ Same seed, same results")
+
+# Test 12: Risk-aware objectives
+print("\n[TEST 12] Risk-Aware Utilities")
+print("-" * 80)
+S0s = [1500, 1200, 800]
+sample = scenario_n_insurers(S0s, mu, sigma, T, 20000, rng=12)
+profiles = np.array(list(feasible_retentions(retention_options, 3)))
+for utility in UTILITIES:
+    adjusted = RiskAdjustedScenario(sample, utility, risk_aversion=0.02, level=0.9)
+    looked_up = adjusted.mean_profits(profiles)
+    # Brute force: the utility of every player's full profit sample, cell by cell
+    for profile, row in zip(profiles[::17], looked_up[::17]):
+        for profits, value in zip(sample.profit_matrix(profile), row):
+            profits = profits.astype(float)
+            if utility == 'mean':
+                direct = profits.mean()
+            elif utility == 'mean_variance':
+                direct = profits.mean() - 0.01 * profits.var()
+            elif utility == 'cvar':
+                direct = np.sort(profits)[:2000].mean()
+            else:
+                direct = -np.log(np.mean(np.exp(-0.02 * profits))) / 0.02
+            assert np.isclose(value, direct, rtol=1e-9, atol=1e-9), f"{utility}: table lookup differs from direct value"
+    best, _ = nash_equilibrium_n_insurers(S0s, mu, sigma, T, 0, retention_options, scenario=adjusted)
+    print(f"  {utility:>13}: welfare equilibrium {best}")
+assert np.allclose(RiskAdjustedScenario(sample, 'mean').mean_profits(profiles), sample.mean_profits(profiles))
+assert np.allclose(RiskAdjustedScenario(sample, 'exponential', risk_aversion=1e-8).mean_profits(profiles),
+                   sample.mean_profits(profiles)), "CARA with vanishing risk aversion should be risk-neutral"
+exact = RiskAdjustedScenario(AnalyticScenario(S0s, mu, sigma, T), 'mean_variance')
+assert np.allclose(exact.mean_profits(profiles), RiskAdjustedScenario(sample, 'mean_variance').mean_profits(profiles),
+                   atol=5.0), "Closed-form and sampled mean-variance utilities should agree"
+neutral, _ = nash_equilibrium_n_insurers(S0s, mu, sigma, T, 0, retention_options)
+averse, _ = nash_equilibrium_n_insurers(S0s, mu, sigma, T, 0, retention_options, utility='mean_variance')
+assert max(averse) < max(neutral), "Risk aversion should spread the retained risk"
+# No closed form for CVaR: an analytic request is evaluated on a common-random-number sample
+assert isinstance(make_scenario(S0s, mu, sigma, T, 1000, utility='cvar', rng=1).scenario, SimulationScenario)
+try:
+    make_scenario(S0s, mu, sigma, T, 1000, method='independent', utility='cvar')
+    raise AssertionError("Independent runs have no shared sample to evaluate utilities on")
+except ValueError:
+    pass
+# Utility parameters reach the scenario; an adjusted scenario is reused, never adjusted twice
+cautious, _ = nash_equilibrium_n_insurers(S0s, mu, sigma, T, 0, retention_options, utility='mean_variance',
+                                          risk_aversion=0.05)
+assert max(cautious) < max(averse), "A higher risk aversion should spread the risk further"
+adjusted = RiskAdjustedScenario(sample, 'cvar', level=0.9)
+assert nash_equilibrium_n_insurers(S0s, mu, sigma, T, 0, retention_options, scenario=adjusted, utility='cvar',
+                                   level=0.9) == nash_equilibrium_n_insurers(S0s, mu, sigma, T, 0, retention_options,
+                                                                             scenario=sample, utility='cvar', level=0.9)
+try:
+    best_response_equilibrium(S0s, mu, sigma, T, 0, retention_options, scenario=adjusted, utility='exponential')
+    raise AssertionError("A risk-adjusted scenario cannot be scored under another utility")
+except ValueError:
+    pass
+print("  ✓ Utilities tabulated once per (player, option) and looked up per tuple")
+
+# Test 13: Symmetric games are evaluated on sorted tuples only
+print("\n[TEST 13] Permutation-Symmetry Reduction")
+print("-" * 80)
+
+
+class CountingScenario:
+    """Analytic scenario that counts the retention vectors it evaluates."""
+    
+    def __init__(self, S0s):
+        self.scenario = AnalyticScenario(S0s, mu, sigma, T)
+        self.evaluated = 0
+    
+    def mean_profits(self, retentions):
+        self.evaluated += len(retentions)
+        return self.scenario.mean_profits(retentions)
+
+
+fine_options = [round(i * 0.05, 2) for i in range(21)]
+shared = scenario_3_insurers(1000, mu, sigma, T, N, rng=13)
+assert is_symmetric_game(None, shared) and is_symmetric_game([1000] * 4)
+assert not is_symmetric_game(None, scenario_3_insurers_different_premiums(1000, 1000, 1000, mu, sigma, T, N, rng=13))
+for scenario in (AnalyticScenario([1000] * 3, mu, sigma, T), shared, RiskAdjustedScenario(shared, 'cvar')):
+    full = scenario_payoff_tensor(scenario, fine_options, symmetric=False)
+    reduced = scenario_payoff_tensor(scenario, fine_options)
+    assert np.array_equal(full[1], reduced[1], equal_nan=True), "Expanded tensor should equal the full one"
+sorted_tuples = set(feasible_retentions(fine_options, 3, symmetric=True))
+assert all(tuple(sorted(t)) in sorted_tuples for t in feasible_retentions(fine_options, 3))
+for n_players in (3, 4, 5):
+    counts = []
+    for symmetric in (False, True):
+        scenario = CountingScenario([1000] * n_players)
+        result = nash_equilibrium_n_insurers([1000] * n_players, mu, sigma, T, N, fine_options,
+                                             scenario=scenario, symmetric=symmetric)
+        counts.append(scenario.evaluated)
+        if symmetric:
+            assert result == reference, "Symmetric search should return the full search's tuple"
+        reference = result
+    print(f"  {n_players} players: {counts[0]} → {counts[1]} evaluated tuples ({counts[0] / counts[1]:.1f}×), "
+          f"equilibrium {reference[0]}")
+    assert counts[1] * 4 < counts[0]
+print("  ✓ Sorted tuples evaluated once and expanded to every ordering")
+
+# Test 14: Payoff tensors are memoized by their parameters
+print("\n[TEST 14] Payoff-Tensor Cache")
+print("-" * 80)
+params = dict(S0s=[1500, 1200, 800], mu=mu, sigma=sigma, T=T, N=N, seed=7, retention_options=retention_options)
+key = cache_key(**params)
+assert key == cache_key(**dict(reversed(list(params.items())))), "Key should not depend on argument order"
+assert key == cache_key(**{**params, 'S0s': np.array([1500.0, 1200.0, 800.0])})
+assert key != cache_key(**{**params, 'seed': 8}) and key != cache_key(**{**params, 'N': N + 1})
+calls = []
+
+
+def build():
+    calls.append(1)
+    scenario = scenario_n_insurers([1500, 1200, 800], mu, sigma, T, N, rng=7)
+    feasible, payoffs = scenario_payoff_tensor(scenario, retention_options)
+    return {'feasible': feasible, 'payoffs': payoffs}
+
+
+with tempfile.TemporaryDirectory() as directory:
+    cache = PayoffCache(directory, max_entries=2)
+    first, status = cache.get_or_compute(key, build)
+    assert status == 'miss' and len(calls) == 1
+    again, status = cache.get_or_compute(key, build)
+    assert status == 'memory' and again['payoffs'] is first['payoffs'] and len(calls) == 1
+    assert not again['payoffs'].flags.writeable, "Shared tensors must be read-only"
+    cache.clear()
+    loaded, status = cache.get_or_compute(key, build)
+    assert status == 'disk' and len(calls) == 1
+    assert np.array_equal(loaded['payoffs'], first['payoffs'], equal_nan=True)
+    assert np.array_equal(loaded['feasible'], first['feasible'])
+    fresh = PayoffCache(directory)
+    assert fresh.get(key)[1] == 'disk', "Another process should find the tensor on disk"
+    for other in ('a', 'b', 'c'):
+        cache.put(cache_key(name=other), {'x': np.arange(3)})
+    assert cache.stats()['entries'] == 2, "LRU layer should stay bounded"
+    with open(os.path.join(directory, f"{cache_key(name='a')}.npz"), 'wb') as file:
+        file.write(b'not a zip file')
+    cache.clear()
+    assert cache.get(cache_key(name='a')) == (None, 'miss'), "Unreadable files count as misses"
+    stats = cache.stats()
+    print(f"  hits {stats['hits']}, disk hits {stats['disk_hits']}, misses {stats['misses']}")
+    assert (stats['hits'], stats['disk_hits'], stats['misses']) == (1, 1, 2)
+    bounded = PayoffCache(directory, max_files=2)
+    bounded.put(cache_key(name='d'), {'x': np.arange(3)})
+    # 'a' was rewritten last above, every other file is older
+    assert sorted(os.listdir(directory)) == sorted(f"{cache_key(name=name)}.npz" for name in 'ad'), \
+        "Disk layer should keep only the most recently used files"
+
+# The app keys its tensors by dtype: a float32 request must not serve a float64 one
+with tempfile.TemporaryDirectory() as directory:
+    server.payoff_cache = PayoffCache(directory)
+    client = server.app.test_client()
+    request = dict(scenario='nash', method='analytic', utility='mean_variance', S0A=1500, S0B=1200, S0C=800)
+    statuses = [client.post('/simulate', json={**request, 'dtype': dtype}).get_json()['cache']
+                for dtype in ('float32', 'float64', 'float64')]
+    assert statuses == ['miss', 'miss', 'memory'], statuses
+    dtypes = sorted(entry['payoffs'].dtype.name for entry in server.payoff_cache._entries.values())
+    assert dtypes == ['float32', 'float64'], dtypes
+    # Flags are JSON booleans: the string "false" is rejected instead of read as true
+    for flag in ('verify', 'antithetic', 'control_variate', 'tail_risk'):
+        assert client.post('/simulate', json={**request, flag: 'false'}).status_code == 400, flag
+    assert 'nash_report' not in client.post('/simulate', json={**request, 'verify': False}).get_json()
+    # Seeds are non-negative JSON integers: anything else is a client error, not a crash
+    for seed in (1.5, -1, True, '7'):
+        assert client.post('/simulate', json={**request, 'method': 'monte_carlo', 'seed': seed}).status_code == 400, seed
+    assert client.post('/simulate', json={**request, 'method': 'monte_carlo', 'seed': 0}).status_code == 200
+    # Coarse grids where 3 insurers cannot all retain an option are rejected, not solved
+    for extra in ({}, {'solver': 'best_response'}, {'session_id': 'coarse'}):
+        assert client.post('/simulate', json={**request, **extra, 'retention_step': 0.4}).status_code == 400, extra
+        assert client.post('/simulate', json={**request, **extra, 'retention_step': 0.3}).status_code == 200, extra
+    # 'exponential' grids cost an exp per path and option: 1001 options on 3 × 10^5 paths are refused
+    exponential = {**request, 'utility': 'exponential', 'retention_step': 0.001}
+    assert client.post('/simulate', json={**exponential, 'N': 3 * 10**5}).status_code == 400
+    assert client.post('/simulate', json={**exponential, 'N': 3 * 10**5, 'solver': 'continuous'}).status_code == 200
+    # The Nash branch of /simulate is made of helpers that can be run on their own
+    S0s = [1500, 1200, 800]
+    assert server.nash_retention_options(0.3) == [0.0, 0.3, 0.6, 0.9]
+    options = server.nash_retention_options(0.1)
+    tensors = server.nash_payoff_tensors(S0s, None, None, 'mean_variance', RISK_AVERSION, 0.95, options, np.float64)
+    objective = RiskAdjustedScenario(AnalyticScenario(S0s, mu, sigma, T), 'mean_variance')
+    assert np.array_equal(tensors['payoffs'], scenario_payoff_tensor(objective, options)[1], equal_nan=True)
+    payoffs, _ = server.session_payoff_rows([2], S0s, None, None, 'rows', 'mean_variance', RISK_AVERSION, 0.95,
+                                            options)
+    assert np.array_equal(payoffs, objective.utility_table(options)[[2]])
+    welfare = server.solve_nash('welfare', S0s, N, TensorScenario(options, tensors['payoffs']), options, tensors)
+    pruned = server.solve_nash('welfare', S0s, N, objective, options)
+    assert welfare[:2] == pruned[:2] and welfare[2] == {} and 'nodes' in pruned[2]
+lookup = TensorScenario(retention_options, first['payoffs'])
+sample = scenario_n_insurers([1500, 1200, 800], mu, sigma, T, N, rng=7)
+profiles = np.array(list(feasible_retentions(retention_options, 3)))
+assert np.array_equal(lookup.mean_profits(profiles), sample.mean_profits(profiles))
+assert best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, retention_options, scenario=lookup) == \
+    best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, retention_options, scenario=sample)
+try:
+    lookup.mean_profits([[0.25, 0.3, 0.3]])
+    raise AssertionError("Off-grid retentions are not in the tensor")
+except ValueError:
+    pass
+print("  ✓ Repeated requests served from memory or disk")
+
+# Test 15: Branch and bound finds the enumeration's optimum on fine grids
+print("\n[TEST 15] Branch-and-Bound Refinement")
+print("-" * 80)
+analytic = AnalyticScenario([1500, 1200, 800], mu, sigma, T)
+table = player_payoff_table(analytic, retention_options)
+assert np.allclose(table.T, [analytic.mean_profits([ret] * 3) for ret in retention_options])
+cases = [
+    ([1500, 1200, 800], dict()),
+    ([1000, 1000, 1000], dict()),
+    ([1500, 1200, 800], dict(utility='mean_variance')),
+    ([1500, 1200, 800], dict(method='crn', rng=5)),
+    ([1500, 1200, 800], dict(method='crn', rng=5, utility='cvar')),
+    ([1500, 1200, 800, 1000], dict()),
+]
+for step, digits in ((0.05, 2), (0.01, 2)):
+    fine_options = [round(i * step, digits) for i in range(int(round(1 / step)) + 1)]
+    for S0s, kwargs in cases:
+        if len(S0s) == 4 and step < 0.05:
+            continue
+        best, profits, nodes = branch_and_bound_equilibrium(S0s, mu, sigma, T, N, fine_options, **kwargs)
+        expected = nash_equilibrium_n_insurers(S0s, mu, sigma, T, N, fine_options, **kwargs)
+        tuples = sum(1 for _ in feasible_retentions(fine_options, len(S0s)))
+        print(f"  step {step}, {len(S0s)} players {kwargs}: {best}, {nodes} boxes for {tuples} tuples")
+        assert (best, profits) == expected, "Branch and bound should return the enumeration's optimum"
+        if step < 0.05 and S0s[0] != S0s[1]:
+            assert nodes < tuples / 20, "Pruning should skip most of the fine grid"
+# Unsorted grids break ties like the enumeration loop
+shuffled = list(np.random.default_rng(3).permutation(retention_options))
+assert branch_and_bound_equilibrium([1000] * 3, mu, sigma, T, N, shuffled)[:2] == \
+    nash_equilibrium_n_insurers([1000] * 3, mu, sigma, T, N, shuffled, symmetric=False)
+try:
+    branch_and_bound_equilibrium([1500, 1200, 800], mu, sigma, T, N, retention_options, method='independent')
+    raise AssertionError("Independent draws have no shared payoff table")
+except ValueError:
+    pass
+print("  ✓ Pruned search matches the full enumeration")
+
+# Test 16: Continuous best responses on a frozen sample
+print("\n[TEST 16] Continuous Best Responses")
+print("-" * 80)
+sample = scenario_n_insurers([1500, 1200, 800], mu, sigma, T, N, rng=9)
+probe = np.array([0.1, 0.45, 0.8])
+for name in UTILITIES:
+    risk = RiskAdjustedScenario(sample, name)
+    numeric = (risk.utility_table(probe + 1e-6) - risk.utility_table(probe - 1e-6)) / 2e-6
+    assert np.allclose(risk.utility_table(probe, gradient=True), numeric, rtol=1e-5, atol=1e-5), name
+    # One player's value and slope in one pass are the table entries
+    assert [risk.player_utility(i, r) for i in range(3) for r in probe] == \
+        list(zip(risk.utility_table(probe).ravel(), risk.utility_table(probe, gradient=True).ravel())), name
+fine_options = [round(i * 0.01, 2) for i in range(101)]
+for name in UTILITIES:
+    best, utilities, rounds, status, evaluations = continuous_best_response_equilibrium(
+        [1500, 1200, 800], mu, sigma, T, N, rng=9, utility=name
+    )
+    grid = best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, fine_options, method='crn', rng=9,
+                                     utility=name)
+    print(f"  {name}: {np.round(best, 4).tolist()} ({status}, {evaluations} evaluations), grid {grid[0]}")
+    assert status == 'converged' and evaluations < 50, "Best responses should take a few evaluations each"
+    assert feasible_mask(np.array([best]))[0], "Equilibrium must satisfy the constraints"
+    assert np.allclose(best, grid[0], atol=0.01), "Continuous optimum should lie within one grid step"
+# Interior optimum of mean-variance utility: r* = E[M] / (a Var[M]) for the first mover
+exact = AnalyticScenario([1500, 1200, 800], mu, sigma, T)
+best, _, _, _, _ = continuous_best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, method='analytic',
+                                                        utility='mean_variance')
+optimum = exact.mean_margins[0] / (RISK_AVERSION * exact.variance_margins[0])
+assert abs(best[0] - optimum) < 1e-4, f"{best[0]} vs {optimum}"
+assert continuous_best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, rng=9)[:2] == \
+    continuous_best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, rng=9)[:2]
+assert continuous_best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, method='analytic',
+                                            initial_retentions=[0.5, 0.5, 0.5]) == \
+    continuous_best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, method='analytic'), \
+    "An infeasible start falls back to the default one"
+try:
+    continuous_best_response_equilibrium([1500, 1200, 800], mu, sigma, T, N, method='independent')
+    raise AssertionError("Independent draws are noisy: no frozen sample to optimize on")
+except ValueError:
+    pass
+print("  ✓ L-BFGS-B best responses with exact gradients")
+
+# Test 17: Mixed equilibria of sub-games and replicator dynamics
+print("\n[TEST 17] Mixed Strategies")
+print("-" * 80)
+coarse = [0.05, 0.3, 0.5, 0.7, 0.9]
+rows, columns, A, B = subgame_payoff_matrices(analytic, coarse, retentions=[0.05, 0.05, 0.1])
+profiles = np.array([[r, c, 0.1] for r in rows for c in columns])
+valid = feasible_mask(profiles)
+expected = analytic.mean_profits(profiles)[:, :2]
+assert np.allclose(A.ravel()[valid], expected[valid, 0]) and np.allclose(B.ravel()[valid], expected[valid, 1])
+assert A.ravel()[~valid].max() < expected[valid, 0].min(), "Void profiles pay less than any feasible one"
+assert B.ravel()[~valid].max() < expected[valid, 1].min()
+assert 0.9 not in columns, "Options void against every opponent choice are dropped"
+rows, columns, A, B = subgame_payoff_matrices(analytic, coarse)
+for algorithm in ('lemke_howson', 'support_enumeration'):
+    equilibria = mixed_equilibria([1500, 1200, 800], mu, sigma, T, N, coarse, algorithm=algorithm)
+    mixed = [e for e in equilibria if max(len(s) for s in e['support']) > 1]
+    print(f"  {algorithm}: {len(equilibria)} equilibria ({len(mixed)} mixed)")
+    assert equilibria and all(np.isclose(sum(p), 1.0) for e in equilibria for p in e['strategies'])
+    for equilibrium in equilibria:
+        # No pure deviation of either player beats its expected payoff
+        row_strategy, column_strategy = (np.array(p) for p in equilibrium['strategies'])
+        usable = np.isin(coarse, rows)
+        values = A @ column_strategy[np.isin(coarse, columns)]
+        assert values.max() <= equilibrium['payoffs'][0] + 1e-6 * np.ptp(A)
+        assert np.isclose(row_strategy[usable] @ values, equilibrium['payoffs'][0])
+        supports = [[r, c, MIN_RETENTION] for r in equilibrium['support'][0] for c in equilibrium['support'][1]]
+        assert feasible_mask(np.array(supports)).all(), "Every reported equilibrium must be feasible"
+sample_equilibria = mixed_equilibria([1500, 1200, 800], mu, sigma, T, N, retention_options, method='crn', rng=2,
+                                     utility='mean_variance')
+assert sample_equilibria, "Sub-games on a shared sample should have equilibria"
+strategies, payoffs, epsilon, iterations, status = replicator_dynamics([1500, 1200, 800], mu, sigma, T, N,
+                                                                        retention_options)
+modal = [retention_options[int(np.argmax(p))] for p in strategies]
+print(f"  Replicator dynamics: {modal} after {iterations} iterations ({status}), epsilon {epsilon:.2e}")
+assert status == 'converged' and epsilon < 1e-3
+assert verify_equilibrium(modal, [1500, 1200, 800], mu, sigma, T, N, retention_options)['is_nash']
+assert np.allclose(payoffs, analytic.mean_profits(modal), atol=1e-3)
+
+# Under cvar every feasible payoff is negative: void profiles must not win
+cvar_sample = scenario_n_insurers([1500, 1200, 800], mu, sigma, T, N, rng=3)
+for algorithm in ('lemke_howson', 'support_enumeration'):
+    equilibria = mixed_equilibria([1500, 1200, 800], mu, sigma, T, N, coarse, scenario=cvar_sample,
+                                  utility='cvar', algorithm=algorithm)
+    assert equilibria, "Risk-aware sub-games should have equilibria"
+    for equilibrium in equilibria:
+        supports = [[r, c, MIN_RETENTION] for r in equilibrium['support'][0] for c in equilibrium['support'][1]]
+        assert feasible_mask(np.array(supports)).all(), "Every reported equilibrium must be feasible"
+strategies, payoffs, epsilon, iterations, status = replicator_dynamics([1500, 1200, 800], mu, sigma, T, N, coarse,
+                                                                        scenario=cvar_sample, utility='cvar')
+modal = [coarse[int(np.argmax(p))] for p in strategies]
+print(f"  Replicator dynamics (cvar): {modal} after {iterations} iterations ({status}), epsilon {epsilon:.2e}")
+assert status == 'converged' and feasible_mask(np.array([modal]))[0]
+strategies, payoffs, epsilon, iterations, status = replicator_dynamics([1500, 1200, 800, 600], mu, sigma, T, N,
+                                                                        coarse)
+assert len(strategies) == 4 and status == 'converged'
+print("  ✓ Mixed equilibria verified against every pure deviation")
+
+# Test 18: Warm-started sessions re-evaluate only the insurers that changed
+print("\n[TEST 18] Warm-Started Sessions")
+print("-" * 80)
+fine_options = [round(i * 0.01, 2) for i in range(101)]
+sample = scenario_n_insurers([1500, 1200, 800], mu, sigma, T, N, rng=6)
+payoffs, profits = player_payoff_rows(sample, [2, 0], fine_options, 'cvar')
+assert np.array_equal(payoffs, RiskAdjustedScenario(sample, 'cvar').utility_table(fine_options)[[2, 0]])
+assert np.array_equal(profits, player_payoff_table(sample, fine_options)[[2, 0]])
+table = TableScenario(fine_options, player_payoff_table(sample, fine_options))
+assert np.array_equal(table.mean_profits([[0.3, 0.2, 0.5]]), sample.mean_profits([[0.3, 0.2, 0.5]]))
+try:
+    table.mean_profits([[0.305, 0.2, 0.5]])
+    raise AssertionError("Off-grid retentions are not in the table")
+except ValueError:
+    pass
+
+computed = []
+
+
+def rows_for(S0s, utility):
+    def rows(players):
+        computed.extend(players)
+        return player_payoff_rows(AnalyticScenario(S0s, mu, sigma, T), players, fine_options, utility)
+    return rows
+
+
+for solver in ('welfare', 'best_response'):
+    session = NashSession(fine_options)
+    for S0s in ([1500, 1200, 800], [1500, 1250, 800], [1500, 1250, 800], [1400, 1250, 800]):
+        computed.clear()
+        changed = session.update([(i, S0) for i, S0 in enumerate(S0s)], rows_for(S0s, 'mean_variance'))
+        best, payoffs, details = session.solve(solver)
+        assert computed == changed, "Only the insurers whose key changed are re-evaluated"
+        if solver == 'welfare':
+            cold = branch_and_bound_equilibrium(S0s, mu, sigma, T, N, fine_options, utility='mean_variance')
+            assert (best, payoffs) == cold[:2], "The warm welfare optimum is the cold one"
+            assert details['nodes'] <= cold[2], "The last equilibrium can only prune more boxes"
+        else:
+            assert verify_equilibrium(best, S0s, mu, sigma, T, N, fine_options, utility='mean_variance')['is_nash']
+        print(f"  {solver}: premiums {S0s}, re-evaluated {changed} → {best} {details}")
+assert session.evaluations == 5, "3 rows at first, then one per changed premium"
+
+# Through /simulate: a seeded session rescales its draw and answers like cold requests
+client = server.app.test_client()
+for S0B, reevaluated in ((1200, [0, 1, 2]), (1250, [1]), (1250, [])):
+    request = dict(scenario='nash', method='monte_carlo', utility='cvar', N=20000, seed=11, retention_step=0.01,
+                   S0A=1500, S0B=S0B, S0C=800)
+    warm = client.post('/simulate', json={**request, 'session_id': 'test'}).get_json()
+    cold = client.post('/simulate', json=request).get_json()
+    assert warm['session']['reevaluated'] == reevaluated, warm['session']
+    assert warm['retentions'] == cold['retentions'] and warm['utilities'] == cold['utilities']
+    assert [warm[f'profit_{name}'] for name in 'ABC'] == [cold[f'profit_{name}'] for name in 'ABC']
+assert warm['session']['rows_computed'] == 4
+assert server.session_samples.stats()['misses'] == 1, "The session draws its sample once"
+print("  ✓ Unchanged insurers reused, searches warm-started")
+
+print("\n" + "=" * 80)
+print("ALL NASH ENGINE TESTS PASSED ✓")
+print("=" * 80)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+"""
+Test script for the streaming Monte Carlo simulators and their running statistics.
+"""
+
+import os
+import sys
+import threading
+import tracemalloc
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.stats import RunningMoments, QuantileSketch
+from backend.nash import nash_equilibrium_3_insurers_different_premiums
+from backend.simulation import (
+    make_rng,
+    streaming_simulation_n_insurers,
+    adaptive_simulation_n_insurers,
+    estimate_mean_profits_n_insurers,
+    simulate_GBM,
+    standard_normal_shocks,
+    scratch_buffer,
+    calculate_profit,
+    simulation_n_insurers,
+    scenario_n_insurers,
+    correlation_factor,
+    compound_poisson_claims,
+    compound_poisson_moments,
+    scenario_compound_poisson_n_insurers,
+    surplus_simulation_n_insurers,
+    parallel_streaming_simulation_n_insurers,
+    expected_profits_3_insurers_different_premiums,
+)
+
+# Simulation parameters
+mu = 0.05
+sigma = 0.2
+T = 1
+S0s = [1500, 1200, 800]
+retentions = [0.2, 0.3, 0.4]
+
+print("=" * 80)
+print("STREAMING SIMULATION TEST")
+print("=" * 80)
+
+# Test 1: Running moments match NumPy on the full array
+print("\n[TEST 1] Welford Accumulators")
+print("-" * 80)
+data = make_rng(0).normal(5.0, 3.0, size=(3, 10007))
+moments = RunningMoments(3)
+for start in range(0, data.shape[1], 1000):
+    moments.update(data[:, start:start + 1000])
+print(f"  Running mean: {np.round(moments.mean, 4)}")
+print(f"  NumPy mean:   {np.round(data.mean(axis=1), 4)}")
+assert moments.count == data.shape[1]
+assert np.allclose(moments.mean, data.mean(axis=1))
+assert np.allclose(moments.variance, data.var(axis=1))
+assert np.allclose(moments.std_error, data.std(axis=1, ddof=1) / np.sqrt(data.shape[1]))
+assert np.array_equal(moments.min, data.min(axis=1)) and np.array_equal(moments.max, data.max(axis=1))
+print("  ✓ Chunked moments equal the one-shot NumPy statistics")
+
+# Test 2: Accumulators from disjoint chunks merge exactly
+print("\n[TEST 2] Merging Accumulators")
+print("-" * 80)
+left, right = RunningMoments(3), RunningMoments(3)
+left.update(data[:, :4000])
+right.update(data[:, 4000:])
+left.merge(right)
+assert left.count == data.shape[1]
+assert np.allclose(left.mean, data.mean(axis=1)) and np.allclose(left.variance, data.var(axis=1))
+print("  ✓ Merged accumulator equals the full-sample statistics")
+
+# Test 3: Streaming simulation converges to the exact mean
+print("\n[TEST 3] Streaming Simulation")
+print("-" * 80)
+N = 500000
+moments = streaming_simulation_n_insurers(S0s, mu, sigma, T, N, retentions, chunk_size=65536, rng=3)
+means, variances = expected_profits_3_insurers_different_premiums(
+    *S0s, mu, sigma, T, retentions, return_variance=True
+)
+print(f"  Paths: {moments.count}")
+print(f"  Streaming means: {np.round(moments.mean, 2)} ± {np.round(moments.std_error, 2)}")
+print(f"  Exact means:     {np.round(means, 2)}")
+assert moments.count == N
+assert np.all(np.abs(moments.mean - means) < 5 * moments.std_error), "Mean outside 5 standard errors"
+assert np.allclose(moments.variance, variances, rtol=0.05), "Variance far from exact variance"
+repeat = streaming_simulation_n_insurers(S0s, mu, sigma, T, N, retentions, chunk_size=65536, rng=3)
+assert np.array_equal(repeat.mean, moments.mean), "Seeded streaming run should be reproducible"
+print("  ✓ Streaming run matches the closed-form moments")
+
+# Test 4: Adaptive sample size reaches the requested precision
+print("\n[TEST 4] Adaptive Sample Size")
+print("-" * 80)
+counts = []
+for vol in (0.05, 0.4):
+    moments, converged = adaptive_simulation_n_insurers(S0s, mu, vol, T, retentions, target_se=0.5, rng=4)
+    print(f"  σ={vol}: N={moments.count}, SE={np.round(moments.std_error, 3)}, converged={converged}")
+    assert converged and np.all(moments.std_error <= 0.5), "Target standard error not reached"
+    counts.append(moments.count)
+assert counts[0] < counts[1], "Higher volatility should need more paths"
+moments, converged = adaptive_simulation_n_insurers(S0s, mu, sigma, T, retentions, target_rel=0.002, rng=4)
+assert converged and np.all(moments.std_error <= 0.002 * np.abs(moments.mean))
+# A zero retention has no error to reduce: it must not push N to max_N
+moments, converged = adaptive_simulation_n_insurers(S0s, mu, sigma, T, [0.0, 0.3, 0.4], target_rel=0.002, rng=4)
+print(f"  Zero retention: N={moments.count}, converged={converged}")
+assert converged and moments.count < 10**6, "Insurers without risk should not drive the sample size"
+moments, converged = adaptive_simulation_n_insurers(S0s, mu, sigma, T, retentions, target_se=1e-6, max_N=30000, rng=4)
+print(f"  Unreachable target: N={moments.count}, converged={converged}")
+assert not converged and moments.count == 30000, "Should stop at max_N"
+print("  ✓ N grows only until the target precision")
+
+# Test 5: Antithetic and control variates
+print("\n[TEST 5] Variance Reduction")
+print("-" * 80)
+shocks = simulate_GBM(1.0, 0.0, 1.0, 1, 7, rng=5, antithetic=True)
+assert np.allclose(np.log(shocks[:3]) + 0.5, -(np.log(shocks[4:]) + 0.5)), "Paths j and j + 4 should be antithetic"
+means = expected_profits_3_insurers_different_premiums(*S0s, mu, sigma, T, retentions)
+factors = {}
+for antithetic in (False, True):
+    for control_variate in (False, True):
+        estimate = estimate_mean_profits_n_insurers(
+            S0s, mu, sigma, T, 20001, retentions,
+            antithetic=antithetic, control_variate=control_variate, rng=6
+        )
+        label = f"antithetic={antithetic}, control_variate={control_variate}"
+        print(f"  {label}: SE={np.round(estimate['std_errors'], 3)}, "
+              f"factor={np.round(estimate['variance_reduction_factors'], 1)}")
+        assert np.all(np.abs(estimate['means'] - means) < 5 * estimate['std_errors']), "Biased estimate"
+        factors[(antithetic, control_variate)] = estimate['variance_reduction_factors']
+assert np.allclose(factors[(False, False)], 1.0), "Plain Monte Carlo has no variance reduction"
+assert np.all(factors[(False, True)] > 2), "Premium control should cut the variance several-fold"
+assert np.all(factors[(True, False)] > 5), "Antithetic pairs should cut the variance several-fold"
+assert np.all(factors[(True, True)] > factors[(True, False)]), "Combining both should help further"
+print("  ✓ Variance reduction is unbiased and reported")
+
+# Test 6: Scrambled Sobol' and Halton shocks
+print("\n[TEST 6] Quasi-Monte Carlo Sampling")
+print("-" * 80)
+shocks = standard_normal_shocks((2, 3, 1024), rng=7, sampler='sobol')
+assert shocks.shape == (2, 3, 1024) and np.all(np.isfinite(shocks))
+assert np.allclose(shocks.mean(axis=-1), 0, atol=0.01), "Sobol' shocks should be balanced"
+assert np.array_equal(shocks, standard_normal_shocks((2, 3, 1024), rng=7, sampler='sobol'))
+errors = {}
+for sampler in ('pseudo', 'sobol', 'halton'):
+    for N in (2**12, 2**16):
+        estimate = estimate_mean_profits_n_insurers(S0s, mu, sigma, T, N, retentions, sampler=sampler, rng=8)
+        print(f"  {sampler:>6}, N={N}: SE={np.round(estimate['std_errors'], 3)}")
+        assert np.all(np.abs(estimate['means'] - means) < 5 * estimate['std_errors'] + 1e-3), "Biased estimate"
+        errors[(sampler, N)] = estimate['std_errors']
+assert np.all(errors[('sobol', 2**16)] < errors[('pseudo', 2**16)] / 50), "Sobol' should beat plain Monte Carlo"
+assert np.all(errors[('halton', 2**16)] < errors[('pseudo', 2**16)] / 5), "Halton should beat plain Monte Carlo"
+# 16× more paths: about 4× smaller error for plain Monte Carlo, well over 4× for Sobol'
+assert np.all(errors[('sobol', 2**12)] / errors[('sobol', 2**16)] > 8), "Sobol' should converge faster than N^-1/2"
+# Sobol' replicates are cut to a power of 2 paths (balanced points), and the N used is reported
+with warnings.catch_warnings():
+    warnings.simplefilter('error')
+    estimate = estimate_mean_profits_n_insurers(S0s, mu, sigma, T, 10000, retentions, sampler='sobol', rng=8)
+assert estimate['N'] == 16 * 512, estimate['N']
+assert estimate_mean_profits_n_insurers(S0s, mu, sigma, T, 10000, retentions, sampler='halton', rng=8)['N'] == 10000
+print("  ✓ Low-discrepancy shocks converge faster than N^-1/2")
+
+# Test 7: In-place profit kernel and per-thread scratch buffers
+print("\n[TEST 7] In-Place Profit Kernel")
+print("-" * 80)
+N = 2**16
+expected = scenario_n_insurers(S0s, mu, sigma, T, N, rng=9).profit_matrix(retentions)
+out = np.empty((3, N))
+profits = simulation_n_insurers(S0s, mu, sigma, T, N, retentions, rng=9, out=out)
+assert profits is out and np.array_equal(out, expected), "Kernel should match the scenario profits exactly"
+shared = scenario_n_insurers([1000] * 3, mu, sigma, T, N, shared_sample=True, rng=9).profit_matrix(retentions)
+assert np.array_equal(simulation_n_insurers([1000] * 3, mu, sigma, T, N, retentions, True, rng=9), shared)
+premiums, claims = make_rng(10).lognormal(size=(2, 3, N))
+assert np.array_equal(calculate_profit(premiums, claims, 0.3, out=np.empty((3, N))),
+                      calculate_profit(premiums, claims, 0.3))
+assert np.shares_memory(scratch_buffer('claims', (3, 10)), scratch_buffer('claims', (2, 5))), "Buffer not reused"
+other = []
+worker = threading.Thread(target=lambda: other.append(scratch_buffer('claims', (3, 10))))
+worker.start()
+worker.join()
+assert not np.shares_memory(other[0], scratch_buffer('claims', (3, 10))), "Threads must not share scratch"
+peaks = {}
+for label, simulate in (
+    ("scenario", lambda: scenario_n_insurers(S0s, mu, sigma, T, N, rng=9).profit_matrix(retentions)),
+    ("kernel", lambda: simulation_n_insurers(S0s, mu, sigma, T, N, retentions, rng=9, out=out)),
+):
+    tracemalloc.start()
+    simulate()
+    peaks[label] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label}: peak {peaks[label] / out.nbytes:.1f}× the profit matrix")
+assert peaks["kernel"] < peaks["scenario"] / 4, "Kernel should need several times less memory"
+print("  ✓ Profits written in place with reused per-thread buffers")
+
+# Test 8: float32 storage with float64 accumulation
+print("\n[TEST 8] Single-Precision Mode")
+print("-" * 80)
+assert simulate_GBM(1000.0, mu, sigma, T, 10, rng=11, dtype=np.float32).dtype == np.float32
+assert simulation_n_insurers(S0s, mu, sigma, T, 10, retentions, rng=11, dtype=np.float32).dtype == np.float32
+scenario = scenario_n_insurers(S0s, mu, sigma, T, 2**18, rng=11, dtype=np.float32)
+assert scenario.premiums.dtype == np.float32 and scenario.profit_matrix(retentions).dtype == np.float32
+assert scenario.mean_margins.dtype == np.float64, "Means must be accumulated in float64"
+moments = streaming_simulation_n_insurers(S0s, mu, sigma, T, 500000, retentions, chunk_size=65536,
+                                          rng=12, dtype=np.float32)
+print(f"  float32 streaming means: {np.round(moments.mean, 2)} ± {np.round(moments.std_error, 2)}")
+assert np.all(np.abs(moments.mean - means) < 5 * moments.std_error), "float32 mean outside 5 standard errors"
+single, double = (
+    nash_equilibrium_3_insurers_different_premiums(*S0s, mu, sigma, T, 2**16, [0.1 * i for i in range(11)],
+                                                   method='crn', rng=13, dtype=dtype)
+    for dtype in (np.float32, np.float64)
+)
+print(f"  CRN equilibrium: float32 {single[0]}, float64 {double[0]}")
+assert single[0] == double[0], "Precision should not change the equilibrium"
+print("  ✓ float32 paths, float64 means")
+
+# Test 9: Correlated claims from one cached factor
+print("\n[TEST 9] Correlated Claims")
+print("-" * 80)
+correlation = np.array([[1.0, 0.6, 0.3], [0.6, 1.0, 0.5], [0.3, 0.5, 1.0]])
+factor = correlation_factor(correlation)
+assert np.allclose(factor @ factor.T, correlation)
+assert correlation_factor(correlation.tolist()) is factor, "Factor should come from the cache"
+scenario = scenario_n_insurers(S0s, mu, sigma, T, 200000, rng=14, correlation=correlation)
+sample = np.corrcoef(np.log(scenario.claims))
+print(f"  Sample claim correlation:\n{np.round(sample, 3)}")
+assert np.allclose(sample, correlation, atol=0.01), "Claims should follow the requested correlation"
+assert np.allclose(np.corrcoef(np.log(scenario.premiums)), np.eye(3), atol=0.01), "Premiums stay independent"
+profits = simulation_n_insurers(S0s, mu, sigma, T, 200000, retentions, rng=14, correlation=correlation)
+assert np.array_equal(profits, scenario.profit_matrix(retentions)), "Kernel and scenario should agree"
+moments = streaming_simulation_n_insurers(S0s, mu, sigma, T, 200000, retentions, rng=15, correlation=correlation)
+assert np.all(np.abs(moments.mean - means) < 5 * moments.std_error), "Correlation must not bias the means"
+perfect = correlation_factor(np.ones((3, 3)))
+assert np.allclose(perfect @ perfect.T, 1.0), "Perfect correlation should fall back to the eigendecomposition"
+for invalid in ([[1.0, 2.0], [2.0, 1.0]], [[1.0, 0.5], [0.4, 1.0]]):
+    try:
+        correlation_factor(invalid)
+        raise AssertionError("Invalid correlation matrix accepted")
+    except ValueError:
+        pass
+print("  ✓ Correlated claims in one matrix product")
+
+# Test 10: Frequency-severity claims
+print("\n[TEST 10] Compound Poisson Claims")
+print("-" * 80)
+rng = make_rng(16)
+counts = rng.poisson(2.0, 50)
+sizes = rng.lognormal(3.0, 1.0, counts.sum())
+looped = [sizes[start:start + k].sum() for start, k in zip(np.cumsum(counts) - counts, counts)]
+assert np.allclose(compound_poisson_claims(2.0, 50, 'lognormal', {'mu': 3.0, 'sigma': 1.0}, rng=16), looped), \
+    "Vectorized totals should equal the per-path sums"
+for severity, params in (('lognormal', {'mu': 3.0, 'sigma': 1.0}),
+                         ('pareto', {'alpha': 3.5, 'scale': 20.0}),
+                         ('gamma', {'shape': 2.0, 'scale': 15.0})):
+    totals = compound_poisson_claims(3.0, 400000, severity, params, rng=17)
+    mean, variance = compound_poisson_moments(3.0, severity, params)
+    se = np.sqrt(variance / len(totals))
+    print(f"  {severity:>9}: mean {totals.mean():.2f} (exact {mean:.2f}), variance {totals.var():.0f} (exact {variance:.0f})")
+    assert abs(totals.mean() - mean) < 5 * se, "Aggregate mean far from λ E[X]"
+    assert abs(totals.var() / variance - 1) < 0.05, "Aggregate variance far from λ E[X²]"
+assert not compound_poisson_claims(0.0, 100, 'gamma', {'shape': 2.0, 'scale': 1.0}, rng=18).any()
+scenario = scenario_compound_poisson_n_insurers(S0s, mu, sigma, T, 200000, [10, 8, 5], 'gamma',
+                                                {'shape': 2.0, 'scale': [50.0, 52.0, 55.0]}, rng=19)
+expected_claims, _ = compound_poisson_moments(np.array([10, 8, 5]), 'gamma',
+                                              {'shape': 2.0, 'scale': np.array([50.0, 52.0, 55.0])})
+assert np.allclose(scenario.claims.mean(axis=1), expected_claims, rtol=0.01), "Per-insurer rates not applied"
+print("  ✓ Claim totals vectorized with one bincount")
+
+# Test 11: Multi-period surplus and ruin
+print("\n[TEST 11] Surplus Process and Ruin Probability")
+print("-" * 80)
+one_year = surplus_simulation_n_insurers(S0s, mu, sigma, 1, 100000, retentions, 50.0, rng=20)
+profits = simulation_n_insurers(S0s, mu, sigma, T, 100000, retentions, rng=20)
+assert np.allclose(one_year['ruin_probability'], np.mean(50.0 + profits < 0, axis=1)), \
+    "One period should reproduce the single-horizon model"
+assert np.allclose(one_year['final_surplus'].mean, 50.0 + profits.mean(axis=1))
+ruin = {}
+for capital in (50.0, 200.0):
+    result = surplus_simulation_n_insurers(S0s, 0.0, sigma, 30, 50000, retentions, capital, chunk_size=16384, rng=21)
+    ruin[capital] = result['ruin_probability']
+    print(f"  U0={capital:.0f}: 30-year ruin probability {np.round(result['ruin_probability'], 4)} "
+          f"± {np.round(result['std_errors'], 4)}")
+    assert np.all(np.diff(result['ruin_probability_by_year'], axis=1) >= 0), "Ruin must be absorbing"
+assert np.all(ruin[200.0] < ruin[50.0]), "More capital should mean less ruin"
+none = surplus_simulation_n_insurers(S0s, mu, sigma, 10, 1000, [0.0, 0.0, 0.0], 1.0, rng=22)
+assert not none['ruin_probability'].any(), "Without retained risk the surplus cannot fall"
+peaks = []
+for years in (2, 40):
+    tracemalloc.start()
+    surplus_simulation_n_insurers(S0s, mu, sigma, years, 50000, retentions, 100.0, chunk_size=16384, rng=23)
+    peaks.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+assert peaks[1] < 1.5 * peaks[0], "Memory should not grow with the horizon"
+print("  ✓ Surplus streamed through the periods with a ruin mask")
+
+# Test 12: Streaming tail risk
+print("\n[TEST 12] Quantile Sketch and Tail Risk")
+print("-" * 80)
+samples = make_rng(24).standard_normal((2, 1_000_000))
+exact = np.sort(samples, axis=1)
+whole = QuantileSketch(2)
+whole.update(samples)
+merged = QuantileSketch(2)
+for part in np.array_split(samples, 7, axis=1):
+    shard = QuantileSketch(2)
+    for start in range(0, part.shape[1], 50000):
+        shard.update(part[:, start:start + 50000])
+    merged.merge(shard)
+for sketch in (whole, merged):
+    assert sketch.count == samples.shape[1]
+    assert max(len(means) for means in sketch.means) < sketch.compression, "Sketch size must stay bounded"
+    for q in (0.005, 0.05, 0.5):
+        rank = np.searchsorted(exact[0], sketch.quantile(q)[0]) / samples.shape[1]
+        assert abs(rank - q) < 0.01 * q + 1e-4, f"Quantile {q} off by rank {rank - q:.2e}"
+    assert np.allclose(sketch.lower_tail_mean(0.005), exact[:, :5000].mean(axis=1), rtol=0.005)
+    assert np.allclose(sketch.lower_tail_mean(1.0), samples.mean(axis=1))
+print(f"  0.5% quantile {merged.quantile(0.005)[0]:.4f} (exact {exact[0, 5000]:.4f}), "
+      f"tail mean {merged.lower_tail_mean(0.005)[0]:.4f} (exact {exact[0, :5000].mean():.4f}), "
+      f"{len(merged.means[0])} centroids")
+# One chunk: the streamed run draws the same paths as simulation_n_insurers
+sketch = QuantileSketch(3)
+moments = streaming_simulation_n_insurers(S0s, mu, sigma, T, 300000, retentions, chunk_size=300000, rng=25,
+                                          sketch=sketch)
+profits = simulation_n_insurers(S0s, mu, sigma, T, 300000, retentions, rng=25)
+summary = sketch.summary(0.995)
+var = -np.quantile(profits, 0.005, axis=1)
+tvar = -np.sort(profits, axis=1)[:, :1500].mean(axis=1)
+print(f"  VaR 99.5% {np.round(summary['var'], 2)} (exact {np.round(var, 2)})")
+print(f"  TVaR 99.5% {np.round(summary['tvar'], 2)} (exact {np.round(tvar, 2)})")
+assert np.allclose(summary['var'], var, rtol=0.01) and np.allclose(summary['tvar'], tvar, rtol=0.01)
+one = parallel_streaming_simulation_n_insurers(S0s, mu, sigma, T, 200000, retentions, seed=26, max_workers=1,
+                                               shard_paths=50000)
+two = parallel_streaming_simulation_n_insurers(S0s, mu, sigma, T, 200000, retentions, seed=26, max_workers=2,
+                                               shard_paths=50000)
+assert np.array_equal(one[0].mean, two[0].mean) and one[1].summary() == two[1].summary(), \
+    "Sharded results must not depend on the number of workers"
+print("  ✓ Mergeable sketches give VaR / TVaR in constant memory")
+
+print("\n" + "=" * 80)
+print("ALL STREAMING TESTS PASSED ✓")
+print("=" * 80)